@@ -15,10 +15,41 @@ Supported AI Model Providers:
     - HuggingFace Inference API
 """
 
+from typing import TYPE_CHECKING
+
 __version__ = "0.3.0"
 __author__ = "Cloudmeru"
 
-from mt5_mcp_ui.app import MCPClient, create_app, get_config, main, update_config
+if TYPE_CHECKING:
+    from mt5_mcp_ui.app import MCPClient, create_app, get_config, main, update_config
+
+# Public attributes resolved on first access. Importing the package (for
+# ``__version__`` or ``python -m mt5_mcp_ui --help``) must not import Gradio.
+_LAZY_ATTRS = {
+    "create_app": "mt5_mcp_ui.app",
+    "main": "mt5_mcp_ui.app",
+    "get_config": "mt5_mcp_ui.app",
+    "update_config": "mt5_mcp_ui.app",
+    "MCPClient": "mt5_mcp_ui.app",
+}
+
+
+def __getattr__(name: str):
+    """Import heavy attributes from their module on first access."""
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    import importlib
+
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
+
 
 __all__ = [
     # Main application
@@ -2,7 +2,8 @@
 MetaTrader 5 Financial Analyst - Main Entry Point
 
 Usage:
-    python -m mt5_mcp_ui [--mode MODE] [--port PORT] [--share]
+    python -m mt5_mcp_ui [--mode MODE] [--port PORT] [--share] [--profile-startup]
+    python -m mt5_mcp_ui batch PROMPTS.jsonl [-o RESULTS.jsonl] [-c CONCURRENCY]
 
 Professional AI-powered financial analyst that connects to MetaTrader 5
 via MCP protocol for advanced market analysis and forecasting.
@@ -10,6 +11,71 @@ via MCP protocol for advanced market analysis and forecasting.
 
 import argparse
 import os
+import subprocess
+import sys
+
+# Module whose import cost dominates container cold starts (pulls in Gradio,
+# the provider SDKs and the MCP client stack).
+_PROFILE_TARGET = "mt5_mcp_ui.app"
+
+
+def profile_startup(target: str = _PROFILE_TARGET, top: int = 15) -> str:
+    """
+    Measure import time per top-level package for a cold start.
+
+    Runs ``python -X importtime -c "import <target>"`` in a fresh interpreter so
+    the numbers reflect a real cold start (nothing already in ``sys.modules``),
+    then aggregates the self-time of every imported module by its top-level
+    package.
+
+    Returns:
+        A formatted report, slowest packages first.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+    per_package: dict[str, int] = {}
+    module_count = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        # Format: "import time: <self us> | <cumulative us> | <indented name>"
+        try:
+            self_col, _cumulative_col, name = line.split("|", 2)
+            self_us = int(self_col.rsplit(":", 1)[1])
+        except ValueError:
+            continue
+        name = name.strip()
+        package = name.split(".")[0]
+        per_package[package] = per_package.get(package, 0) + self_us
+        module_count += 1
+
+    if proc.returncode != 0 and not per_package:
+        return f"❌ Failed to import {target}:\n{proc.stderr.strip()[-2000:]}"
+
+    total_us = sum(per_package.values())
+    ranked = sorted(per_package.items(), key=lambda item: item[1], reverse=True)
+
+    lines = [
+        f"⏱️ Startup import profile for {target}",
+        f"   {module_count} modules, {total_us / 1e6:.3f}s total import time",
+        "",
+        f"   {'package':<32} {'seconds':>9} {'share':>7}",
+    ]
+    for package, us in ranked[:top]:
+        share = (us / total_us * 100) if total_us else 0.0
+        lines.append(f"   {package:<32} {us / 1e6:>9.3f} {share:>6.1f}%")
+    if len(ranked) > top:
+        rest = sum(us for _, us in ranked[top:])
+        lines.append(f"   {'(' + str(len(ranked) - top) + ' others)':<32} {rest / 1e6:>9.3f}")
+    if proc.returncode != 0:
+        lines.append("")
+        lines.append(f"⚠️ Import of {target} failed: {proc.stderr.strip().splitlines()[-1]}")
+    return "\n".join(lines)
 
 
 def main():
@@ -52,6 +118,7 @@ Environment Variables:
   LLM_API_KEY      Universal API key for any provider
   LLM_BASE_URL     Custom LLM base URL/endpoint
   LLM_API_VERSION  API version for Azure providers (default: 2024-12-01-preview)
+  WARMUP_ON_START  Pre-connect MCP/LLM and prefetch tools at startup (default: false)
 
 Examples:
   # Run with default settings (connects to testing server)
@@ -62,6 +129,12 @@ Examples:
 
   # Connect to custom MCP server
   MCP_URL=http://localhost:7860/gradio_api/mcp/sse python -m mt5_mcp_ui
+
+  # Show where cold-start time goes (e.g. for container images)
+  python -m mt5_mcp_ui --profile-startup
+
+  # Run a prompt file headlessly (resumable; see "batch --help")
+  python -m mt5_mcp_ui batch prompts.jsonl -o results.jsonl -c 8
         """,
     )
     parser.add_argument(
@@ -82,16 +155,73 @@ Examples:
         default=_default_mode(),
         help="Application mode (controls Settings tab behavior)",
     )
+    parser.add_argument(
+        "--warmup",
+        action=argparse.BooleanOptionalAction,
+        default=os.getenv("WARMUP_ON_START", "").lower() in ("true", "1", "yes", "on"),
+        help="Pre-connect MCP/LLM and prefetch tools before serving",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report cold-start import time per package and exit",
+    )
+
+    subcommands = parser.add_subparsers(dest="command", metavar="{batch}")
+    batch = subcommands.add_parser(
+        "batch",
+        help="Run a JSONL file of prompts without the web UI",
+        description=(
+            "Run prompts through the analyst pipeline and append one JSON result per "
+            "line (answer, tool trace, timings, chart paths). Rerunning with the same "
+            "output file skips prompts that already succeeded."
+        ),
+    )
+    batch.add_argument("input", help='JSONL file, one {"id": ..., "prompt": ...} object per line')
+    batch.add_argument(
+        "-o",
+        "--output",
+        help="Results JSONL file (default: <input>.results.jsonl)",
+    )
+    batch.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=int(os.getenv("BATCH_CONCURRENCY", "4")),
+        help="Prompts run at once (default: BATCH_CONCURRENCY or 4)",
+    )
+    batch.add_argument(
+        "--charts-dir", help="Where chart images are copied (default: <output>_charts)"
+    )
 
     args = parser.parse_args()
 
+    if args.profile_startup:
+        print(profile_startup())
+        return
+
+    if args.command == "batch":
+        from mt5_mcp_ui.app import run_batch
+
+        output = args.output or str(Path(args.input).with_suffix(".results.jsonl"))
+        try:
+            summary = run_batch(args.input, output, args.concurrency, args.charts_dir)
+        except FileNotFoundError as e:
+            print(f"❌ {e}")
+            sys.exit(2)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        print(
+            f"✅ {summary['ok']} ok, ❌ {summary['error']} failed, "
+            f"⏭️ {summary['skipped']} skipped -> {output}"
+        )
+        sys.exit(1 if summary["error"] else 0)
+
     os.environ["APP_MODE"] = args.mode
     os.environ["PRODUCTION_MODE"] = "true" if args.mode == "production" else "false"
 
-    # Import and run app
+    # Import and run app (deferred so --help and --profile-startup stay fast)
     # Override sys.argv for the app's argparse
-    import sys
-
     from mt5_mcp_ui.app import main as run_app
 
     sys.argv = ["mt5_mcp_ui"]
@@ -101,6 +231,7 @@ Examples:
         sys.argv.append("--share")
     if args.mode:
         sys.argv.extend(["--mode", args.mode])
+    sys.argv.append("--warmup" if args.warmup else "--no-warmup")
 
     run_app()
 
@@ -9,12 +9,18 @@ A professional Gradio interface that:
 - Modern chat interface with professional visualizations
 """
 
+import ast
 import asyncio
+import concurrent.futures
+import hashlib
+import importlib.util
 import json
 import os
 import re
 import shutil
 import tempfile
+import threading
+import time
 import warnings
 from pathlib import Path
 from typing import List, Optional, Tuple
@@ -22,6 +28,8 @@ from urllib.parse import unquote
 
 import gradio as gr
 
+from mt5_mcp_ui.indicators import BAR_FIELDS, LOCAL_TOOLS, LocalTool
+
 # Suppress async cleanup warnings from httpx/MCP client
 warnings.filterwarnings("ignore", message="coroutine.*was never awaited")
 warnings.filterwarnings("ignore", category=RuntimeWarning, module="asyncio")
@@ -187,6 +195,91 @@ def copy_image_to_output(src_path: str, output_dir: str = None) -> str:
 # ============================================================================
 
 
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Read a boolean flag from the environment."""
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("true", "1", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer from the environment, falling back on bad values."""
+    try:
+        return int(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float from the environment, falling back on bad values."""
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
+
+
+def _normalize_mcp_url(url: str, transport: str) -> str:
+    """Point an MCP endpoint URL at the path the transport expects."""
+    if transport == "streamable_http" and url.endswith("/sse"):
+        return url.replace("/sse", "/")
+    if transport == "sse" and not url.endswith("/sse"):
+        return url + "sse" if url.endswith("/") else url + "/sse"
+    return url
+
+
+def _parse_mcp_urls(value: str) -> list[tuple[str, str]]:
+    """Parse ``MCP_URLS`` ("name=url, url, ...") into ``(alias, url)`` pairs."""
+    endpoints = []
+    for entry in re.split(r"[,\s]+", value.strip()):
+        if not entry:
+            continue
+        alias, sep, url = entry.partition("=")
+        if not sep or "://" in alias:
+            alias, url = "", entry
+        endpoints.append((alias.strip(), url.strip()))
+    return endpoints
+
+
+def _parse_scheduled_analyses(value: str) -> list[dict]:
+    """
+    Parse ``SCHEDULED_ANALYSES`` into ``{"symbol", "timeframe", "prompt"}`` jobs.
+
+    Accepts "EURUSD:H1, XAUUSD:D1" or a JSON array of objects with the same
+    keys (``prompt`` is optional).
+    """
+    value = value.strip()
+    if not value:
+        return []
+    if value.startswith("["):
+        try:
+            entries = json.loads(value)
+        except ValueError:
+            print("[Config] Ignoring invalid SCHEDULED_ANALYSES (expected a JSON array)")
+            return []
+    else:
+        entries = []
+        for item in re.split(r"[,\s]+", value):
+            symbol, _, timeframe = item.partition(":")
+            entries.append({"symbol": symbol, "timeframe": timeframe or "H1"})
+    jobs = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("symbol"):
+            continue
+        symbol = str(entry["symbol"]).replace("/", "").upper()
+        if not re.fullmatch(r"[A-Z0-9._#+-]+", symbol):
+            print(f"[Config] Ignoring scheduled analysis for invalid symbol {symbol!r}")
+            continue
+        jobs.append(
+            {
+                "symbol": symbol,
+                "timeframe": str(entry.get("timeframe") or "H1").upper(),
+                "prompt": entry.get("prompt") or "",
+            }
+        )
+    return jobs
+
+
 class Config:
     """Simple configuration class."""
 
@@ -201,13 +294,174 @@ class Config:
         )  # 'sse' or 'streamable_http'
 
         # Auto-adjust URL based on transport if using default
-        if self.mcp_transport == "streamable_http" and self.mcp_url.endswith("/sse"):
-            self.mcp_url = self.mcp_url.replace("/sse", "/")
-        elif self.mcp_transport == "sse" and not self.mcp_url.endswith("/sse"):
-            if self.mcp_url.endswith("/"):
-                self.mcp_url = self.mcp_url + "sse"
-            else:
-                self.mcp_url = self.mcp_url + "/sse"
+        self.mcp_url = _normalize_mcp_url(self.mcp_url, self.mcp_transport)
+
+        # Additional MT5 terminals: MCP_URLS="name=url, name=url, ..." (the
+        # "name=" prefix is optional). Takes precedence over MCP_URL when it
+        # lists more than one server.
+        self.mcp_urls = [
+            (alias, _normalize_mcp_url(url, self.mcp_transport))
+            for alias, url in _parse_mcp_urls(os.getenv("MCP_URLS", ""))
+        ]
+        # Replica selection: least_loaded or latency
+        self.mcp_routing = os.getenv("MCP_ROUTING", "least_loaded").lower()
+
+        # MCP session pooling and tool discovery
+        self.mcp_pool_size = max(1, _env_int("MCP_POOL_SIZE", 2))
+        self.mcp_tools_ttl = _env_float("MCP_TOOLS_TTL", 300.0)  # seconds
+        self.mcp_snapshot_dir = os.getenv(
+            "MCP_SNAPSHOT_DIR", str(Path.home() / ".cache" / "mt5_mcp_ui")
+        )
+
+        # HTTP settings of the MCP transports' httpx clients. HTTP/2 needs the
+        # h2 package; MCP_ACCEPT_ENCODING=identity turns off compressed responses.
+        # MCP_READ_TIMEOUT bounds the wait for data on a response stream.
+        self.mcp_http2 = _env_flag("MCP_HTTP2")
+        if self.mcp_http2 and importlib.util.find_spec("h2") is None:
+            print('[Config] MCP_HTTP2 needs h2 (pip install "httpx[http2]"); using HTTP/1.1')
+            self.mcp_http2 = False
+        self.mcp_accept_encoding = os.getenv("MCP_ACCEPT_ENCODING", "gzip, deflate")
+        self.mcp_connect_timeout = _env_float("MCP_CONNECT_TIMEOUT", 10.0)
+        self.mcp_http_timeout = _env_float("MCP_HTTP_TIMEOUT", 30.0)  # write/pool/requests
+        self.mcp_read_timeout = _env_float("MCP_READ_TIMEOUT", 300.0)
+        self.mcp_max_connections = max(1, _env_int("MCP_MAX_CONNECTIONS", 20))
+        self.mcp_max_keepalive = max(0, _env_int("MCP_MAX_KEEPALIVE", 10))
+        self.mcp_keepalive_expiry = _env_float("MCP_KEEPALIVE_EXPIRY", 30.0)
+
+        # MCP health checks, reconnect backoff and circuit breaker
+        self.mcp_ping_interval = _env_float("MCP_PING_INTERVAL", 30.0)  # 0 disables
+        self.mcp_ping_timeout = _env_float("MCP_PING_TIMEOUT", 10.0)
+        self.mcp_reconnect_attempts = _env_int("MCP_RECONNECT_ATTEMPTS", 5)
+        self.mcp_backoff_base = _env_float("MCP_BACKOFF_BASE", 0.5)
+        self.mcp_backoff_max = _env_float("MCP_BACKOFF_MAX", 30.0)
+        self.mcp_breaker_threshold = _env_int("MCP_BREAKER_THRESHOLD", 3)
+        self.mcp_breaker_reset = _env_float("MCP_BREAKER_RESET", 30.0)
+
+        # Deadlines (seconds; 0 disables). MCP_TOOL_TIMEOUTS overrides the tool
+        # deadline per tool, e.g. {"mt5_analyze_tool": 180}
+        self.llm_timeout = _env_float("LLM_TIMEOUT", 120.0)
+        self.llm_stream = _env_flag("LLM_STREAM", True)
+        self.mcp_tool_timeout = _env_float("MCP_TOOL_TIMEOUT", 60.0)
+        try:
+            self.mcp_tool_timeouts = json.loads(os.getenv("MCP_TOOL_TIMEOUTS", "") or "{}")
+        except ValueError:
+            print("[Config] Ignoring invalid MCP_TOOL_TIMEOUTS (expected a JSON object)")
+            self.mcp_tool_timeouts = {}
+        self.turn_timeout = _env_float("TURN_TIMEOUT", 300.0)
+
+        # Read-only market data results are reused for TOOL_CACHE_TTL seconds
+        # (0 disables). SPECULATIVE_PREFETCH starts fetching the tick and bars
+        # for symbols named in the message while the first LLM call runs.
+        self.tool_cache_ttl = _env_float("TOOL_CACHE_TTL", 5.0)
+        self.speculative_prefetch = _env_flag("SPECULATIVE_PREFETCH")
+
+        # copy_rates_from_pos bars are kept on disk (memory-mapped columns per
+        # server/symbol/timeframe); repeat requests fetch only bars newer than the last
+        # stored one. Retention: BAR_CACHE_MAX_BARS per series, BAR_CACHE_MAX_MB
+        # in total. Empty BAR_CACHE_DIR disables.
+        self.bar_cache_dir = os.getenv(
+            "BAR_CACHE_DIR", str(Path.home() / ".mt5_mcp_ui" / "bars")
+        )
+        self.bar_cache_max_bars = max(1000, _env_int("BAR_CACHE_MAX_BARS", 50_000))
+        self.bar_cache_max_mb = _env_float("BAR_CACHE_MAX_MB", 256.0)
+
+        # Draw mt5_analyze_tool charts locally (Matplotlib Agg, CHART_WORKERS
+        # processes) from the returned data instead of on the MT5 server
+        self.local_charts = _env_flag("LOCAL_CHARTS")
+        self.chart_workers = max(1, _env_int("CHART_WORKERS", 2))
+
+        # Indicator tools computed in-process (NumPy) over at least
+        # LOCAL_TOOL_BARS of the latest bars, fetched through the tool cache
+        self.local_tools = _env_flag("LOCAL_TOOLS", True)
+        self.local_tool_bars = max(50, _env_int("LOCAL_TOOL_BARS", 500))
+
+        # Simple data requests answered with one tool call and no LLM
+        # (comma-separated; empty disables): quote, symbol_info, account_info
+        self.fast_path_intents = [
+            intent.strip()
+            for intent in os.getenv("FAST_PATH_INTENTS", "quote,symbol_info,account_info").split(",")
+            if intent.strip()
+        ]
+
+        # Tool schemas sent per request: the TOOL_CORE tools plus the
+        # TOOL_TOP_K most relevant others (0 sends everything). TOOL_TAGS adds
+        # search tags per tool, e.g. {"mt5_history_tool": ["deals", "orders"]}
+        self.tool_top_k = _env_int("TOOL_TOP_K", 8)
+        self.tool_core = [
+            name.strip()
+            for name in os.getenv("TOOL_CORE", "mt5_query_tool,mt5_analyze_tool").split(",")
+            if name.strip()
+        ]
+        try:
+            self.tool_tags = json.loads(os.getenv("TOOL_TAGS", "") or "{}")
+        except ValueError:
+            print("[Config] Ignoring invalid TOOL_TAGS (expected a JSON object)")
+            self.tool_tags = {}
+
+        # Tool arguments are always checked against the tool's inputSchema before
+        # a call is sent; TOOL_ARG_REPAIR also applies safe fixes first (missing
+        # JSON-string params -> "{}", "100" -> 100, objects -> JSON strings)
+        self.tool_arg_repair = _env_flag("TOOL_ARG_REPAIR", True)
+
+        # Opt-in cache of final answers. Answers built from market data keep
+        # for RESPONSE_CACHE_TTL seconds while markets trade (until the weekly
+        # reopen otherwise); answers without data for RESPONSE_CACHE_STATIC_TTL.
+        self.response_cache = _env_flag("RESPONSE_CACHE")
+        self.response_cache_size = _env_int("RESPONSE_CACHE_SIZE", 256)
+        self.response_cache_ttl = _env_float("RESPONSE_CACHE_TTL", 60.0)
+        self.response_cache_static_ttl = _env_float("RESPONSE_CACHE_STATIC_TTL", 3600.0)
+
+        # Example prompts shown under the chat; with PRECOMPUTE_EXAMPLES their
+        # answers are prepared at startup and refreshed every
+        # EXAMPLE_REFRESH_INTERVAL seconds
+        try:
+            self.example_prompts = json.loads(os.getenv("EXAMPLE_PROMPTS", "") or "null")
+        except ValueError:
+            print("[Config] Ignoring invalid EXAMPLE_PROMPTS (expected a JSON array)")
+            self.example_prompts = None
+        if not isinstance(self.example_prompts, list) or not self.example_prompts:
+            self.example_prompts = list(DEFAULT_EXAMPLE_PROMPTS)
+        self.precompute_examples = _env_flag("PRECOMPUTE_EXAMPLES")
+        self.example_refresh_interval = _env_float("EXAMPLE_REFRESH_INTERVAL", 900.0)
+
+        # Analyses recomputed at every bar close and served from the store
+        self.scheduled_analyses = _parse_scheduled_analyses(os.getenv("SCHEDULED_ANALYSES", ""))
+        self.schedule_delay = _env_float("SCHEDULE_DELAY", 10.0)  # seconds after the close
+        # Broker server time vs UTC, for D1/W1/MN1 boundaries (e.g. 2 or 3 for EET)
+        self.schedule_utc_offset = _env_float("SCHEDULE_UTC_OFFSET", 0.0)  # hours
+
+        # Conversations persist in SQLite when CONVERSATION_DB names a file (off by
+        # default); the chat shows the latest CHAT_WINDOW messages and pages older
+        # ones in on demand. The file is never served by Gradio (blocked_paths).
+        self.conversation_db = os.getenv("CONVERSATION_DB", "")
+        self.chat_window = max(2, _env_int("CHAT_WINDOW", 20))  # messages
+
+        # Uploaded CSV/JSON/Parquet price files: parsed in chunks, the latest
+        # ATTACHMENT_MAX_ROWS rows kept as arrays, a bounded summary sent to the LLM
+        self.attachment_max_rows = max(1000, _env_int("ATTACHMENT_MAX_ROWS", 500_000))
+        self.attachment_summary_chars = _env_int("ATTACHMENT_SUMMARY_CHARS", 4000)
+
+        # Live quote panel: one shared poller for every session (opt-in; symbol
+        # names vary by broker, e.g. BTCUSD vs BTCUSD.a)
+        self.ticker_symbols = [
+            symbol.strip().replace("/", "").upper()
+            for symbol in os.getenv("TICKER_SYMBOLS", "").split(",")
+            if symbol.strip()
+        ]
+        self.ticker_interval = max(0.5, _env_float("TICKER_INTERVAL", 2.0))  # seconds
+
+        # Watchlist scanner tab (parallel per-symbol analysis, one LLM summary)
+        self.scanner_watchlist = [
+            symbol.strip().upper()
+            for symbol in os.getenv("SCANNER_WATCHLIST", DEFAULT_SCANNER_WATCHLIST).split(",")
+            if symbol.strip()
+        ]
+        self.scanner_concurrency = max(1, _env_int("SCANNER_CONCURRENCY", 4))
+        self.scanner_bars = max(2, _env_int("SCANNER_BARS", 250))
+
+        # Startup warm-up (pre-connect MCP, prefetch tools, open LLM pool)
+        self.warmup_on_start = _env_flag("WARMUP_ON_START")
+        self.warmup_timeout = _env_float("WARMUP_TIMEOUT", 30.0)  # seconds
 
         # LLM Settings
         # Providers: openai, azure_openai, azure_foundry, azure_ai_inference, ollama
@@ -221,6 +475,42 @@ class Config:
             "LLM_API_VERSION", "2024-12-01-preview"
         )  # For Azure OpenAI
 
+        # Ollama native API (/api/chat) instead of its OpenAI-compatible endpoint:
+        # keeps the model loaded between turns and reports load/eval timings
+        self.ollama_native = _env_flag("OLLAMA_NATIVE")
+        self.ollama_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # "-1" = forever
+        self.ollama_num_ctx = _env_int("OLLAMA_NUM_CTX", 8192)  # 0 = model default
+        self.ollama_preload = _env_flag("OLLAMA_PRELOAD", True)  # load model at startup
+
+        # Several deployments with failover, e.g.
+        # [{"name": "eastus", "provider": "azure_openai", "model": "gpt-4o",
+        #   "base_url": "...", "api_key": "...", "weight": 2}, {"provider": "ollama",
+        #   "model": "llama3.1"}]. Takes precedence over the single provider above.
+        try:
+            self.llm_deployments = json.loads(os.getenv("LLM_DEPLOYMENTS", "") or "[]")
+            if not isinstance(self.llm_deployments, list):
+                raise ValueError("not a list")
+        except ValueError:
+            print("[Config] Ignoring invalid LLM_DEPLOYMENTS (expected a JSON array)")
+            self.llm_deployments = []
+        # ordered: first healthy deployment wins; latency: lowest observed
+        # latency x error rate, scaled by weight
+        self.llm_routing = os.getenv("LLM_ROUTING", "latency").lower()
+
+        # Client-side rate limits (0 = unlimited). LLM_RPM/LLM_TPM apply to the
+        # provider (each LLM_DEPLOYMENTS entry may set its own "rpm"/"tpm"),
+        # USER_RPM/USER_TPM to each browser session. Concurrent completions per
+        # provider are uncapped (or capped at LLM_MAX_CONCURRENCY) until the
+        # provider throttles (429); the cap then halves and grows back on
+        # success. A turn waits at most LLM_RATE_LIMIT_WAIT seconds for a slot
+        # (or a Retry-After) before telling the user to try again.
+        self.llm_rpm = _env_float("LLM_RPM", 0.0)
+        self.llm_tpm = _env_float("LLM_TPM", 0.0)
+        self.user_rpm = _env_float("USER_RPM", 0.0)
+        self.user_tpm = _env_float("USER_TPM", 0.0)
+        self.llm_max_concurrency = max(0, _env_int("LLM_MAX_CONCURRENCY", 0))
+        self.llm_rate_limit_wait = _env_float("LLM_RATE_LIMIT_WAIT", 60.0)
+
         # System prompt
         self.system_prompt = os.getenv(
             "SYSTEM_PROMPT",
@@ -240,8 +530,6 @@ Maintain a professional yet approachable tone. You are an expert analyst, not a
 ## MetaTrader 5 Analysis Tools:
 
 ### mt5_query_tool - For market data retrieval
-⚠️ **CRITICAL: ALL THREE PARAMETERS ARE REQUIRED - NEVER OMIT ANY!**
-
 Required parameters:
 1. `operation`: One of symbol_info, symbol_info_tick, copy_rates_from_pos, terminal_info, account_info, etc.
 2. `symbol`: Trading symbol (e.g., "BTCUSD", "EURUSD") OR null if not needed
@@ -255,11 +543,6 @@ Required parameters:
 {"operation": "account_info", "symbol": null, "parameters": "{}"}
 ```
 
-❌ WRONG - Missing parameters field:
-```
-{"operation": "symbol_info_tick", "symbol": "BTCUSD"}  // WILL FAIL!
-```
-
 ### mt5_analyze_tool - For professional technical analysis (PREFERRED)
 - `query_symbol`: Trading symbol (e.g., "BTCUSD")
 - `query_parameters`: JSON string like {"timeframe": "H1", "count": 168}
@@ -300,6 +583,18 @@ IMPORTANT: Prefer mt5_analyze_tool for comprehensive analysis as it provides pro
         )
 
 
+    def mcp_endpoints(self) -> list[tuple[str, str]]:
+        """``(alias, url)`` of every MCP server to use (alias may be empty)."""
+        if len(self.mcp_urls) > 1:
+            return list(self.mcp_urls)
+        return [("", self.mcp_url)]
+
+    def tool_timeout(self, tool_name: str) -> Optional[float]:
+        """Deadline for one call of ``tool_name`` (None means unbounded)."""
+        timeout = float(self.mcp_tool_timeouts.get(tool_name, self.mcp_tool_timeout))
+        return timeout or None
+
+
 _config: Optional[Config] = None
 
 
@@ -320,98 +615,762 @@ def update_config(**kwargs):
     return config
 
 
+# ============================================================================
+# Metrics
+# ============================================================================
+
+
+class Metrics:
+    """
+    Thread-safe in-process counters, gauges and timing summaries.
+
+    Metric names follow Prometheus conventions; labels are passed as keyword
+    arguments. ``render_text`` produces the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: dict[tuple, float] = {}
+        self._gauges: dict[tuple, float] = {}
+        self._timings: dict[tuple, list[float]] = {}  # [count, sum, max]
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            stats = self._timings.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def get(self, name: str, **labels) -> float:
+        """Current value of a counter or gauge (0 when unset)."""
+        key = self._key(name, labels)
+        with self._lock:
+            return self._gauges.get(key, self._counters.get(key, 0.0))
+
+    def snapshot(self) -> dict:
+        """Copy of all metrics keyed by ``name{label="value",...}``."""
+
+        def _fmt(key):
+            name, labels = key
+            if not labels:
+                return name
+            return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+        with self._lock:
+            data = {_fmt(k): v for k, v in self._counters.items()}
+            data.update({_fmt(k): v for k, v in self._gauges.items()})
+            for key, (count, total, peak) in self._timings.items():
+                name, labels = key
+                data[_fmt((name + "_count", labels))] = count
+                data[_fmt((name + "_sum", labels))] = round(total, 6)
+                data[_fmt((name + "_max", labels))] = round(peak, 6)
+        return data
+
+    def render_text(self) -> str:
+        """Prometheus text exposition of all metrics."""
+        return "\n".join(f"{k} {v}" for k, v in sorted(self.snapshot().items())) + "\n"
+
+
+metrics = Metrics()
+
+
+# ============================================================================
+# Circuit Breaker
+# ============================================================================
+
+
+def _describe_error(error: BaseException) -> str:
+    """Readable message for an exception, unwrapping anyio/asyncio exception groups."""
+    while getattr(error, "exceptions", None):
+        error = error.exceptions[0]
+    return str(error) or type(error).__name__
+
+
+def _backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    import random
+
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+class CircuitBreaker:
+    """
+    Fail-fast guard for a remote dependency.
+
+    ``closed``: calls flow normally. After ``failure_threshold`` consecutive
+    failures the breaker goes ``open`` and rejects calls for ``reset_timeout``
+    seconds, then lets a single probe through (``half_open``). The probe's
+    outcome closes the breaker again or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.last_error = ""
+        self._publish()
+
+    def _publish(self):
+        metrics.set("circuit_state", self._STATE_VALUES[self._state], breaker=self.name)
+
+    def _transition(self, state: str):
+        if state != self._state:
+            print(f"[Circuit] {self.name}: {self._state} -> {state}")
+            metrics.inc("circuit_transitions_total", breaker=self.name, to=state)
+        self._state = state
+        self._publish()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self.retry_in() == 0:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets the next probe through."""
+        if self._state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may proceed now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self.retry_in() > 0:
+                    return False
+                self._transition(self.HALF_OPEN)
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def release_probe(self):
+        """Forget an abandoned half-open probe so the next call can probe again."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self, error: str = ""):
+        with self._lock:
+            self._failures += 1
+            self.last_error = error
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+
 # ============================================================================
 # MCP Client
 # ============================================================================
 
 
-class MCPClient:
-    """MCP client for tool discovery and execution via SSE or Streamable HTTP."""
+def _mcp_http_client(headers: Optional[dict] = None, timeout=None, auth=None):
+    """
+    ``httpx_client_factory`` for the MCP transports, applying the MCP_HTTP2,
+    MCP_ACCEPT_ENCODING, timeout and connection-limit settings.
+    """
+    import httpx
+
+    config = get_config()
+    base = timeout or httpx.Timeout(config.mcp_http_timeout, read=config.mcp_read_timeout)
+    merged = {"Accept-Encoding": config.mcp_accept_encoding} if config.mcp_accept_encoding else {}
+    merged.update(headers or {})
+    return httpx.AsyncClient(
+        headers=merged,
+        timeout=httpx.Timeout(
+            connect=config.mcp_connect_timeout or None,
+            read=base.read,
+            write=base.write,
+            pool=base.pool,
+        ),
+        auth=auth,
+        follow_redirects=True,  # as mcp's default factory: /mcp -> /mcp/
+        http2=config.mcp_http2,
+        limits=httpx.Limits(
+            max_connections=config.mcp_max_connections,
+            max_keepalive_connections=config.mcp_max_keepalive,
+            keepalive_expiry=config.mcp_keepalive_expiry,
+        ),
+    )
+
+
+def mcp_transport(url: str, transport: str):
+    """Transport context manager for ``url`` with the configured HTTP settings."""
+    config = get_config()
+    options = {
+        "timeout": config.mcp_http_timeout or None,
+        "sse_read_timeout": config.mcp_read_timeout or None,
+        "httpx_client_factory": _mcp_http_client,
+    }
+    if transport == "streamable_http":
+        from mcp.client.streamable_http import streamablehttp_client
+
+        return streamablehttp_client(url, **options)
+
+    from mcp.client.sse import sse_client
+
+    return sse_client(url, **options)
+
+
+class _PooledSession:
+    """
+    One long-lived MCP session kept open on the client's event loop.
+
+    The transport and ``ClientSession`` context managers are entered and exited
+    by a single holder task (anyio requires both to happen in the same task);
+    callers on the same loop share ``session`` for concurrent requests.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.in_flight = 0
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.session is not None and not self._closing.is_set()
+
+    async def open(self, ctx_factory):
+        """Start the holder task and wait for the session to be initialized."""
+        self._task = asyncio.create_task(self._hold(ctx_factory))
+        await self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    async def _hold(self, ctx_factory):
+        from mcp import ClientSession
+
+        try:
+            ctx = await ctx_factory()
+            async with ctx as session_data:
+                # Streamable HTTP returns (read, write, get_session_id), SSE returns (read, write)
+                read, write = session_data[0], session_data[1]
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    self.session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.session = None
+            self._closing.set()
+            self._ready.set()
+
+    async def run(self, coro):
+        """Await ``coro`` but fail fast if the session dies while it is in flight."""
+        call = asyncio.ensure_future(coro)
+        closed = asyncio.ensure_future(self._closing.wait())
+        try:
+            await asyncio.wait({call, closed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed.cancel()
+            if not call.done():
+                call.cancel()
+        if call.done() and not call.cancelled():
+            return call.result()
+        raise ConnectionError("MCP session closed while a request was in flight")
+
+    async def close(self):
+        """Ask the holder task to exit and wait briefly for the transport to close."""
+        self._closing.set()
+        if self._task is not None and not self._task.done():
+            await asyncio.wait([self._task], timeout=5)
+
+
+class MCPUnavailableError(Exception):
+    """Raised when the MCP server's circuit breaker is open."""
+
+
+class _BackgroundLoop:
+    """Owns a daemon thread running an asyncio loop for the MCP clients."""
+
+    _loop_name = "mcp-client-loop"
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background event loop that owns the pooled sessions."""
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name=self._loop_name, daemon=True
+                )
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the client loop; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run_sync(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the client loop and block for its result."""
+        return self.submit(coro).result(timeout)
+
+    async def _on_loop(self, coro):
+        """Await a coroutine that must run on the client loop from any loop."""
+        loop = self._ensure_loop()
+        try:
+            if asyncio.get_running_loop() is loop:
+                return await coro
+        except RuntimeError:
+            pass
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def _stop_loop(self, close_coro):
+        """Run ``close_coro`` on the loop, then stop the loop thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            close_coro.close()
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(close_coro, loop).result(10)
+        except Exception as e:
+            print(f"[MCP] Error closing sessions: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop = None
+
+
+class MCPClient(_BackgroundLoop):
+    """
+    MCP client for tool discovery and execution via SSE or Streamable HTTP.
+
+    Sessions are opened on a dedicated background event loop and reused across
+    calls, so only the first request pays for the connection and MCP handshake.
+    The async methods can be awaited from any event loop; ``run_sync`` is the
+    entry point for synchronous callers.
+
+    Sessions are pinged every ``ping_interval`` seconds; dead ones are
+    dropped and reconnected with jittered exponential backoff. A circuit
+    breaker fails calls fast while the server is unreachable.
+    """
 
-    def __init__(self, url: str, transport: str = "sse"):
+    def __init__(
+        self,
+        url: str,
+        transport: str = "sse",
+        pool_size: int = 1,
+        snapshot_dir: Optional[str] = None,
+        ping_interval: float = 0.0,
+        ping_timeout: float = 10.0,
+        call_attempts: int = 2,
+        reconnect_attempts: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        super().__init__()
         self.url = url
         self.transport = transport  # 'sse' or 'streamable_http'
+        self.pool_size = max(1, pool_size)
+        self.snapshot_dir = snapshot_dir
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.call_attempts = max(1, call_attempts)
+        self.reconnect_attempts = max(1, reconnect_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker(f"mcp:{url}")
+        self.last_ping_ok = 0.0  # time.time() of the last successful keepalive
         self._tools: list[dict] = []
         self._tools_for_openai: list[dict] = []
+        self._tools_updated_at = 0.0  # time.time() of the last discovery or snapshot
+        self._tools_from_snapshot = False
+        self._raw_tools: list[dict] = []
+        self._validators: dict[str, "ToolArgValidator"] = {}
+        self._refresh_future = None
+
+        self._sessions: list[_PooledSession] = []
+        self._open_lock: Optional[asyncio.Lock] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+        self.load_snapshot()
+
+    # ------------------------------------------------------------------
+    # Session pool
+    # ------------------------------------------------------------------
 
     async def _get_session_context(self):
         """Get appropriate client context based on transport."""
+        return mcp_transport(self.url, self.transport)
 
-        if self.transport == "streamable_http":
-            from mcp.client.streamable_http import streamablehttp_client
+    async def _open_session(self) -> _PooledSession:
+        pooled = _PooledSession()
+        try:
+            await pooled.open(self._get_session_context)
+        except Exception:
+            metrics.inc("mcp_connect_failures_total", server=self.url)
+            raise
+        self._sessions.append(pooled)
+        metrics.inc("mcp_sessions_opened_total", server=self.url)
+        self._publish_pool()
+        self._ensure_keepalive()
+        return pooled
+
+    def _publish_pool(self):
+        metrics.set(
+            "mcp_pool_sessions",
+            sum(1 for s in self._sessions if s.alive),
+            server=self.url,
+        )
 
-            return streamablehttp_client(self.url)
-        else:
-            from mcp.client.sse import sse_client
+    async def _acquire(self) -> _PooledSession:
+        """Return the least-busy live session, opening new ones up to pool_size."""
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+
+        self._sessions = [s for s in self._sessions if s.alive]
+        idle = [s for s in self._sessions if s.in_flight == 0]
+        if idle:
+            return idle[0]
+
+        async with self._open_lock:
+            self._sessions = [s for s in self._sessions if s.alive]
+            if len(self._sessions) < self.pool_size:
+                return await self._open_session()
+        return min(self._sessions, key=lambda s: s.in_flight)
+
+    async def _discard(self, pooled: _PooledSession):
+        if pooled in self._sessions:
+            self._sessions.remove(pooled)
+        self._publish_pool()
+        await pooled.close()
+
+    def _unavailable_message(self) -> str:
+        retry_in = self.breaker.retry_in()
+        when = f" in ~{retry_in:.0f}s" if retry_in >= 1 else " shortly"
+        return (
+            "⚠️ The MetaTrader 5 server is temporarily unreachable. "
+            f"Reconnecting automatically{when}; please try again then."
+        )
 
-            return sse_client(self.url)
+    async def _with_session(self, fn):
+        """
+        Run ``await fn(session)`` on a pooled session.
 
-    async def list_tools(self) -> list[dict]:
-        """Discover available tools from MCP server."""
-        try:
-            from mcp import ClientSession
+        Transport failures discard the session and retry on a fresh one with
+        jittered backoff (up to ``call_attempts``); a call that still fails
+        counts against the circuit breaker.
+        """
+        if not self.breaker.allow():
+            metrics.inc("mcp_calls_rejected_total", server=self.url)
+            raise MCPUnavailableError(self._unavailable_message())
 
-            # Handle both SSE (2 values) and Streamable HTTP (3 values)
-            ctx = await self._get_session_context()
-            async with ctx as session_data:
-                # Streamable HTTP returns (read, write, get_session_id), SSE returns (read, write)
-                if len(session_data) == 3:
-                    read, write, _ = session_data
-                else:
-                    read, write = session_data
+        last_error: Optional[Exception] = None
+        try:
+            for attempt in range(self.call_attempts):
+                if attempt:
+                    await asyncio.sleep(
+                        _backoff_delay(attempt - 1, self.backoff_base, self.backoff_max)
+                    )
+                pooled = None
+                try:
+                    pooled = await self._acquire()
+                    pooled.in_flight += 1
+                    try:
+                        result = await pooled.run(fn(pooled.session))
+                    finally:
+                        pooled.in_flight -= 1
+                    self.breaker.record_success()
+                    return result
+                except Exception as e:
+                    last_error = e
+                    metrics.inc("mcp_transport_errors_total", server=self.url)
+                    if pooled is not None:
+                        await self._discard(pooled)
+                    print(
+                        f"[MCP] Attempt {attempt + 1}/{self.call_attempts} failed: "
+                        f"{_describe_error(e)}"
+                    )
+        except BaseException:
+            # Cancelled (turn deadline, Stop, disconnect): the outcome says
+            # nothing about the server, but a half-open probe must be freed
+            self.breaker.release_probe()
+            raise
+
+        self.breaker.record_failure(_describe_error(last_error))
+        raise last_error
+
+    # ------------------------------------------------------------------
+    # Health checks
+    # ------------------------------------------------------------------
+
+    def _ensure_keepalive(self):
+        if self.ping_interval <= 0:
+            return
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.create_task(self._keepalive())
+
+    async def _keepalive(self):
+        """
+        Ping sessions periodically and rebuild the pool when it empties.
+
+        Busy sessions are pinged too: a transport that died mid-request never
+        answers, and discarding the session fails its pending calls over.
+        """
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            for pooled in list(self._sessions):
+                if not pooled.alive:
+                    continue
+                start = time.perf_counter()
+                try:
+                    await asyncio.wait_for(pooled.session.send_ping(), self.ping_timeout)
+                    metrics.observe(
+                        "mcp_ping_seconds", time.perf_counter() - start, server=self.url
+                    )
+                    self.last_ping_ok = time.time()
+                except Exception as e:
+                    metrics.inc("mcp_ping_failures_total", server=self.url)
+                    print(f"[MCP] Keepalive ping failed: {_describe_error(e)}")
+                    await self._discard(pooled)
+
+            if not any(s.alive for s in self._sessions):
+                await self._reconnect()
+
+    async def _reconnect(self) -> bool:
+        """Re-open one session with jittered exponential backoff."""
+        for attempt in range(self.reconnect_attempts):
+            delay = self.breaker.retry_in() or _backoff_delay(
+                attempt, self.backoff_base, self.backoff_max
+            )
+            await asyncio.sleep(delay)
+            if not self.breaker.allow():
+                continue
+            try:
+                await self._open_session()
+            except Exception as e:
+                self.breaker.record_failure(_describe_error(e))
+                print(f"[MCP] Reconnect attempt {attempt + 1} failed: {_describe_error(e)}")
+                continue
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            metrics.inc("mcp_reconnects_total", server=self.url)
+            print(f"[MCP] Reconnected to {self.url}")
+            return True
+        return False
+
+    def status(self) -> dict:
+        """Connection health summary for the UI."""
+        return {
+            "server": self.url,
+            "transport": self.transport,
+            "circuit": self.breaker.state,
+            "retry_in": round(self.breaker.retry_in(), 1),
+            "sessions": sum(1 for s in self._sessions if s.alive),
+            "pool_size": self.pool_size,
+            "in_flight": sum(s.in_flight for s in self._sessions),
+            "last_ping_ok": self.last_ping_ok,
+            "last_error": self.breaker.last_error,
+        }
 
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.list_tools()
+    async def _connect(self) -> int:
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+        async with self._open_lock:
+            self._sessions = [s for s in self._sessions if s.alive]
+            while len(self._sessions) < self.pool_size:
+                await self._open_session()
+        return len(self._sessions)
+
+    async def connect(self) -> int:
+        """Open the full session pool ahead of time. Returns the number of sessions."""
+        return await self._on_loop(self._connect())
+
+    async def _close(self):
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+        sessions, self._sessions = self._sessions, []
+        for pooled in sessions:
+            await pooled.close()
+
+    def close(self):
+        """Close pooled sessions and stop the background loop."""
+        self._stop_loop(self._close())
+
+    # ------------------------------------------------------------------
+    # Tool discovery and snapshot
+    # ------------------------------------------------------------------
+
+    def _set_tools(self, raw_tools: list[dict]):
+        """Rebuild the tool caches from raw ``{name, description, inputSchema}`` dicts."""
+        tools = []
+        tools_for_openai = []
+        for tool in raw_tools:
+            schema = tool.get("inputSchema") or {}
+            tools.append(
+                {
+                    "name": tool["name"],
+                    "description": tool.get("description") or "",
+                    "parameters": schema.get("properties", {}),
+                    "required": schema.get("required", []),
+                }
+            )
 
-                    self._tools = []
-                    self._tools_for_openai = []
-
-                    for tool in result.tools:
-                        tool_info = {
-                            "name": tool.name,
-                            "description": tool.description or "",
-                            "parameters": (
-                                tool.inputSchema.get("properties", {})
-                                if tool.inputSchema
-                                else {}
-                            ),
-                            "required": (
-                                tool.inputSchema.get("required", [])
-                                if tool.inputSchema
-                                else []
-                            ),
-                        }
-                        self._tools.append(tool_info)
+            # Pre-format for OpenAI
+            tools_for_openai.append(
+                {
+                    "type": "function",
+                    "function": {
+                        "name": tool["name"],
+                        "description": (tool.get("description") or "No description")[
+                            :1024
+                        ],
+                        "parameters": {
+                            "type": "object",
+                            "properties": schema.get("properties", {}),
+                            "required": schema.get("required", []),
+                        },
+                    },
+                }
+            )
+        self._raw_tools = raw_tools
+        self._tools = tools
+        self._tools_for_openai = tools_for_openai
+        self._validators = {
+            tool["name"]: ToolArgValidator(tool["name"], tool.get("inputSchema") or {})
+            for tool in raw_tools
+        }
 
-                        # Pre-format for OpenAI
-                        self._tools_for_openai.append(
-                            {
-                                "type": "function",
-                                "function": {
-                                    "name": tool.name,
-                                    "description": (
-                                        tool.description or "No description"
-                                    )[:1024],
-                                    "parameters": {
-                                        "type": "object",
-                                        "properties": (
-                                            tool.inputSchema.get("properties", {})
-                                            if tool.inputSchema
-                                            else {}
-                                        ),
-                                        "required": (
-                                            tool.inputSchema.get("required", [])
-                                            if tool.inputSchema
-                                            else []
-                                        ),
-                                    },
-                                },
-                            }
-                        )
+    def server_identity(self, tool_name: str) -> str:
+        """The server answering ``tool_name`` (keys data persisted across restarts)."""
+        return f"{self.transport}|{self.url}"
 
-                    return self._tools
+    def tools_fingerprint(self) -> str:
+        """Hash of the tool schemas; servers with equal fingerprints are replicas."""
+        canonical = json.dumps(
+            sorted(self._raw_tools, key=lambda tool: tool["name"]), sort_keys=True
+        )
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    def _snapshot_path(self) -> Optional[Path]:
+        if not self.snapshot_dir:
+            return None
+        key = hashlib.sha256(f"{self.transport}|{self.url}".encode()).hexdigest()[:16]
+        return Path(self.snapshot_dir) / f"tools_{key}.json"
+
+    def load_snapshot(self) -> bool:
+        """Load tool schemas persisted by a previous run, if any."""
+        path = self._snapshot_path()
+        if path is None or not path.exists():
+            return False
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("url") != self.url or not data.get("tools"):
+                return False
+            self._set_tools(data["tools"])
+            self._tools_updated_at = float(data.get("saved_at", 0))
+            self._tools_from_snapshot = True
+            print(f"[MCP] Loaded {len(self._tools)} tool schemas from snapshot {path}")
+            return True
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[MCP] Ignoring unreadable tool snapshot {path}: {e}")
+            return False
+
+    def save_snapshot(self, raw_tools: list[dict]):
+        """Persist raw tool schemas so the next start can skip discovery."""
+        path = self._snapshot_path()
+        if path is None:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(
+                json.dumps(
+                    {
+                        "url": self.url,
+                        "transport": self.transport,
+                        "saved_at": time.time(),
+                        "tools": raw_tools,
+                    }
+                ),
+                encoding="utf-8",
+            )
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[MCP] Failed to write tool snapshot {path}: {e}")
+
+    def has_tools(self) -> bool:
+        """Whether tool schemas are available (from discovery or snapshot)."""
+        return bool(self._tools_for_openai)
+
+    def tools_age(self) -> float:
+        """Seconds since the cached tool list was discovered."""
+        if not self._tools_updated_at:
+            return float("inf")
+        return time.time() - self._tools_updated_at
+
+    def refresh_tools_in_background(self):
+        """Start tool discovery without waiting for it (at most one at a time)."""
+        if self._refresh_future is not None and not self._refresh_future.done():
+            return self._refresh_future
+        self._refresh_future = self.submit(self._list_tools())
+        return self._refresh_future
+
+    async def _list_tools(self) -> list[dict]:
+        try:
+            result = await self._with_session(lambda session: session.list_tools())
 
+            raw_tools = [
+                {
+                    "name": tool.name,
+                    "description": tool.description or "",
+                    "inputSchema": tool.inputSchema or {},
+                }
+                for tool in result.tools
+            ]
+            self._set_tools(raw_tools)
+            self._tools_updated_at = time.time()
+            self._tools_from_snapshot = False
+            self.save_snapshot(raw_tools)
+            return self._tools
+
+        except MCPUnavailableError:
+            print(f"[MCP] Skipping tool discovery: circuit open for {self.url}")
+            return []
         except Exception as e:
             print(f"[MCP] Error listing tools: {e}")
             import traceback
@@ -419,69 +1378,369 @@ class MCPClient:
             traceback.print_exc()
             return []
 
-    async def call_tool(self, name: str, arguments: dict) -> dict:
-        """Call an MCP tool."""
+    async def list_tools(self) -> list[dict]:
+        """Discover available tools from MCP server."""
+        return await self._on_loop(self._list_tools())
+
+    # ------------------------------------------------------------------
+    # Tool execution
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _format_result(result) -> dict:
+        # Extract content
+        if result.content:
+            if len(result.content) == 1:
+                content = (
+                    result.content[0].text
+                    if hasattr(result.content[0], "text")
+                    else str(result.content[0])
+                )
+            else:
+                content = "\n".join(
+                    [c.text if hasattr(c, "text") else str(c) for c in result.content]
+                )
+        else:
+            content = "No output"
+
+        is_error = getattr(result, "isError", False)
+
+        if is_error:
+            return {"error": content}
+        return {"result": content}
+
+    async def _notify_cancelled(self, session, request_id: int):
+        """Tell the server to stop working on a request we no longer wait for."""
+        from mcp import types
+
         try:
-            from mcp import ClientSession
+            await session.send_notification(
+                types.ClientNotification(
+                    types.CancelledNotification(
+                        method="notifications/cancelled",
+                        params=types.CancelledNotificationParams(
+                            requestId=request_id, reason="cancelled by client"
+                        ),
+                    )
+                )
+            )
+        except Exception as e:
+            print(f"[MCP] Failed to send cancellation for request {request_id}: {e}")
 
-            ctx = await self._get_session_context()
-            async with ctx as session_data:
-                # Handle both SSE (2 values) and Streamable HTTP (3 values)
-                if len(session_data) == 3:
-                    read, write, _ = session_data
-                else:
-                    read, write = session_data
+    async def _call_tool(self, name: str, arguments: dict) -> dict:
+        formatted, _status = await self._call_tool_status(name, arguments)
+        return formatted
 
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    result = await session.call_tool(name, arguments)
-
-                    # Extract content
-                    if result.content:
-                        if len(result.content) == 1:
-                            content = (
-                                result.content[0].text
-                                if hasattr(result.content[0], "text")
-                                else str(result.content[0])
-                            )
-                        else:
-                            content = "\n".join(
-                                [
-                                    c.text if hasattr(c, "text") else str(c)
-                                    for c in result.content
-                                ]
-                            )
-                    else:
-                        content = "No output"
+    async def _call_tool_status(self, name: str, arguments: dict) -> tuple[dict, str]:
+        """
+        Call a tool and report how it went.
 
-                    is_error = getattr(result, "isError", False)
+        Returns ``(result, status)`` where status is ``ok``, ``error`` (the tool
+        reported an error), ``rejected`` (circuit open) or ``failed`` (the
+        server could not be reached).
+        """
 
-                    if is_error:
-                        return {"error": content}
-                    return {"result": content}
+        async def _invoke(session):
+            # The SDK assigns the next id synchronously when the request is sent,
+            # so this is the id to reference if the call gets cancelled.
+            request_id = getattr(session, "_request_id", None)
+            try:
+                return await session.call_tool(name, arguments)
+            except asyncio.CancelledError:
+                if request_id is not None and session is not None:
+                    asyncio.ensure_future(self._notify_cancelled(session, request_id))
+                raise
 
+        start = time.perf_counter()
+        try:
+            result = await self._with_session(_invoke)
+            formatted = self._format_result(result)
+            status = "error" if "error" in formatted else "ok"
+        except asyncio.CancelledError:
+            metrics.inc("mcp_calls_total", tool=name, status="cancelled")
+            raise
+        except MCPUnavailableError as e:
+            formatted, status = {"error": str(e), "unavailable": True}, "rejected"
         except Exception as e:
-            return {"error": str(e)}
+            formatted, status = {"error": _describe_error(e)}, "failed"
+        metrics.inc("mcp_calls_total", tool=name, status=status)
+        metrics.observe("mcp_call_seconds", time.perf_counter() - start, tool=name)
+        return formatted, status
+
+    async def call_tool(self, name: str, arguments: dict) -> dict:
+        """Call an MCP tool."""
+        return await self._on_loop(self._call_tool(name, arguments))
 
     def get_tools_for_openai(self) -> list[dict]:
         """Get tools formatted for OpenAI function calling."""
         return self._tools_for_openai
 
+    def get_validator(self, name: str) -> Optional["ToolArgValidator"]:
+        """Precompiled argument validator for ``name`` (None if unknown)."""
+        return self._validators.get(name)
+
+    def endpoint_statuses(self) -> list[dict]:
+        """Per-server health rows for the UI."""
+        return [self.status()]
+
+
+class MCPFederation(_BackgroundLoop):
+    """
+    Several MCP servers (one per MT5 terminal) behind the ``MCPClient`` interface.
+
+    Servers whose tool schemas are identical form a replica group: each call
+    goes to one replica, picked by ``routing`` (``least_loaded``: fewest calls
+    in flight, ``latency``: lowest smoothed call latency weighted by load),
+    and fails over to the next replica when a server is unreachable or its
+    circuit is open. Tools from different groups are merged; names that clash
+    across groups are exposed as ``<alias>__<tool>``.
+    """
+
+    _loop_name = "mcp-federation-loop"
+    _LATENCY_ALPHA = 0.3  # weight of the newest sample in the latency average
+
+    def __init__(self, members: list[tuple[str, MCPClient]], routing: str = "least_loaded"):
+        super().__init__()
+        if routing not in ("least_loaded", "latency"):
+            print(f"[MCP] Unknown MCP_ROUTING {routing!r}; using least_loaded")
+            routing = "least_loaded"
+        self.routing = routing
+        self.members = [client for _alias, client in members]
+        self.aliases: dict[MCPClient, str] = {}
+        for index, (alias, client) in enumerate(members):
+            self.aliases[client] = re.sub(r"[^A-Za-z0-9_-]", "_", alias) or f"mt5_{index + 1}"
+        self.url = ", ".join(client.url for client in self.members)
+        self.transport = self.members[0].transport
+        self._in_flight = {client: 0 for client in self.members}
+        self._latency = {client: 0.0 for client in self.members}
+        self._routes: dict[str, tuple[list[MCPClient], str]] = {}
+        self._tools: list[dict] = []
+        self._tools_for_openai: list[dict] = []
+        self._validators: dict[str, "ToolArgValidator"] = {}
+        self._refresh_future = None
+        self._rebuild_routes()
+
+    # ------------------------------------------------------------------
+    # Tool merging
+    # ------------------------------------------------------------------
+
+    def _rebuild_routes(self):
+        """Group servers into replica sets and merge their tool lists."""
+        groups: dict[str, list[MCPClient]] = {}
+        for client in self.members:
+            if client.has_tools():
+                groups.setdefault(client.tools_fingerprint(), []).append(client)
+
+        name_counts: dict[str, int] = {}
+        for replicas in groups.values():
+            for tool in replicas[0]._tools:
+                name_counts[tool["name"]] = name_counts.get(tool["name"], 0) + 1
+
+        routes = {}
+        validators = {}
+        tools = []
+        tools_for_openai = []
+        for replicas in groups.values():
+            primary = replicas[0]
+            prefix = self.aliases[primary]
+            for tool, openai_tool in zip(primary._tools, primary._tools_for_openai):
+                name = tool["name"]
+                exposed = name if name_counts[name] == 1 else f"{prefix}__{name}"[:64]
+                routes[exposed] = (replicas, name)
+                validators[exposed] = primary._validators.get(name)
+                tools.append({**tool, "name": exposed})
+                function = dict(openai_tool["function"], name=exposed)
+                if exposed != name:
+                    function["description"] = f"[{prefix}] {function['description']}"[
+                        :1024
+                    ]
+                tools_for_openai.append({"type": "function", "function": function})
+
+        self._routes = routes
+        self._validators = validators
+        self._tools = tools
+        self._tools_for_openai = tools_for_openai
+
+    def has_tools(self) -> bool:
+        return bool(self._tools_for_openai)
+
+    def tools_age(self) -> float:
+        """Age of the stalest member's tool list."""
+        return max(client.tools_age() for client in self.members)
+
+    def refresh_tools_in_background(self):
+        if self._refresh_future is not None and not self._refresh_future.done():
+            return self._refresh_future
+        self._refresh_future = self.submit(self._list_tools())
+        return self._refresh_future
+
+    async def _list_tools(self) -> list[dict]:
+        await asyncio.gather(*(client.list_tools() for client in self.members))
+        self._rebuild_routes()
+        return self._tools
+
+    async def list_tools(self) -> list[dict]:
+        """Discover tools on every server and merge them."""
+        return await self._on_loop(self._list_tools())
+
+    def get_tools_for_openai(self) -> list[dict]:
+        return self._tools_for_openai
+
+    def get_validator(self, name: str) -> Optional["ToolArgValidator"]:
+        return self._validators.get(name)
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def _rank(self, replicas: list[MCPClient]) -> list[MCPClient]:
+        """Order replicas best-first; servers with an open circuit go last."""
+
+        def _key(client: MCPClient):
+            circuit_open = client.breaker.state == CircuitBreaker.OPEN
+            in_flight = self._in_flight[client]
+            if self.routing == "latency":
+                return (circuit_open, self._latency[client] * (1 + in_flight), in_flight)
+            return (circuit_open, in_flight, self._latency[client])
+
+        return sorted(replicas, key=_key)
+
+    def _record_latency(self, client: MCPClient, seconds: float):
+        previous = self._latency[client]
+        alpha = self._LATENCY_ALPHA
+        self._latency[client] = seconds if not previous else (
+            alpha * seconds + (1 - alpha) * previous
+        )
+        metrics.set("mcp_latency_ewma_seconds", self._latency[client], server=client.url)
+
+    async def _call_tool(self, name: str, arguments: dict) -> dict:
+        route = self._routes.get(name)
+        if route is None:
+            return {"error": f"Unknown tool: {name}"}
+        replicas, tool_name = route
+
+        result: dict = {"error": f"No server available for {name}"}
+        for attempt, client in enumerate(self._rank(replicas)):
+            if attempt:
+                metrics.inc("mcp_failovers_total", tool=tool_name)
+                print(f"[MCP] Failing over {tool_name} to {client.url}")
+            self._in_flight[client] += 1
+            start = time.perf_counter()
+            try:
+                result, status = await client._on_loop(
+                    client._call_tool_status(tool_name, arguments)
+                )
+            finally:
+                self._in_flight[client] -= 1
+            metrics.inc("mcp_routed_calls_total", server=client.url, status=status)
+            if status in ("ok", "error"):
+                self._record_latency(client, time.perf_counter() - start)
+                return result
+        return result
+
+    def server_identity(self, tool_name: str) -> str:
+        """The replica group answering ``tool_name`` (any of them may serve a call)."""
+        route = self._routes.get(tool_name)
+        replicas = route[0] if route else self.members
+        return ", ".join(sorted(client.server_identity(tool_name) for client in replicas))
+
+    async def call_tool(self, name: str, arguments: dict) -> dict:
+        """Call a tool on the best available replica."""
+        return await self._on_loop(self._call_tool(name, arguments))
+
+    # ------------------------------------------------------------------
+    # Lifecycle and health
+    # ------------------------------------------------------------------
+
+    async def _connect(self) -> int:
+        results = await asyncio.gather(
+            *(client.connect() for client in self.members), return_exceptions=True
+        )
+        opened = [r for r in results if not isinstance(r, BaseException)]
+        for client, r in zip(self.members, results):
+            if isinstance(r, BaseException):
+                print(f"[MCP] Could not connect to {client.url}: {_describe_error(r)}")
+        if not opened:
+            raise results[0]
+        return sum(opened)
+
+    async def connect(self) -> int:
+        """Open every server's session pool. Fails only if no server is reachable."""
+        return await self._on_loop(self._connect())
+
+    def close(self):
+        for client in self.members:
+            client.close()
+        self._stop_loop(asyncio.sleep(0))
+
+    def status(self) -> dict:
+        rows = self.endpoint_statuses()
+        return {
+            "server": self.url,
+            "transport": self.transport,
+            "servers": len(rows),
+            "sessions": sum(row["sessions"] for row in rows),
+            "in_flight": sum(row["in_flight"] for row in rows),
+        }
+
+    def endpoint_statuses(self) -> list[dict]:
+        rows = []
+        for client in self.members:
+            row = client.status()
+            row["alias"] = self.aliases[client]
+            row["latency"] = self._latency[client]
+            rows.append(row)
+        return rows
+
+
+_mcp_client = None
+_mcp_client_key: Optional[tuple] = None
+_mcp_client_lock = threading.Lock()
+
+
+def _build_mcp_client(url: str, config: Config) -> MCPClient:
+    return MCPClient(
+        url,
+        config.mcp_transport,
+        pool_size=config.mcp_pool_size,
+        snapshot_dir=config.mcp_snapshot_dir,
+        ping_interval=config.mcp_ping_interval,
+        ping_timeout=config.mcp_ping_timeout,
+        reconnect_attempts=config.mcp_reconnect_attempts,
+        backoff_base=config.mcp_backoff_base,
+        backoff_max=config.mcp_backoff_max,
+        breaker=CircuitBreaker(
+            f"mcp:{url}",
+            failure_threshold=config.mcp_breaker_threshold,
+            reset_timeout=config.mcp_breaker_reset,
+        ),
+    )
 
-_mcp_client: Optional[MCPClient] = None
 
+def get_mcp_client():
+    """
+    Get or create the MCP client.
 
-def get_mcp_client() -> MCPClient:
-    """Get or create MCP client."""
-    global _mcp_client
+    Returns an ``MCPClient``, or an ``MCPFederation`` (same interface) when
+    ``MCP_URLS`` lists several servers.
+    """
+    global _mcp_client, _mcp_client_key
     config = get_config()
-    if (
-        _mcp_client is None
-        or _mcp_client.url != config.mcp_url
-        or _mcp_client.transport != config.mcp_transport
-    ):
-        _mcp_client = MCPClient(config.mcp_url, config.mcp_transport)
-    return _mcp_client
+    endpoints = config.mcp_endpoints()
+    key = (tuple(endpoints), config.mcp_transport, config.mcp_routing)
+    with _mcp_client_lock:
+        if _mcp_client is None or _mcp_client_key != key:
+            if _mcp_client is not None:
+                _mcp_client.close()
+            if len(endpoints) == 1:
+                _mcp_client = _build_mcp_client(endpoints[0][1], config)
+            else:
+                _mcp_client = MCPFederation(
+                    [(alias, _build_mcp_client(url, config)) for alias, url in endpoints],
+                    routing=config.mcp_routing,
+                )
+            _mcp_client_key = key
+        return _mcp_client
 
 
 # ============================================================================
@@ -489,6 +1748,10 @@ def get_mcp_client() -> MCPClient:
 # ============================================================================
 
 
+_llm_clients: dict = {}
+_llm_clients_lock = threading.Lock()
+
+
 def get_llm_client(
     provider: str = None,
     api_key: str = None,
@@ -505,15 +1768,34 @@ def get_llm_client(
     - azure_foundry: Microsoft Foundry / Azure AI (uses OpenAI SDK with base_url)
     - azure_ai_inference: Azure AI Inference SDK (uses azure.ai.inference)
     - ollama: Local Ollama instance
+
+    Without arguments, returns the ``LLMRouter`` when ``LLM_DEPLOYMENTS`` is set.
     """
     config = get_config()
 
+    if config.llm_deployments and not any((provider, api_key, base_url, model, api_version)):
+        return get_llm_router()
+
     # Use provided values or fall back to config
     provider = provider or config.llm_provider
     api_key = api_key or config.llm_api_key
     base_url = base_url or config.llm_base_url
     api_version = api_version or config.llm_api_version
 
+    # Reuse clients so their HTTP connection pools (and TLS sessions) survive
+    # across turns instead of being rebuilt for every message.
+    cache_key = (provider, api_key, base_url, api_version)
+    with _llm_clients_lock:
+        client = _llm_clients.get(cache_key)
+        if client is None:
+            client = _create_llm_client(provider, api_key, base_url, api_version)
+            if client is not None:
+                _llm_clients[cache_key] = client
+    return client
+
+
+def _create_llm_client(provider: str, api_key: str, base_url: str, api_version: str):
+    """Instantiate a new LLM client (see ``get_llm_client``)."""
     try:
         if provider == "ollama":
             from openai import OpenAI
@@ -521,6 +1803,11 @@ def get_llm_client(
             ollama_url = base_url or os.getenv(
                 "OLLAMA_BASE_URL", "http://localhost:11434/v1"
             )
+            config = get_config()
+            if config.ollama_native:
+                return OllamaNativeClient(
+                    ollama_url, config.ollama_keep_alive, config.ollama_num_ctx
+                )
             return OpenAI(base_url=ollama_url, api_key="ollama")
 
         elif provider == "azure_openai":
@@ -564,13 +1851,22 @@ def get_llm_client(
             return OpenAI(base_url=actual_url, api_key=actual_key)
 
         elif provider == "azure_ai_inference":
-            # Azure AI Inference SDK - different API, returns wrapper
-            # This requires special handling in chat functions
-            return {
-                "type": "azure_ai_inference",
-                "api_key": api_key,
-                "base_url": base_url,
-            }
+            # Azure AI Inference SDK - adapted to the OpenAI client interface
+            actual_key = (
+                api_key or os.getenv("LLM_API_KEY") or os.getenv("AZURE_AI_API_KEY")
+            )
+            actual_url = (
+                base_url or os.getenv("LLM_BASE_URL") or os.getenv("AZURE_AI_ENDPOINT")
+            )
+            if not actual_key or not actual_url:
+                return None
+            try:
+                return AzureInferenceClient(
+                    actual_url, actual_key, api_version or "2024-05-01-preview"
+                )
+            except ImportError:
+                print("[LLM] azure-ai-inference not installed. Run: pip install azure-ai-inference")
+                return None
 
         else:
             # Default: OpenAI or custom OpenAI-compatible endpoint
@@ -593,68 +1889,2909 @@ def get_llm_client(
         return None
 
 
-def _chat_with_azure_ai_inference(
-    message: str, history: list, llm_config: dict, config, mcp
-) -> str:
+class AzureInferenceClient:
     """
-    Handle chat with Azure AI Inference SDK.
-    This SDK has a different API than OpenAI.
+    Azure AI Inference client shaped like the parts of ``openai.OpenAI`` the
+    chat pipeline uses (``chat.completions.create``, ``models.list`` and
+    ``with_options``).
+
+    One ``ChatCompletionsClient`` (and its connection pool) is shared by every
+    copy returned from ``with_options``, so the provider gets the same tool
+    calling, streaming, routing and client reuse as the OpenAI path.
     """
-    try:
-        from azure.ai.inference import ChatCompletionsClient
-        from azure.ai.inference.models import (
-            AssistantMessage,
-            SystemMessage,
-            UserMessage,
-        )
-        from azure.core.credentials import AzureKeyCredential
-    except ImportError:
-        return "❌ azure-ai-inference package not installed.\nRun: pip install azure-ai-inference"
-
-    api_key = (
-        llm_config.get("api_key")
-        or os.getenv("LLM_API_KEY")
-        or os.getenv("AZURE_AI_API_KEY")
-    )
-    base_url = (
-        llm_config.get("base_url")
-        or os.getenv("LLM_BASE_URL")
-        or os.getenv("AZURE_AI_ENDPOINT")
-    )
 
-    if not api_key or not base_url:
-        return "❌ Azure AI Inference requires API key and endpoint URL."
+    def __init__(self, endpoint: str, api_key: str, api_version: str, _client=None, **options):
+        from types import SimpleNamespace
 
-    client = ChatCompletionsClient(
-        endpoint=base_url,
-        credential=AzureKeyCredential(api_key),
-        api_version=config.llm_api_version or "2024-05-01-preview",
+        if _client is None:
+            from azure.ai.inference import ChatCompletionsClient
+            from azure.core.credentials import AzureKeyCredential
+
+            _client = ChatCompletionsClient(
+                endpoint=endpoint,
+                credential=AzureKeyCredential(api_key),
+                api_version=api_version,
+            )
+        self._client = _client
+        self._endpoint = endpoint
+        self._api_key = api_key
+        self._api_version = api_version
+        self._options = options  # per-request azure-core keywords
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.models = SimpleNamespace(list=self._list_models)
+
+    def with_options(self, timeout: float = None, max_retries: int = None):
+        """Copy sharing the same connection pool, like ``OpenAI.with_options``."""
+        options = dict(self._options)
+        if timeout is not None:
+            options["timeout"] = timeout  # whole operation, retries included
+            options["read_timeout"] = timeout
+        if max_retries is not None:
+            options["retry_total"] = max_retries
+        return AzureInferenceClient(
+            self._endpoint, self._api_key, self._api_version, _client=self._client, **options
+        )
+
+    def _create(self, stream: bool = False, timeout: float = None, model: str = None, **kwargs):
+        if timeout is not None:
+            return self.with_options(timeout=timeout)._create(stream=stream, model=model, **kwargs)
+        response = self._client.complete(
+            stream=stream, model=model or None, **kwargs, **self._options
+        )
+        return _AzureInferenceStream(response) if stream else response
+
+    def _list_models(self):
+        # Serverless and managed endpoints describe their model at /info
+        return self._client.get_model_info(**self._options)
+
+    def close(self):
+        self._client.close()
+
+
+class _AzureInferenceStream:
+    """
+    Azure streaming response as OpenAI-style chunks.
+
+    Azure tool call updates may carry no ``index``; a new call id starts the
+    next call and updates without an id continue the current one, which is
+    how ``_complete_once`` groups argument fragments.
+    """
+
+    def __init__(self, response):
+        self._response = response
+
+    def close(self):
+        self._response.close()
+
+    def __iter__(self):
+        from types import SimpleNamespace
+
+        index = -1
+        for update in self._response:
+            choices = []
+            for choice in update.choices or []:
+                delta = choice.delta
+                tool_calls = []
+                for call in (delta.tool_calls if delta is not None else None) or []:
+                    if call.get("index") is not None:
+                        index = call["index"]
+                    elif call.id or index < 0:
+                        index += 1
+                    tool_calls.append(
+                        SimpleNamespace(index=index, id=call.id, function=call.function)
+                    )
+                choices.append(
+                    SimpleNamespace(
+                        index=choice.index,
+                        finish_reason=choice.finish_reason,
+                        delta=SimpleNamespace(
+                            content=delta.content if delta is not None else None,
+                            tool_calls=tool_calls or None,
+                        ),
+                    )
+                )
+            yield SimpleNamespace(choices=choices, usage=update.get("usage"))
+
+
+# ============================================================================
+# Ollama Native API
+# ============================================================================
+
+_ollama_timings: dict[str, dict] = {}  # model -> timings of its latest response
+
+
+class OllamaError(Exception):
+    """Non-2xx response from the Ollama API."""
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        try:
+            detail = response.json().get("error") or response.text
+        except ValueError:
+            detail = response.text
+        super().__init__(f"Ollama HTTP {response.status_code}: {detail[:300]}")
+
+
+def _ollama_native_url(base_url: str) -> str:
+    """Ollama server root from an OpenAI-compatible base URL (``.../v1``)."""
+    url = (base_url or "http://localhost:11434").rstrip("/")
+    return url[: -len("/v1")] if url.endswith("/v1") else url
+
+
+def _ollama_keep_alive(value: str):
+    """``keep_alive`` as Ollama expects it: seconds as a number, else a duration."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _to_ollama_messages(messages: list[dict]) -> list[dict]:
+    """OpenAI-format chat messages in Ollama's ``/api/chat`` format."""
+    tool_names = {}  # tool_call_id -> function name
+    converted = []
+    for message in messages:
+        entry = {"role": message["role"], "content": message.get("content") or ""}
+        if message.get("tool_calls"):
+            entry["tool_calls"] = []
+            for call in message["tool_calls"]:
+                function = call["function"]
+                tool_names[call.get("id")] = function["name"]
+                try:
+                    arguments = json.loads(function.get("arguments") or "{}")
+                except json.JSONDecodeError:
+                    arguments = {}
+                entry["tool_calls"].append(
+                    {"function": {"name": function["name"], "arguments": arguments}}
+                )
+        if message["role"] == "tool" and message.get("tool_call_id") in tool_names:
+            entry["tool_name"] = tool_names[message["tool_call_id"]]
+        converted.append(entry)
+    return converted
+
+
+def _from_ollama_tool_calls(calls: list[dict], first_index: int = 0) -> list:
+    """Ollama tool calls (arguments as objects) in OpenAI shape."""
+    from types import SimpleNamespace
+
+    converted = []
+    for offset, call in enumerate(calls or []):
+        function = call.get("function") or {}
+        arguments = function.get("arguments")
+        if not isinstance(arguments, str):
+            arguments = json.dumps(arguments or {})
+        index = first_index + offset
+        converted.append(
+            SimpleNamespace(
+                index=index,
+                id=call.get("id") or f"call_{index}",
+                type="function",
+                function=SimpleNamespace(name=function.get("name", ""), arguments=arguments),
+            )
+        )
+    return converted
+
+
+def format_ollama_timings(timings: dict) -> str:
+    """One-line summary of an Ollama response's timings."""
+    rate = timings["eval_tokens"] / timings["eval"] if timings["eval"] else 0.0
+    return (
+        f"load {timings['load']:.2f}s, "
+        f"prompt eval {timings['prompt_tokens']} tok in {timings['prompt_eval']:.2f}s, "
+        f"eval {timings['eval_tokens']} tok in {timings['eval']:.2f}s ({rate:.1f} tok/s)"
+    )
+
+
+def _record_ollama_timings(model: str, final: dict) -> dict:
+    """Publish the timings Ollama reports on its final (``done``) response."""
+    ns = 1e-9  # Ollama reports durations in nanoseconds
+    timings = {
+        "load": final.get("load_duration", 0) * ns,
+        "prompt_eval": final.get("prompt_eval_duration", 0) * ns,
+        "prompt_tokens": final.get("prompt_eval_count", 0),
+        "eval": final.get("eval_duration", 0) * ns,
+        "eval_tokens": final.get("eval_count", 0),
+        "total": final.get("total_duration", 0) * ns,
+        "at": time.time(),
+    }
+    _ollama_timings[model] = timings
+    for phase in ("load", "prompt_eval", "eval"):
+        metrics.observe(f"ollama_{phase}_seconds", timings[phase], model=model)
+    metrics.inc("ollama_prompt_tokens_total", timings["prompt_tokens"], model=model)
+    metrics.inc("ollama_eval_tokens_total", timings["eval_tokens"], model=model)
+    print(f"[Ollama] {model}: {format_ollama_timings(timings)}")
+    return timings
+
+
+class OllamaNativeClient:
+    """
+    Ollama ``/api/chat`` client shaped like the parts of ``openai.OpenAI`` the
+    chat pipeline uses (``chat.completions.create``, ``models.list`` and
+    ``with_options``).
+
+    Every request carries ``keep_alive`` and ``num_ctx`` so the model stays
+    loaded with the same context size between turns (a different ``num_ctx``
+    forces a reload). Copies from ``with_options`` share one connection pool.
+    """
+
+    def __init__(self, base_url: str, keep_alive: str, num_ctx: int, _http=None, _timeout=None):
+        from types import SimpleNamespace
+
+        self.base_url = _ollama_native_url(base_url)
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        if _http is None:
+            import httpx
+
+            _http = httpx.Client(base_url=self.base_url, timeout=httpx.Timeout(None, connect=10))
+        self._http = _http
+        self._timeout = _timeout
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.models = SimpleNamespace(list=self._list_models)
+
+    def with_options(self, timeout: float = None, max_retries: int = None):
+        """Copy sharing the same connection pool, like ``OpenAI.with_options``."""
+        # No client-side retries are made, so max_retries needs no handling
+        return OllamaNativeClient(
+            self.base_url,
+            self.keep_alive,
+            self.num_ctx,
+            _http=self._http,
+            _timeout=self._timeout if timeout is None else timeout,
+        )
+
+    def _payload(self, model: str, messages: list, **extra) -> dict:
+        payload = {"model": model, "messages": messages, **extra}
+        if self.keep_alive:
+            payload["keep_alive"] = _ollama_keep_alive(self.keep_alive)
+        if self.num_ctx:
+            payload["options"] = {"num_ctx": self.num_ctx}
+        return payload
+
+    def _post(self, payload: dict, timeout: Optional[float]):
+        """POST /api/chat and return the (streaming) response, raising on errors."""
+        request = self._http.build_request(
+            "POST", "/api/chat", json=payload, timeout=timeout or self._timeout
+        )
+        response = self._http.send(request, stream=True)
+        if response.is_error:
+            try:
+                response.read()
+            finally:
+                response.close()
+            raise OllamaError(response)
+        return response
+
+    def _create(
+        self,
+        model: str,
+        messages: list,
+        tools: list = None,
+        stream: bool = False,
+        timeout: float = None,
+        **_unsupported,  # tool_choice: Ollama always decides itself
+    ):
+        from types import SimpleNamespace
+
+        payload = self._payload(model, _to_ollama_messages(messages), stream=stream)
+        if tools:
+            payload["tools"] = tools
+        response = self._post(payload, timeout)
+        if stream:
+            return _OllamaStream(response, model)
+        try:
+            data = json.loads(response.read())
+        finally:
+            response.close()
+        _record_ollama_timings(model, data)
+        message = data.get("message") or {}
+        tool_calls = _from_ollama_tool_calls(message.get("tool_calls"))
+        return SimpleNamespace(
+            choices=[
+                SimpleNamespace(
+                    index=0,
+                    finish_reason="tool_calls" if tool_calls else data.get("done_reason"),
+                    message=SimpleNamespace(
+                        role="assistant",
+                        content=message.get("content") or None,
+                        tool_calls=tool_calls or None,
+                    ),
+                )
+            ]
+        )
+
+    def _list_models(self):
+        response = self._http.get("/api/tags", timeout=self._timeout)
+        if response.is_error:
+            raise OllamaError(response)
+        return response.json().get("models", [])
+
+    def preload(self, model: str) -> dict:
+        """
+        Load ``model`` into memory without generating anything.
+
+        Uses the same ``keep_alive`` and ``num_ctx`` as chat requests, so the
+        first real turn finds the model ready instead of paying the load.
+        """
+        response = self._post(self._payload(model, [], stream=False), self._timeout)
+        try:
+            data = json.loads(response.read())
+        finally:
+            response.close()
+        return _record_ollama_timings(model, data)
+
+    def close(self):
+        self._http.close()
+
+
+class _OllamaStream:
+    """Ollama NDJSON chat stream as OpenAI-style chunks."""
+
+    def __init__(self, response, model: str):
+        self._response = response
+        self._model = model
+
+    def close(self):
+        self._response.close()
+
+    def __iter__(self):
+        from types import SimpleNamespace
+
+        next_index = 0  # Ollama sends each tool call whole, in order
+        for line in self._response.iter_lines():
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise RuntimeError(f"Ollama error: {data['error']}")
+            message = data.get("message") or {}
+            tool_calls = _from_ollama_tool_calls(message.get("tool_calls"), next_index)
+            next_index += len(tool_calls)
+            finish_reason = None
+            if data.get("done"):
+                _record_ollama_timings(self._model, data)
+                finish_reason = "tool_calls" if next_index else data.get("done_reason")
+            yield SimpleNamespace(
+                choices=[
+                    SimpleNamespace(
+                        index=0,
+                        finish_reason=finish_reason,
+                        delta=SimpleNamespace(
+                            content=message.get("content") or None,
+                            tool_calls=tool_calls or None,
+                        ),
+                    )
+                ]
+            )
+
+
+def _ollama_preload_targets() -> list[tuple]:
+    """(client, model) pairs for every configured native Ollama model."""
+    config = get_config()
+    targets = []
+    if config.llm_deployments:
+        for deployment in get_llm_router().deployments:
+            if deployment.provider == "ollama":
+                targets.append((deployment.client(), deployment.model))
+    elif config.llm_provider == "ollama":
+        targets.append((get_llm_client(), config.llm_model))
+    return [
+        (client, model) for client, model in targets if isinstance(client, OllamaNativeClient)
+    ]
+
+
+def preload_ollama_models() -> dict:
+    """Load the configured Ollama model(s) now. Returns model -> status text."""
+    results = {}
+    for client, model in _ollama_preload_targets():
+        try:
+            timings = client.preload(model)
+            results[model] = f"loaded in {timings['total']:.2f}s"
+        except Exception as e:
+            results[model] = f"failed: {e}"
+        print(f"[Ollama] Preload {model}: {results[model]}")
+    return results
+
+
+def start_ollama_preload():
+    """Preload in the background when native Ollama mode asks for it."""
+    config = get_config()
+    if config.ollama_native and config.ollama_preload and _ollama_preload_targets():
+        threading.Thread(target=preload_ollama_models, name="ollama-preload", daemon=True).start()
+
+
+# ============================================================================
+# Turn Deadlines & Cancellation
+# ============================================================================
+
+
+class TurnCancelledError(Exception):
+    """The user cancelled the turn (clear, retry, edit or disconnect)."""
+
+
+class TurnTimeoutError(Exception):
+    """The turn ran past its overall deadline."""
+
+
+class TurnContext:
+    """
+    Deadline, cancellation and progress status for one chat turn.
+
+    Work started on behalf of the turn (tool futures, LLM streams) registers a
+    cancel callback so that ``cancel()`` stops it immediately instead of
+    letting it run to completion in the background.
+    """
+
+    _POLL_INTERVAL = 0.25  # seconds between cancellation checks while waiting
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + timeout if timeout else None
+        self.status = "Analyzing..."
+        self.cancel_reason = ""
+        self.trace: list[dict] = []  # LLM and tool steps, in order (see ``record``)
+        self.user = ""  # session the turn belongs to (per-user rate limits)
+        self._cancelled = threading.Event()
+        self._callbacks: list = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the turn deadline (None if unbounded)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def budget(self, limit: Optional[float]) -> Optional[float]:
+        """The smaller of a per-step limit and the time left in the turn."""
+        remaining = self.remaining()
+        if remaining is None:
+            return limit
+        if not limit:
+            return remaining
+        return min(limit, remaining)
+
+    def record(self, step: str, **fields):
+        """Append a step (``llm``, ``tool``, ``served``) to the turn's trace."""
+        self.trace.append(
+            {"step": step, "at": round(time.monotonic() - self.started_at, 3), **fields}
+        )
+
+    def check(self):
+        """Raise if the turn was cancelled or its deadline has passed."""
+        if self.cancelled:
+            raise TurnCancelledError(self.cancel_reason)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise TurnTimeoutError()
+
+    def on_cancel(self, callback):
+        """Register a callback to run when the turn is cancelled."""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel the turn and everything registered with ``on_cancel``."""
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancel_reason = reason
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        metrics.inc("turns_cancelled_total", reason=reason)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[Turn] Cancel callback failed: {e}")
+
+    def sleep(self, seconds: float):
+        """Sleep within the turn's limits; raises as soon as it is cancelled."""
+        if self._cancelled.wait(max(0.0, seconds)):
+            raise TurnCancelledError(self.cancel_reason)
+        self.check()
+
+    def wait(self, future, timeout: Optional[float] = None):
+        """
+        Block on a ``concurrent.futures.Future`` within the turn's limits.
+
+        The future is cancelled if the turn is cancelled (raises
+        ``TurnCancelledError``), the turn deadline passes (raises
+        ``TurnTimeoutError``) or ``timeout`` elapses (raises ``TimeoutError``).
+        """
+        self.on_cancel(future.cancel)
+        step_timeout = timeout
+        limit = self.budget(step_timeout)
+        until = time.monotonic() + limit if limit is not None else None
+        while True:
+            wait_for = self._POLL_INTERVAL
+            if until is not None:
+                wait_for = min(wait_for, max(0.0, until - time.monotonic()))
+            try:
+                return future.result(timeout=wait_for)
+            except concurrent.futures.CancelledError:
+                raise TurnCancelledError(self.cancel_reason) from None
+            except concurrent.futures.TimeoutError:
+                if self.cancelled:
+                    future.cancel()
+                    raise TurnCancelledError(self.cancel_reason) from None
+                if until is not None and time.monotonic() >= until:
+                    future.cancel()
+                    self.check()
+                    raise TimeoutError(f"timed out after {step_timeout:.0f}s") from None
+
+
+_active_turns: dict[str, TurnContext] = {}
+_active_turns_lock = threading.Lock()
+_turn_executor = None
+
+
+def run_turn(fn, *args):
+    """Run blocking turn work on the shared worker pool; returns a Future."""
+    global _turn_executor
+    if _turn_executor is None:
+        _turn_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=32, thread_name_prefix="chat-turn"
+        )
+    return _turn_executor.submit(fn, *args)
+
+
+def begin_turn(session_id: Optional[str], timeout: Optional[float] = None) -> TurnContext:
+    """Start a turn for a UI session, cancelling the session's previous one."""
+    if timeout is None:
+        timeout = get_config().turn_timeout
+    turn = TurnContext(timeout)
+    if session_id:
+        turn.user = session_id.split(":")[0]
+        with _active_turns_lock:
+            previous = _active_turns.get(session_id)
+            _active_turns[session_id] = turn
+        if previous is not None:
+            previous.cancel("superseded")
+    return turn
+
+
+def end_turn(session_id: Optional[str], turn: TurnContext):
+    """Unregister a finished turn."""
+    if session_id:
+        with _active_turns_lock:
+            if _active_turns.get(session_id) is turn:
+                del _active_turns[session_id]
+    metrics.observe("turn_seconds", time.monotonic() - turn.started_at)
+
+
+def cancel_turn(session_id: Optional[str], reason: str = "cancelled") -> bool:
+    """Cancel the in-flight turn of a UI session, if any."""
+    if not session_id:
+        return False
+    with _active_turns_lock:
+        turn = _active_turns.pop(session_id, None)
+    if turn is None:
+        return False
+    turn.cancel(reason)
+    return True
+
+
+def _create_completion(llm, turn: TurnContext, **call_kwargs):
+    """
+    Run one chat completion under the turn's deadline and cancellation.
+
+    ``llm`` is a provider client, or an ``LLMRouter`` that picks a deployment
+    and fails over between them. Rate limits are applied (and throttled
+    requests retried) by ``complete_within_limits``.
+    """
+    start = time.monotonic()
+    try:
+        message = complete_within_limits(llm, turn, **call_kwargs)
+    except Exception as e:
+        turn.record("llm", seconds=round(time.monotonic() - start, 3), error=_describe_error(e))
+        raise
+    turn.record(
+        "llm",
+        seconds=round(time.monotonic() - start, 3),
+        tool_calls=len(message.tool_calls or []),
+    )
+    return message
+
+
+def _complete_once(llm, turn: TurnContext, **call_kwargs):
+    """
+    Run one chat completion on a single client.
+
+    The response is streamed so a cancelled turn can close the HTTP stream
+    mid-generation; chunks are reassembled into an object shaped like a
+    non-streaming ``message`` (``content`` and ``tool_calls``). With
+    ``LLM_STREAM=false`` a plain request with the same timeout is made.
+    """
+    from types import SimpleNamespace
+
+    config = get_config()
+    turn.check()
+    timeout = turn.budget(config.llm_timeout)
+
+    if not config.llm_stream:
+        response = llm.chat.completions.create(timeout=timeout, **call_kwargs)
+        turn.check()
+        return response.choices[0].message
+
+    stream = llm.chat.completions.create(stream=True, timeout=timeout, **call_kwargs)
+    turn.on_cancel(stream.close)
+    until = time.monotonic() + timeout if timeout else None
+
+    content_parts: list[str] = []
+    tool_calls: dict[int, dict] = {}
+    try:
+        for chunk in stream:
+            turn.check()
+            if until is not None and time.monotonic() >= until:
+                raise TimeoutError(f"LLM response timed out after {timeout:.0f}s")
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta is None:
+                continue
+            if delta.content:
+                content_parts.append(delta.content)
+            for tc in delta.tool_calls or []:
+                entry = tool_calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                if tc.id:
+                    entry["id"] = tc.id
+                if tc.function is not None:
+                    if tc.function.name:
+                        entry["name"] += tc.function.name
+                    if tc.function.arguments:
+                        entry["arguments"] += tc.function.arguments
+    except Exception:
+        # Closing the stream from on_cancel surfaces as a read error
+        turn.check()
+        raise
+    finally:
+        stream.close()
+
+    return SimpleNamespace(
+        role="assistant",
+        content="".join(content_parts) or None,
+        tool_calls=[
+            SimpleNamespace(
+                id=entry["id"] or f"call_{index}",
+                type="function",
+                function=SimpleNamespace(name=entry["name"], arguments=entry["arguments"]),
+            )
+            for index, entry in sorted(tool_calls.items())
+        ]
+        or None,
+    )
+
+
+# ============================================================================
+# LLM Routing
+# ============================================================================
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds from a ``Retry-After`` header on a provider error, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        from email.utils import parsedate_to_datetime
+
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def _should_fail_over(error: BaseException) -> bool:
+    """Whether another deployment might succeed where this one failed."""
+    status = getattr(error, "status_code", None)
+    # 400/422 mean the request itself is wrong; any deployment would reject it
+    return status not in (400, 422)
+
+
+class _Deployment:
+    """One provider deployment plus its observed health."""
+
+    _ALPHA = 0.3  # weight of the newest sample in the moving averages
+
+    def __init__(self, spec: dict, index: int, default_model: str):
+        self.name = spec.get("name") or f"{spec.get('provider', 'openai')}-{index + 1}"
+        self.provider = spec.get("provider", "openai")
+        self.model = spec.get("model") or default_model
+        self.weight = max(float(spec.get("weight", 1.0)), 0.01)
+        self.api_key = spec.get("api_key") or os.getenv(spec.get("api_key_env", ""), "")
+        self.base_url = spec.get("base_url", "")
+        self.api_version = spec.get("api_version", "")
+        self.latency = 0.0  # smoothed seconds per completion
+        self.error_rate = 0.0  # smoothed share of failed requests
+        self.failures = 0  # consecutive failures
+        self.cooldown_until = 0.0  # time.monotonic() before which it is skipped
+        config = get_config()
+        self.limiter = RateLimiter(
+            self.name,
+            float(spec.get("rpm", config.llm_rpm)),
+            float(spec.get("tpm", config.llm_tpm)),
+            int(spec.get("max_concurrency", config.llm_max_concurrency)),
+        )
+
+    def client(self):
+        client = get_llm_client(
+            self.provider, self.api_key, self.base_url, self.model, self.api_version
+        )
+        if client is None:
+            return None
+        # The router retries on another deployment; the SDK's own retries
+        # would only delay that
+        return client.with_options(max_retries=0)
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    def score(self) -> float:
+        """Lower is better. Unmeasured deployments score 0 so they get tried."""
+        return self.latency * (1 + 4 * self.error_rate) / self.weight
+
+    def record_success(self, seconds: float):
+        alpha = self._ALPHA
+        self.latency = seconds if not self.latency else (
+            alpha * seconds + (1 - alpha) * self.latency
+        )
+        self.error_rate *= 1 - alpha
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    def record_failure(self, retry_after: Optional[float]):
+        alpha = self._ALPHA
+        self.error_rate = alpha + (1 - alpha) * self.error_rate
+        self.failures += 1
+        if retry_after is None:
+            retry_after = _backoff_delay(self.failures - 1, 1.0, 60.0)
+        self.cooldown_until = time.monotonic() + retry_after
+
+
+class LLMRouter:
+    """
+    Routes chat completions across several provider deployments.
+
+    Each request goes to the best-ranked deployment (``ordered``: list order;
+    ``latency``: lowest smoothed latency x error rate, scaled by ``weight``).
+    Rate limits and errors put the deployment on a cooldown (``Retry-After``
+    when the provider sends one) and the request is retried on the next one;
+    the user only sees an error when every deployment has failed.
+    """
+
+    def __init__(self, deployments: list[dict], routing: str = "latency", default_model: str = ""):
+        if routing not in ("ordered", "latency"):
+            print(f"[LLM] Unknown LLM_ROUTING {routing!r}; using latency")
+            routing = "latency"
+        self.routing = routing
+        self.deployments = [
+            _Deployment(spec, index, default_model) for index, spec in enumerate(deployments)
+        ]
+        self._lock = threading.Lock()
+
+    def _rank(self) -> list[_Deployment]:
+        """Healthy deployments best-first, then cooling-down ones soonest-first."""
+        with self._lock:
+            ready = [d for d in self.deployments if not d.cooling_down]
+            cooling = [d for d in self.deployments if d.cooling_down]
+            if self.routing == "latency":
+                ready.sort(key=_Deployment.score)
+            # Deployments whose rate limits would make the request wait go last
+            ready.sort(key=lambda d: d.limiter.delay() > 0)
+            cooling.sort(key=lambda d: d.cooldown_until)
+            return ready + cooling
+
+    def complete(self, turn: TurnContext, **call_kwargs):
+        """Run a completion on the best deployment, failing over on errors."""
+        last_error: Optional[BaseException] = None
+        for attempt, deployment in enumerate(self._rank()):
+            client = deployment.client()
+            if client is None:
+                print(f"[LLM] Skipping deployment {deployment.name}: not configured")
+                continue
+            if attempt:
+                metrics.inc("llm_failovers_total", to=deployment.name)
+            start = time.perf_counter()
+            try:
+                message = complete_limited(
+                    client, turn, deployment.limiter, **{**call_kwargs, "model": deployment.model}
+                )
+            except (TurnCancelledError, TurnTimeoutError):
+                raise
+            except RateLimitedError as e:
+                # Its limits would hold the request too long; try the next one
+                last_error = e
+                continue
+            except Exception as e:
+                if not _should_fail_over(e):
+                    raise
+                last_error = e
+                with self._lock:
+                    deployment.record_failure(_retry_after(e))
+                metrics.inc("llm_requests_total", deployment=deployment.name, status="failed")
+                print(
+                    f"[LLM] Deployment {deployment.name} failed, trying next: "
+                    f"{_describe_error(e)}"
+                )
+                continue
+            seconds = time.perf_counter() - start
+            with self._lock:
+                deployment.record_success(seconds)
+            metrics.inc("llm_requests_total", deployment=deployment.name, status="ok")
+            metrics.set("llm_latency_ewma_seconds", deployment.latency, deployment=deployment.name)
+            return message
+
+        if last_error is None:
+            raise RuntimeError("No LLM deployment is configured correctly")
+        raise last_error
+
+    def status(self) -> list[dict]:
+        """Per-deployment health for the UI."""
+        with self._lock:
+            return [
+                {
+                    "name": d.name,
+                    "provider": d.provider,
+                    "model": d.model,
+                    "latency": d.latency,
+                    "error_rate": d.error_rate,
+                    "cooldown": max(0.0, d.cooldown_until - time.monotonic()),
+                    "concurrency": d.limiter.concurrency_limit(),
+                }
+                for d in self.deployments
+            ]
+
+
+_llm_router: Optional[LLMRouter] = None
+_llm_router_key: Optional[str] = None
+
+
+def get_llm_router() -> LLMRouter:
+    """Get or create the router for ``LLM_DEPLOYMENTS``."""
+    global _llm_router, _llm_router_key
+    config = get_config()
+    key = json.dumps([config.llm_deployments, config.llm_routing, config.llm_model])
+    with _llm_clients_lock:
+        if _llm_router is None or _llm_router_key != key:
+            _llm_router = LLMRouter(
+                config.llm_deployments, config.llm_routing, default_model=config.llm_model
+            )
+            _llm_router_key = key
+        return _llm_router
+
+
+# ============================================================================
+# LLM Rate Limiting
+# ============================================================================
+
+_THROTTLE_RETRIES = 5  # throttled (429) attempts per completion before giving up
+_TRANSIENT_RETRIES = 2  # what the provider SDKs retry on their own by default
+
+
+class RateLimitedError(Exception):
+    """A completion would have to wait longer than LLM_RATE_LIMIT_WAIT."""
+
+    def __init__(self, who: str, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(
+            f"{who} is rate limited right now. Please try again in about "
+            f"{max(1, round(retry_after))}s."
+        )
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider error (OpenAI, Azure and httpx style), if any."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    """429, or an overloaded response that says when to come back."""
+    status = _status_code(error)
+    return status == 429 or (status in (503, 529) and _retry_after(error) is not None)
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Connection errors and 408/409/5xx, which the SDKs would have retried."""
+    import httpx
+    from openai import APIConnectionError
+
+    status = _status_code(error)
+    if status is not None:
+        return status in (408, 409) or status >= 500
+    return isinstance(error, (APIConnectionError, httpx.TransportError, ConnectionError))
+
+
+def _estimate_tokens(call_kwargs: dict) -> int:
+    """Rough prompt size of a completion request (about 4 characters per token)."""
+    chars = len(json.dumps(call_kwargs.get("tools") or []))
+    for message in call_kwargs.get("messages") or []:
+        content = message.get("content")
+        chars += len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+        if message.get("tool_calls"):
+            chars += len(json.dumps(message["tool_calls"], default=str))
+    return chars // 4 + 1
+
+
+def _completion_tokens(message) -> int:
+    """Rough size of a completion's output, charged once it has arrived."""
+    chars = len(message.content or "")
+    for call in message.tool_calls or []:
+        chars += len(call.function.name or "") + len(call.function.arguments or "")
+    return chars // 4
+
+
+class TokenBucket:
+    """``per_minute`` units refilled evenly, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` (capped at the capacity) is available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        """Spend ``amount``; the level goes negative when usage beats the estimate."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """
+    Client-side limits for one provider deployment or one user session.
+
+    Requests-per-minute and tokens-per-minute buckets (0 = unlimited), a pause
+    until the ``Retry-After`` of the last throttled response, and a cap on
+    concurrent requests that adapts to throttling (AIMD): it halves when the
+    provider answers 429 and grows by about one per round of successes. With
+    ``max_concurrency`` the cap starts there and never exceeds it; without
+    (0) there is no cap until the first 429, and it is lifted again once it
+    has grown back past the concurrency that was throttled.
+    """
+
+    _DECREASE_INTERVAL = 2.0  # seconds; one burst of 429s halves the cap once
+
+    def __init__(self, name: str, rpm: float = 0.0, tpm: float = 0.0, max_concurrency: int = 0):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)  # current cap, 0.0 = uncapped
+        self._ceiling = float(max_concurrency)  # where the cap is lifted again
+        self.in_flight = 0
+        self.paused_until = 0.0  # time.monotonic() of the provider's Retry-After
+        self.throttles = 0  # consecutive throttled responses
+        self._decreased_at = 0.0
+        self._lock = threading.Lock()
+
+    def _delay(self, tokens: int) -> tuple[float, str]:
+        """Seconds before a request of ``tokens`` may start, and why."""
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            return pause, "provider asked to retry later"
+        delay, reason = 0.0, ""
+        if self.requests is not None and self.requests.delay(1) > delay:
+            delay, reason = self.requests.delay(1), "requests per minute"
+        if self.tokens is not None and self.tokens.delay(tokens) > delay:
+            delay, reason = self.tokens.delay(tokens), "tokens per minute"
+        if not delay and self.concurrency and self.in_flight >= int(self.concurrency):
+            return TurnContext._POLL_INTERVAL, "waiting for a free slot"
+        return delay, reason
+
+    def delay(self, tokens: int = 1) -> float:
+        with self._lock:
+            return self._delay(tokens)[0]
+
+    def concurrency_limit(self) -> int:
+        """Current adaptive cap (0 when uncapped)."""
+        return int(self.concurrency)
+
+    def acquire(self, turn: TurnContext, tokens: int, who: str = "The AI provider"):
+        """
+        Wait until a request of ``tokens`` fits, showing the wait in ``turn.status``.
+
+        Raises:
+            RateLimitedError: The wait would pass LLM_RATE_LIMIT_WAIT or the
+                turn deadline.
+        """
+        limit = get_config().llm_rate_limit_wait
+        started = time.monotonic()
+        status = turn.status
+        try:
+            while True:
+                with self._lock:
+                    delay, reason = self._delay(tokens)
+                    if delay <= 0:
+                        if self.requests is not None:
+                            self.requests.take(1)
+                        if self.tokens is not None:
+                            self.tokens.take(tokens)
+                        self.in_flight += 1
+                        break
+                remaining = turn.remaining()
+                waited = time.monotonic() - started
+                if waited + delay > limit or (remaining is not None and delay > remaining):
+                    metrics.inc("llm_rate_limited_total", limiter=self.name, result="gave_up")
+                    raise RateLimitedError(who, delay)
+                turn.status = f"Rate limited ({reason}), continuing in {max(1, round(delay))}s..."
+                turn.sleep(min(delay, 0.5))
+        finally:
+            turn.status = status
+        waited = time.monotonic() - started
+        if waited >= 0.05:
+            metrics.observe("llm_rate_limit_wait_seconds", waited, limiter=self.name)
+
+    def release(self, tokens: int = 0, error: Optional[BaseException] = None):
+        """Finish a request: charge the reply's ``tokens`` and adapt to throttling."""
+        throttled = error is not None and _is_rate_limited(error)
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if self.tokens is not None and tokens:
+                self.tokens.take(tokens)
+            if throttled:
+                self.throttles += 1
+                retry_after = _retry_after(error)
+                if retry_after is None:
+                    retry_after = max(1.0, _backoff_delay(self.throttles - 1, 1.0, 60.0))
+                now = time.monotonic()
+                self.paused_until = max(self.paused_until, now + retry_after)
+                if now - self._decreased_at > self._DECREASE_INTERVAL:
+                    if not self.concurrency:
+                        # First throttle while uncapped: cap below what was running
+                        self.concurrency = self._ceiling = float(self.in_flight + 1)
+                    self.concurrency = max(1.0, self.concurrency / 2)
+                    self._decreased_at = now
+            elif error is None:
+                self.throttles = 0
+                if self.concurrency:
+                    self.concurrency += 1.0 / self.concurrency
+                    if self.concurrency >= self._ceiling:
+                        self.concurrency = float(self.max_concurrency)
+            concurrency = self.concurrency
+            capped = bool(concurrency) or throttled
+        if throttled:
+            metrics.inc("llm_rate_limited_total", limiter=self.name, result="throttled")
+            print(
+                f"[LLM] {self.name} throttled; pausing {retry_after:.1f}s, "
+                f"concurrency {self.concurrency_limit() or 'uncapped'}"
+            )
+        if capped or self.max_concurrency:
+            metrics.set("llm_concurrency_limit", concurrency, limiter=self.name)
+
+
+_llm_limiters: dict[tuple, RateLimiter] = {}
+_user_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_llm_limiter() -> RateLimiter:
+    """Limiter for the single configured provider (``LLM_PROVIDER`` / ``LLM_MODEL``)."""
+    config = get_config()
+    key = (
+        config.llm_provider,
+        config.llm_base_url,
+        config.llm_model,
+        config.llm_rpm,
+        config.llm_tpm,
+        config.llm_max_concurrency,
+    )
+    with _limiters_lock:
+        limiter = _llm_limiters.get(key)
+        if limiter is None:
+            limiter = _llm_limiters[key] = RateLimiter(
+                f"{config.llm_provider}:{config.llm_model}",
+                config.llm_rpm,
+                config.llm_tpm,
+                config.llm_max_concurrency,
+            )
+        return limiter
+
+
+def get_user_limiter(user: str) -> Optional[RateLimiter]:
+    """Limiter for one browser session (None without USER_RPM/USER_TPM)."""
+    config = get_config()
+    if not user or not (config.user_rpm > 0 or config.user_tpm > 0):
+        return None
+    with _limiters_lock:
+        limiter = _user_limiters.get(user)
+        if limiter is None:
+            limiter = _user_limiters[user] = RateLimiter(
+                f"user:{user[:8]}", config.user_rpm, config.user_tpm
+            )
+        return limiter
+
+
+def complete_limited(client, turn: TurnContext, limiter: RateLimiter, **call_kwargs):
+    """``_complete_once`` holding a slot of ``limiter``, which learns from the outcome."""
+    limiter.acquire(turn, _estimate_tokens(call_kwargs))
+    try:
+        message = _complete_once(client, turn, **call_kwargs)
+    except BaseException as e:
+        limiter.release(error=e)
+        raise
+    limiter.release(_completion_tokens(message))
+    return message
+
+
+def complete_within_limits(llm, turn: TurnContext, **call_kwargs):
+    """
+    Run one completion under the user's and the provider's rate limits.
+
+    Throttled responses pause the provider's limiter for their ``Retry-After``
+    and are retried once it has passed, with the wait shown in ``turn.status``
+    (the SDKs' own retries are turned off so they cannot hide it). Raises
+    ``RateLimitedError`` when the wait would be longer than the turn allows.
+    """
+    user = get_user_limiter(turn.user)
+    if user is not None:
+        user.acquire(turn, _estimate_tokens(call_kwargs), "Your session")
+    message = None
+    try:
+        message = _complete_with_retries(llm, turn, **call_kwargs)
+    finally:
+        if user is not None:
+            user.release(_completion_tokens(message) if message is not None else 0)
+    return message
+
+
+def _complete_with_retries(llm, turn: TurnContext, **call_kwargs):
+    throttled = transient = 0
+    while True:
+        try:
+            if isinstance(llm, LLMRouter):
+                return llm.complete(turn, **call_kwargs)
+            return complete_limited(
+                llm.with_options(max_retries=0), turn, get_llm_limiter(), **call_kwargs
+            )
+        except (TurnCancelledError, TurnTimeoutError, RateLimitedError, TimeoutError):
+            raise
+        except Exception as e:
+            if _is_rate_limited(e):
+                if throttled >= _THROTTLE_RETRIES:
+                    raise RateLimitedError("The AI provider", _retry_after(e) or 1.0) from e
+                throttled += 1  # the limiter now holds the next attempt back
+                continue
+            # The router already fails over between deployments
+            if isinstance(llm, LLMRouter) or not _is_transient(e):
+                raise
+            if transient >= _TRANSIENT_RETRIES:
+                raise
+            turn.sleep(_backoff_delay(transient, 0.5, 8.0))
+            transient += 1
+
+
+# ============================================================================
+# Tool Result Cache & Speculative Prefetch
+# ============================================================================
+
+# Tools whose results depend only on their arguments and the market clock
+# (federated servers may expose them as "<name>__mt5_query_tool")
+_CACHEABLE_TOOLS = {"mt5_query_tool"}
+_CACHEABLE_OPERATIONS = {
+    "symbol_info",
+    "symbol_info_tick",
+    "copy_rates_from_pos",
+    "terminal_info",
+    "account_info",
+}
+_PREFETCH_BARS = 500  # enough to answer the usual 100-300 bar requests by slicing
+_PREFETCH_MAX_SYMBOLS = 2
+
+
+class ToolResultCache:
+    """
+    Short-lived cache of read-only MCP tool results.
+
+    Keys are canonical ``(tool, operation, symbol, parameters)`` tuples, so
+    argument order and JSON formatting do not matter. A cached or in-flight
+    ``copy_rates_from_pos`` request for more recent bars also answers a
+    request for fewer bars. Speculative prefetches register as in flight so
+    the model's matching tool call waits for them instead of calling again.
+    """
+
+    def __init__(self, ttl: float = 10.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: dict[tuple, tuple[float, dict]] = {}
+        self._pending: dict[tuple, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(name: str, arguments: dict) -> Optional[tuple]:
+        """Canonical cache key, or None when the call must not be cached."""
+        if name.rsplit("__", 1)[-1] not in _CACHEABLE_TOOLS:
+            return None
+        operation = arguments.get("operation")
+        if operation not in _CACHEABLE_OPERATIONS:
+            return None
+        params = arguments.get("parameters") or "{}"
+        if isinstance(params, str):
+            try:
+                params = json.loads(params)
+            except ValueError:
+                return None
+        if not isinstance(params, dict):
+            return None
+        symbol = (arguments.get("symbol") or "").upper()
+        return (name, operation, symbol, json.dumps(params, sort_keys=True))
+
+    @staticmethod
+    def _rates_shape(key: tuple) -> Optional[tuple[tuple, int]]:
+        """``(series, count)`` for a copy_rates_from_pos key starting at the latest bar."""
+        name, operation, symbol, params = key
+        if operation != "copy_rates_from_pos":
+            return None
+        params = json.loads(params)
+        if int(params.pop("start_pos", 0) or 0) != 0:
+            return None
+        try:
+            count = int(params.pop("count", 0))
+        except (TypeError, ValueError):
+            return None
+        if count <= 0:
+            return None
+        return (name, symbol, json.dumps(params, sort_keys=True)), count
+
+    @staticmethod
+    def _slice(result: dict, count: int) -> Optional[dict]:
+        """Keep the latest ``count`` bars of a rates result."""
+        try:
+            payload = json.loads(result["result"])
+            payload["data"] = payload["data"][-count:]
+        except (KeyError, TypeError, ValueError):
+            return None
+        return {"result": json.dumps(payload)}
+
+    def _find(self, key: tuple, table: dict):
+        """Exact match, or a superset rates entry plus the bar count to keep."""
+        if key in table:
+            return table[key], None
+        shape = self._rates_shape(key)
+        if shape is None:
+            return None, None
+        series, count = shape
+        for other, value in table.items():
+            other_shape = self._rates_shape(other)
+            if other_shape and other_shape[0] == series and other_shape[1] >= count:
+                return value, count
+        return None, None
+
+    def _store(self, key: tuple, result: dict):
+        if "error" in result:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            if len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+
+    def put(self, name: str, arguments: dict, result: dict):
+        """Store a result fetched outside ``call`` (e.g. by the quote ticker)."""
+        key = self.key(name, arguments)
+        if key is not None:
+            self._store(key, result)
+
+    def lookup(self, name: str, arguments: dict) -> Optional[dict]:
+        """Fresh cached result for this call, if any."""
+        key = self.key(name, arguments)
+        if key is None:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+            entry, count = self._find(key, self._entries)
+        if entry is None:
+            return None
+        result = entry[1]
+        return result if count is None else self._slice(result, count)
+
+    def call(self, mcp, name: str, arguments: dict) -> concurrent.futures.Future:
+        """
+        Call a tool through the cache; returns a ``concurrent.futures.Future``.
+
+        Joining an in-flight prefetch returns a separate future, so a caller
+        that gives up (timeout or cancel) does not cancel it for others.
+        """
+        scheduler = _analysis_scheduler
+        if scheduler is not None:
+            stored = scheduler.lookup_tool(name, arguments)
+            if stored is not None:
+                metrics.inc("tool_cache_total", result="scheduled")
+                future = concurrent.futures.Future()
+                future.set_result(stored)
+                return future
+            if scheduler.recording():
+                future = mcp.submit(mcp.call_tool(name, arguments))
+                scheduler.record_tool(name, arguments, future)
+                return future
+
+        key = self.key(name, arguments)
+        if key is None:
+            return mcp.submit(mcp.call_tool(name, arguments))
+
+        cached = self.lookup(name, arguments)
+        if cached is not None:
+            metrics.inc("tool_cache_total", result="hit")
+            future = concurrent.futures.Future()
+            future.set_result(cached)
+            return future
+
+        with self._lock:
+            pending, count = self._find(key, self._pending)
+        if pending is not None:
+            metrics.inc("tool_cache_total", result="joined")
+            return self._follow(pending, count, mcp, name, arguments)
+
+        metrics.inc("tool_cache_total", result="miss")
+        future = self._fetch(mcp, name, arguments, key)
+        future.add_done_callback(
+            lambda f: None if f.cancelled() or f.exception() else self._store(key, f.result())
+        )
+        return future
+
+    def _fetch(self, mcp, name: str, arguments: dict, key: tuple) -> concurrent.futures.Future:
+        """Call the server; latest-bars requests go through the on-disk bar store."""
+        store = get_ohlcv_store()
+        if store is not None and self._rates_shape(key) is not None:
+            return store.fetch(mcp, name, arguments)
+        return mcp.submit(mcp.call_tool(name, arguments))
+
+    def _follow(self, pending, count, mcp, name, arguments) -> concurrent.futures.Future:
+        proxy = concurrent.futures.Future()
+
+        def _done(f):
+            if proxy.cancelled():
+                return
+            result = None
+            if not f.cancelled() and f.exception() is None:
+                result = f.result() if count is None else self._slice(f.result(), count)
+            if result is None or "error" in result:
+                # Prefetch failed or was malformed: make the real call
+                retry = mcp.submit(mcp.call_tool(name, arguments))
+                proxy.add_done_callback(lambda p: retry.cancel() if p.cancelled() else None)
+                retry.add_done_callback(lambda r: _copy(r, proxy))
+                return
+            proxy.set_result(result)
+
+        pending.add_done_callback(_done)
+        return proxy
+
+    def prefetch(self, mcp, name: str, arguments: dict):
+        """Start a call in the background and keep its result for ``ttl`` seconds."""
+        key = self.key(name, arguments)
+        if key is None or self.lookup(name, arguments) is not None:
+            return
+        with self._lock:
+            if self._find(key, self._pending)[0] is not None:
+                return
+            future = self._fetch(mcp, name, arguments, key)
+            self._pending[key] = future
+        metrics.inc("tool_prefetch_total", operation=arguments.get("operation", ""))
+
+        def _done(f):
+            if not f.cancelled() and f.exception() is None:
+                self._store(key, f.result())
+            with self._lock:
+                self._pending.pop(key, None)
+
+        future.add_done_callback(_done)
+
+
+def _copy(source: concurrent.futures.Future, target: concurrent.futures.Future):
+    """Propagate the outcome of one future to another (unless it was cancelled)."""
+    if target.cancelled():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+_tool_cache: Optional[ToolResultCache] = None
+
+
+def get_tool_cache() -> ToolResultCache:
+    """Get or create the shared tool-result cache."""
+    global _tool_cache
+    if _tool_cache is None:
+        _tool_cache = ToolResultCache(get_config().tool_cache_ttl)
+    return _tool_cache
+
+
+# Three-letter codes accepted as either half of a "BASE/QUOTE" symbol
+_SYMBOL_CODES = set(
+    "AUD CAD CHF CNH CZK DKK EUR GBP HKD HUF JPY MXN NOK NZD PLN SEK SGD TRY USD ZAR "
+    "XAU XAG XPT XPD BTC ETH LTC XRP SOL BNB".split()
+)
+_SYMBOL_ALIASES = {
+    "gold": "XAUUSD",
+    "silver": "XAGUSD",
+    "bitcoin": "BTCUSD",
+    "ethereum": "ETHUSD",
+    "euro": "EURUSD",
+    "cable": "GBPUSD",
+}
+_TIMEFRAME_WORDS = {
+    "minute": "M1",
+    "5-minute": "M5",
+    "15-minute": "M15",
+    "30-minute": "M30",
+    "hourly": "H1",
+    "1-hour": "H1",
+    "4-hour": "H4",
+    "4h": "H4",
+    "daily": "D1",
+    "weekly": "W1",
+    "monthly": "MN1",
+}
+# Lookahead so "FOR EUR/USD" still finds EUR/USD after rejecting "FOR EUR"
+_SYMBOL_PATTERN = re.compile(r"\b(?=([A-Z]{3})\s*/?\s*([A-Z]{3})\b)")
+_TIMEFRAME_PATTERN = re.compile(r"\b(M1|M5|M15|M30|H1|H4|D1|W1|MN1)\b")
+
+
+def extract_symbols(text: str) -> list[str]:
+    """Trading symbols mentioned in free text, e.g. "EUR/USD" or "gold" -> XAUUSD."""
+    symbols: list[str] = []
+    for base, quote in _SYMBOL_PATTERN.findall(text.upper()):
+        if base in _SYMBOL_CODES and quote in _SYMBOL_CODES and base != quote:
+            symbols.append(base + quote)
+    lowered = text.lower()
+    for word, symbol in _SYMBOL_ALIASES.items():
+        if re.search(rf"\b{word}\b", lowered):
+            symbols.append(symbol)
+    return list(dict.fromkeys(symbols))
+
+
+def extract_timeframe(text: str) -> Optional[str]:
+    """MT5 timeframe mentioned in free text ("H4", "daily", ...), if any."""
+    match = _TIMEFRAME_PATTERN.search(text.upper())
+    if match:
+        return match.group(1)
+    lowered = text.lower()
+    for word, timeframe in _TIMEFRAME_WORDS.items():
+        if re.search(rf"\b{re.escape(word)}\b", lowered):
+            return timeframe
+    return None
+
+
+def prefetch_market_data(mcp, message: str, tool_names: list[str]) -> int:
+    """
+    Speculatively fetch the data the model is likely to ask for.
+
+    For each symbol in the message, the current tick and the latest bars on
+    the mentioned timeframe (H1 by default) are requested in the background;
+    the first LLM call runs meanwhile. Returns the number of prefetches started.
+    """
+    query_tool = next(
+        (n for n in tool_names if n.rsplit("__", 1)[-1] == "mt5_query_tool"), None
+    )
+    if query_tool is None:
+        return 0
+    symbols = extract_symbols(message)[:_PREFETCH_MAX_SYMBOLS]
+    if not symbols:
+        return 0
+    timeframe = extract_timeframe(message) or "H1"
+    cache = get_tool_cache()
+    for symbol in symbols:
+        cache.prefetch(
+            mcp,
+            query_tool,
+            {"operation": "symbol_info_tick", "symbol": symbol, "parameters": "{}"},
+        )
+        cache.prefetch(
+            mcp,
+            query_tool,
+            {
+                "operation": "copy_rates_from_pos",
+                "symbol": symbol,
+                "parameters": json.dumps(
+                    {"timeframe": timeframe, "start_pos": 0, "count": _PREFETCH_BARS}
+                ),
+            },
+        )
+    return 2 * len(symbols)
+
+
+# ============================================================================
+# Fast Path for Simple Data Requests
+# ============================================================================
+
+# Requests asking for more than the raw numbers always go to the model
+_ANALYSIS_WORDS = re.compile(
+    r"\b(analy\w*|indicator\w*|rsi|macd|sma|ema|bollinger|atr|forecast\w*|predict\w*|"
+    r"chart\w*|trend\w*|compare|comparison|why|should|history|historical|bars?|candles?|"
+    r"support|resistance|signal\w*|strategy|explain|recommend\w*)\b",
+    re.IGNORECASE,
+)
+# ...as do forward-looking, conditional and opinion questions about the numbers
+_SPECULATIVE_WORDS = re.compile(
+    r"\b(outlook|likely|likelihood|will|might|going to|tomorrow|next|later|future|expect\w*|"
+    r"think|opinion|view|if|when|pips?|drops?|falls?|rises?|moves?|target\w*|worth|buy|sell)\b",
+    re.IGNORECASE,
+)
+_ACCOUNT_FIELDS = [
+    ("login", "Login"),
+    ("server", "Server"),
+    ("currency", "Currency"),
+    ("balance", "Balance"),
+    ("equity", "Equity"),
+    ("profit", "Floating P/L"),
+    ("margin", "Margin"),
+    ("margin_free", "Free margin"),
+    ("margin_level", "Margin level %"),
+    ("leverage", "Leverage"),
+]
+_SYMBOL_FIELDS = [
+    ("description", "Description"),
+    ("currency_base", "Base currency"),
+    ("currency_profit", "Profit currency"),
+    ("digits", "Digits"),
+    ("spread", "Spread (points)"),
+    ("trade_contract_size", "Contract size"),
+    ("volume_min", "Min volume"),
+    ("volume_max", "Max volume"),
+    ("volume_step", "Volume step"),
+    ("swap_long", "Swap long"),
+    ("swap_short", "Swap short"),
+]
+
+
+def _render_quote(symbol: str, data: dict) -> str:
+    bid, ask = data.get("bid"), data.get("ask")
+    spread = "—"
+    if isinstance(bid, (int, float)) and isinstance(ask, (int, float)):
+        spread = f"{ask - bid:.5g}"
+    when = "—"
+    if data.get("time"):
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(data["time"]))
+    return "\n".join(
+        [
+            f"💹 **{symbol} quote**",
+            "",
+            "| Bid | Ask | Spread | Last | Time (server) |",
+            "|-----|-----|--------|------|---------------|",
+            f"| {bid} | {ask} | {spread} | {data.get('last') or '—'} | {when} |",
+        ]
+    )
+
+
+def _render_fields(title: str, data: dict, fields: list[tuple[str, str]]) -> str:
+    rows = [
+        f"| {label} | {data[key]} |" for key, label in fields if data.get(key) not in (None, "")
+    ]
+    return "\n".join([title, "", "| Field | Value |", "|-------|-------|", *rows])
+
+
+def _render_symbol_info(symbol: str, data: dict) -> str:
+    return _render_fields(f"ℹ️ **{symbol} specification**", data, _SYMBOL_FIELDS)
+
+
+def _render_account_info(_symbol: Optional[str], data: dict) -> str:
+    return _render_fields("👤 **Account summary**", data, _ACCOUNT_FIELDS)
+
+
+# intent -> (trigger pattern, mt5_query_tool operation, needs a symbol, renderer)
+FAST_PATH_INTENTS = {
+    "quote": (
+        re.compile(r"\b(quote|price|bid|ask|tick|trading at|rate)\b", re.IGNORECASE),
+        "symbol_info_tick",
+        True,
+        _render_quote,
+    ),
+    "symbol_info": (
+        re.compile(
+            r"\b(symbol info\w*|contract spec\w*|specification\w*|symbol details|"
+            r"digits|contract size|lot size|swap)\b",
+            re.IGNORECASE,
+        ),
+        "symbol_info",
+        True,
+        _render_symbol_info,
+    ),
+    "account_info": (
+        re.compile(
+            r"\b(account (info\w*|balance|equity|details|summary|status)|"
+            r"my (balance|equity|margin)|margin level)\b",
+            re.IGNORECASE,
+        ),
+        "account_info",
+        False,
+        _render_account_info,
+    ),
+}
+
+
+def find_tool_name(mcp, base_name: str) -> Optional[str]:
+    """Name under which ``base_name`` is exposed (federations may namespace it)."""
+    return next(
+        (
+            tool["function"]["name"]
+            for tool in mcp.get_tools_for_openai()
+            if tool["function"]["name"].rsplit("__", 1)[-1] == base_name
+        ),
+        None,
+    )
+
+
+def match_fast_path(message: str, intents: list[str]) -> Optional[tuple[str, Optional[str]]]:
+    """
+    Recognize a simple data request: ``(intent, symbol)`` or None.
+
+    Only short single-line messages without analysis, forward-looking or
+    conditional words qualify, and symbol intents need exactly one symbol.
+    """
+    if len(message) > 160 or "\n" in message.strip():
+        return None
+    if _ANALYSIS_WORDS.search(message) or _SPECULATIVE_WORDS.search(message):
+        return None
+    symbols = extract_symbols(message)
+    for intent in intents:
+        spec = FAST_PATH_INTENTS.get(intent)
+        if spec is None or not spec[0].search(message):
+            continue
+        _pattern, _operation, needs_symbol, _render = spec
+        if needs_symbol and len(symbols) != 1:
+            continue
+        return intent, (symbols[0] if needs_symbol else None)
+    return None
+
+
+def try_fast_path(message: str, mcp, turn: TurnContext) -> Optional[str]:
+    """
+    Answer a simple data request with one direct tool call and a template.
+
+    Returns None when the message does not match an enabled intent or the
+    tool call does not return usable data; the caller then runs the normal
+    LLM pipeline.
+    """
+    config = get_config()
+    match = match_fast_path(message, config.fast_path_intents)
+    if match is None or not mcp.has_tools():
+        return None
+    intent, symbol = match
+    tool_name = find_tool_name(mcp, "mt5_query_tool")
+    if tool_name is None:
+        return None
+
+    _pattern, operation, _needs_symbol, render = FAST_PATH_INTENTS[intent]
+    arguments = {"operation": operation, "symbol": symbol, "parameters": "{}"}
+    turn.status = f"Fetching {symbol or 'account'} data..."
+    try:
+        result = turn.wait(
+            get_tool_cache().call(mcp, tool_name, arguments), config.tool_timeout(tool_name)
+        )
+        payload = json.loads(result["result"])
+        data = payload.get("data")
+        if payload.get("success") is False or not isinstance(data, dict) or not data:
+            raise ValueError("no data")
+    except (TurnCancelledError, TurnTimeoutError):
+        return None  # reported by the pipeline's next turn.check()
+    except Exception as e:
+        metrics.inc("fast_path_total", intent=intent, result="fallthrough")
+        print(f"[FastPath] {intent} for {symbol} fell through to the LLM: {e}")
+        return None
+
+    metrics.inc("fast_path_total", intent=intent, result="served")
+    return render(symbol, data)
+
+
+# ============================================================================
+# Tool Selection
+# ============================================================================
+
+_STOPWORDS = set(
+    "a an and are as at be by can do for from give how i in is it me my of on or please "
+    "show the this to use using what with you your tool tools".split()
+)
+# Built-in tags for the mt5-mcp tools; TOOL_TAGS adds to or overrides these
+_DEFAULT_TOOL_TAGS = {
+    "mt5_query_tool": [
+        "quote", "price", "tick", "bid", "ask", "symbol", "rates", "bars", "candles",
+        "history", "ohlc", "account", "balance", "equity", "terminal", "spread", "info",
+    ],
+    "mt5_analyze_tool": [
+        "analysis", "analyze", "technical", "indicator", "rsi", "macd", "sma", "ema",
+        "bollinger", "atr", "chart", "plot", "forecast", "predict", "trend", "signal",
+    ],
+}
+
+
+def _tokens(text: str) -> list[str]:
+    """Lowercase word tokens without stopwords; ``snake_case`` names are split."""
+    words = re.findall(r"[a-z0-9]+", text.lower().replace("_", " "))
+    return [w for w in words if w not in _STOPWORDS and len(w) > 1]
+
+
+class ToolSelector:
+    """
+    Deterministic relevance ranking of tool schemas for one request.
+
+    Three indexes are built per tool-schema version: tags (built-in plus
+    ``TOOL_TAGS``), words of the tool name and words of the description.
+    A request's words score 3 per tag hit, 2 per name hit and 1 per
+    description hit, each scaled by how rare the word is across tools.
+    """
+
+    def __init__(self, tools: list[dict], extra_tags: Optional[dict] = None):
+        self.tools = tools
+        tags = {**_DEFAULT_TOOL_TAGS, **(extra_tags or {})}
+        self._index: dict[str, dict[str, float]] = {}  # word -> tool name -> weight
+        for tool in tools:
+            function = tool["function"]
+            name = function["name"]
+            base = name.rsplit("__", 1)[-1]
+            fields = [
+                (3.0, [t.lower() for t in tags.get(base, [])]),
+                (2.0, _tokens(name)),
+                (1.0, _tokens(function.get("description") or "")),
+            ]
+            for weight, words in fields:
+                for word in set(words):
+                    postings = self._index.setdefault(word, {})
+                    postings[name] = max(postings.get(name, 0.0), weight)
+
+    def scores(self, text: str) -> dict[str, float]:
+        """Relevance of every tool to ``text`` (0 for no overlap)."""
+        scores = {tool["function"]["name"]: 0.0 for tool in self.tools}
+        total = len(self.tools)
+        for word in set(_tokens(text)):
+            postings = self._index.get(word)
+            if not postings:
+                continue
+            rarity = 1.0 + (total - len(postings)) / total  # 1 (everywhere) .. 2 (unique)
+            for name, weight in postings.items():
+                scores[name] += weight * rarity
+        return scores
+
+    def select(self, text: str, top_k: int, core: list[str]) -> Optional[list[dict]]:
+        """
+        Core tools plus the ``top_k`` most relevant others.
+
+        Returns None when no tool matches the request at all; the caller
+        should then send the full list.
+        """
+        scores = self.scores(text)
+        is_core = {
+            tool["function"]["name"]: tool["function"]["name"].rsplit("__", 1)[-1] in core
+            for tool in self.tools
+        }
+        ranked = sorted(
+            (name for name in scores if not is_core[name] and scores[name] > 0),
+            key=lambda name: (-scores[name], name),
+        )
+        if not any(scores.values()):
+            return None
+        chosen = set(ranked[:top_k]) | {name for name, core_tool in is_core.items() if core_tool}
+        return [tool for tool in self.tools if tool["function"]["name"] in chosen]
+
+
+_tool_selector: Optional[ToolSelector] = None
+
+
+def select_tools(tools: list[dict], message: str, history: list) -> list[dict]:
+    """
+    Trim the tool list sent to the model to what this request needs.
+
+    Only applies when there are more than ``TOOL_TOP_K`` tools besides the
+    ``TOOL_CORE`` ones; otherwise, or when the selector is unsure, the full
+    list is returned. The last user message in ``history`` is included so
+    follow-ups ("same for gold") keep their context.
+    """
+    global _tool_selector
+    config = get_config()
+    core_count = sum(
+        1 for tool in tools if tool["function"]["name"].rsplit("__", 1)[-1] in config.tool_core
+    )
+    if config.tool_top_k <= 0 or len(tools) - core_count <= config.tool_top_k:
+        return tools
+
+    if _tool_selector is None or _tool_selector.tools is not tools:
+        _tool_selector = ToolSelector(tools, config.tool_tags)
+    previous = next(
+        (
+            msg.get("content")
+            for msg in reversed(history)
+            if isinstance(msg, dict) and msg.get("role") == "user"
+            and isinstance(msg.get("content"), str)
+        ),
+        "",
+    )
+    selected = _tool_selector.select(f"{message} {previous}", config.tool_top_k, config.tool_core)
+    if selected is None:
+        metrics.inc("tool_selection_total", result="full")
+        return tools
+    metrics.inc("tool_selection_total", result="pruned")
+    metrics.observe("tool_selection_sent", len(selected))
+    return selected
+
+
+# ============================================================================
+# Tool Argument Validation
+# ============================================================================
+
+_NO_FIX = object()  # sentinel: a value that cannot be repaired safely
+_TRUE_STRINGS = {"true", "1", "yes", "on"}
+_FALSE_STRINGS = {"false", "0", "no", "off"}
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _schema_types(schema: dict) -> set[str]:
+    """JSON types a property accepts (``anyOf``/``oneOf`` branches included)."""
+    declared = schema.get("type")
+    types = {declared} if isinstance(declared, str) else set(declared or [])
+    for key in ("anyOf", "oneOf"):
+        for branch in schema.get(key) or []:
+            types |= _schema_types(branch)
+    return types
+
+
+def _matches(types: set[str], value) -> bool:
+    """Whether ``value`` is one of the JSON ``types`` (no types accepts anything)."""
+    if not types:
+        return True
+    if value is None:
+        return "null" in types
+    if isinstance(value, bool):
+        return "boolean" in types
+    if isinstance(value, int):
+        return bool(types & {"integer", "number"})
+    if isinstance(value, float):
+        return "number" in types or ("integer" in types and value.is_integer())
+    if isinstance(value, str):
+        return "string" in types
+    if isinstance(value, list):
+        return "array" in types
+    if isinstance(value, dict):
+        return "object" in types
+    return False
+
+
+def _convert(value, types: set[str]):
+    """Lossless conversion of ``value`` to one of ``types``, or ``_NO_FIX``."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value) if "string" in types else _NO_FIX
+    if isinstance(value, str):
+        text = value.strip()
+        lowered = text.lower()
+        if "null" in types and lowered in ("", "null", "none"):
+            return None
+        if "boolean" in types and lowered in _TRUE_STRINGS | _FALSE_STRINGS:
+            return lowered in _TRUE_STRINGS
+        if "integer" in types and re.fullmatch(r"[-+]?\d+", text):
+            return int(text)
+        if "number" in types and re.fullmatch(r"[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?", text):
+            return float(text)
+        if types & {"object", "array"}:
+            try:
+                parsed = json.loads(text)
+            except ValueError:
+                return _NO_FIX
+            return parsed if _matches(types, parsed) else _NO_FIX
+        return _NO_FIX
+    if isinstance(value, bool):
+        return int(value) if types & {"integer", "number"} else _NO_FIX
+    if isinstance(value, (int, float)):
+        if "boolean" in types and value in (0, 1):
+            return bool(value)
+        if "string" in types:
+            return str(int(value)) if float(value).is_integer() else str(value)
+    return _NO_FIX
+
+
+class _ParamRule:
+    """Repair facts for one inputSchema property, worked out once per schema."""
+
+    def __init__(self, name: str, schema: dict, required: bool):
+        self.name = name
+        self.types = _schema_types(schema)
+        self.required = required
+        self.has_default = "default" in schema
+        self.default = schema.get("default")
+        self.enum = {
+            str(value).lower(): value for value in schema.get("enum") or [] if value is not None
+        }
+        # JSON-object strings such as mt5-mcp's ``parameters``/``query_parameters``
+        text = f"{schema.get('description', '')} {schema.get('title', '')}".lower()
+        self.json_object = "string" in self.types and (
+            name.lower().endswith(("parameters", "params")) or "json object" in text
+        )
+
+    def fill(self):
+        """Value for a missing required argument, or ``_NO_FIX``."""
+        if self.has_default:
+            return self.default
+        if self.json_object:
+            return "{}"
+        if "null" in self.types:
+            return None
+        return _NO_FIX
+
+    def repair(self, value) -> tuple[object, Optional[str]]:
+        """Coerce ``value`` towards the declared type; returns ``(value, note)``."""
+        if _matches(self.types, value):
+            if self.enum and isinstance(value, str):
+                canonical = self.enum.get(value.strip().lower(), value)
+                if canonical != value:
+                    return canonical, f"{self.name}: {value!r} -> {canonical!r}"
+            return value, None
+        fixed = _convert(value, self.types)
+        if fixed is _NO_FIX:
+            return value, None
+        return fixed, f"{self.name}: {type(value).__name__} -> {type(fixed).__name__}"
+
+
+class ToolArgValidator:
+    """
+    Checks (and optionally repairs) one tool's arguments against its inputSchema.
+
+    Built when the tool list is discovered or loaded from the snapshot, so a
+    call only walks the precomputed property rules and runs the compiled
+    jsonschema validator; calls that still fail are answered locally instead
+    of going to the server.
+    """
+
+    def __init__(self, name: str, schema: dict):
+        from jsonschema.exceptions import SchemaError
+        from jsonschema.validators import validator_for
+
+        self.name = name
+        self.schema = schema or {"type": "object"}
+        properties = self.schema.get("properties") or {}
+        required = set(self.schema.get("required") or [])
+        self.rules = {
+            key: _ParamRule(key, prop, key in required) for key, prop in properties.items()
+        }
+        self.closed = self.schema.get("additionalProperties") is False
+        try:
+            validator_class = validator_for(self.schema)
+            validator_class.check_schema(self.schema)
+            self._validator = validator_class(self.schema)
+        except SchemaError as e:
+            print(f"[Tools] Not validating {name}: invalid inputSchema ({e.message})")
+            self._validator = None
+
+    def repair(self, args: dict) -> tuple[dict, list[str]]:
+        """Apply the safe fixes; returns the new arguments and what changed."""
+        fixed = {}
+        notes = []
+        for key, value in args.items():
+            rule = self.rules.get(key)
+            if rule is None:
+                if self.closed:
+                    notes.append(f"{key}: unknown, dropped")
+                else:
+                    fixed[key] = value
+                continue
+            if value is None and not rule.required and not _matches(rule.types, None):
+                notes.append(f"{key}: null, dropped")
+                continue
+            fixed[key], note = rule.repair(value)
+            if note:
+                notes.append(note)
+        for key, rule in self.rules.items():
+            if key in fixed or not rule.required:
+                continue
+            value = rule.fill()
+            if value is not _NO_FIX:
+                fixed[key] = value
+                notes.append(f"{key}: missing -> {json.dumps(value)}")
+        return fixed, notes
+
+    def errors(self, args: dict) -> list[str]:
+        """Schema violations in ``args`` (empty when valid)."""
+        if self._validator is None:
+            return []
+        problems = []
+        for error in self._validator.iter_errors(args):
+            where = ".".join(str(part) for part in error.path)
+            problems.append(f"{where}: {error.message}" if where else error.message)
+        return problems
+
+    def usage(self) -> str:
+        """Compact argument summary for error messages, e.g. ``symbol: string|null``."""
+        fields = [
+            f"{key}{'' if rule.required else '?'}: {'|'.join(sorted(rule.types)) or 'any'}"
+            for key, rule in self.rules.items()
+        ]
+        return ", ".join(fields) or "no arguments"
+
+
+def _repair_json(text: str):
+    """Parse almost-JSON from a model (code fences, trailing commas, Python literals)."""
+    candidate = _CODE_FENCE.sub("", text.strip())
+    start, end = candidate.find("{"), candidate.rfind("}")
+    if start != -1 and end > start:
+        candidate = candidate[start : end + 1]
+    candidate = _TRAILING_COMMA.sub(r"\1", candidate)
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(candidate)  # single quotes, True/False/None
+    except (ValueError, SyntaxError, RecursionError) as e:
+        raise ValueError(f"arguments are not valid JSON ({e})") from None
+
+
+def parse_tool_arguments(text: Optional[str], repair: bool = True) -> tuple[dict, list[str]]:
+    """
+    Parse ``tool_call.function.arguments`` into a dict.
+
+    Returns:
+        ``(arguments, notes)``; ``notes`` says what was repaired.
+
+    Raises:
+        ValueError: Not a JSON object (after repair, when enabled).
+    """
+    text = (text or "").strip()
+    if not text:
+        return {}, []
+    notes = []
+    try:
+        args = json.loads(text)
+    except ValueError as e:
+        if not repair:
+            raise ValueError(f"arguments are not valid JSON ({e})") from None
+        args = _repair_json(text)
+        notes.append("malformed JSON repaired")
+    if not isinstance(args, dict):
+        raise ValueError(f"arguments must be a JSON object, got {type(args).__name__}")
+    return args, notes
+
+
+def get_tool_validator(mcp, name: str) -> Optional[ToolArgValidator]:
+    """Validator for a local or MCP tool (None when its schema is unknown)."""
+    local = LOCAL_TOOLS.get(name)
+    if local is None:
+        return mcp.get_validator(name)
+    if local.validator is None:
+        local.validator = ToolArgValidator(name, local.schema()["function"]["parameters"])
+    return local.validator
+
+
+def prepare_tool_arguments(mcp, name: str, text: Optional[str]) -> tuple[dict, Optional[dict]]:
+    """
+    Parse, repair and validate one tool call's arguments before it is sent.
+
+    Returns:
+        ``(arguments, rejection)``; ``rejection`` is the ``{"error": ...}``
+        result to hand back to the LLM instead of calling the tool.
+    """
+    repair = get_config().tool_arg_repair
+    try:
+        args, notes = parse_tool_arguments(text, repair)
+    except ValueError as e:
+        metrics.inc("tool_args_total", tool=name, result="rejected")
+        return {}, {"error": f"Invalid arguments for `{name}`: {e}", "raw_arguments": text}
+
+    validator = get_tool_validator(mcp, name)
+    if validator is None:
+        if mcp.has_tools() and name not in LOCAL_TOOLS:
+            metrics.inc("tool_args_total", tool=name, result="rejected")
+            return args, {"error": f"Unknown tool `{name}`"}
+        return args, None
+    if repair:
+        args, fixes = validator.repair(args)
+        notes += fixes
+    problems = validator.errors(args)
+    if problems:
+        metrics.inc("tool_args_total", tool=name, result="rejected")
+        return args, {
+            "error": f"Invalid arguments for `{name}`: {'; '.join(problems[:5])}",
+            "expected": validator.usage(),
+        }
+    if notes:
+        print(f"[Tools] Repaired {name} arguments: {'; '.join(notes)}")
+    metrics.inc("tool_args_total", tool=name, result="repaired" if notes else "ok")
+    return args, None
+
+
+# ============================================================================
+# Local Indicator Tools
+# ============================================================================
+
+
+def _result_bars(result: dict) -> Optional[dict]:
+    """OHLCV arrays (see ``indicators.BAR_FIELDS``) from a bars tool result, if any."""
+    try:
+        rows = json.loads(result["result"]).get("data")
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    if not isinstance(rows, list) or not rows or not isinstance(rows[0], dict):
+        return None
+    if "close" not in rows[0] or "time" not in rows[0]:
+        return None
+    bars = {"time": _to_epoch_array([row.get("time") for row in rows])}
+    for field in BAR_FIELDS[1:]:
+        bars[field] = _to_float_array([row.get(field, row.get("close")) for row in rows])
+    return bars
+
+
+def with_local_tools(tools: Optional[list[dict]]) -> Optional[list[dict]]:
+    """``tools`` plus the local tool schemas (same list object for the same input)."""
+    global _with_local_tools
+    if not tools or not LOCAL_TOOLS or not get_config().local_tools:
+        return tools
+    if _with_local_tools[0] is not tools:
+        _with_local_tools = (tools, tools + [tool.schema() for tool in LOCAL_TOOLS.values()])
+    return _with_local_tools[1]
+
+
+_with_local_tools: tuple = (None, None)
+
+
+def _local_rows(arguments: dict) -> int:
+    """Rows a local tool returns (``count``, default 10, at most 500)."""
+    return max(1, min(int(arguments.get("count") or 10), 500))
+
+
+def _local_result(tool: LocalTool, symbol: str, timeframe: str, bars: dict, arguments: dict):
+    import numpy as np
+
+    start = time.perf_counter()
+    columns = tool.compute(bars, **arguments)
+    count = _local_rows(arguments)
+    rows = []
+    for i in range(max(0, len(bars["time"]) - count), len(bars["time"])):
+        row = {"time": _format_epoch(bars["time"][i]), "close": round(float(bars["close"][i]), 6)}
+        for column, values in columns.items():
+            row[column] = None if np.isnan(values[i]) else round(float(values[i]), 6)
+        rows.append(row)
+    seconds = time.perf_counter() - start
+    metrics.inc("local_tool_calls_total", tool=tool.name)
+    metrics.observe("local_tool_seconds", seconds)
+    payload = {
+        "success": True,
+        "source": "local",
+        "symbol": symbol,
+        "timeframe": timeframe,
+        "bars": len(bars["time"]),
+        "data": rows,
+    }
+    return {"result": json.dumps(payload)}
+
+
+def call_local_tool(mcp, name: str, arguments: dict) -> concurrent.futures.Future:
+    """
+    Run a local indicator tool; returns a ``concurrent.futures.Future``.
+
+    Bars come from an uploaded file named by ``symbol``, from the on-disk
+    bar store (zero-copy views) when its series is current and long enough,
+    or are fetched through the tool cache: at least ``LOCAL_TOOL_BARS``, and
+    enough for the indicator to settle before the first returned row.
+    """
+    tool = LOCAL_TOOLS[name]
+    future = concurrent.futures.Future()
+    symbol = str(arguments.get("symbol") or "").strip()
+    timeframe = str(arguments.get("timeframe") or "H1").upper()
+
+    def finish(bars: Optional[dict]):
+        if future.cancelled():
+            return
+        if not bars or not len(bars.get("close", ())):
+            future.set_result({"error": f"No {timeframe} bars available for {symbol}"})
+            return
+        try:
+            future.set_result(_local_result(tool, symbol, timeframe, bars, arguments))
+        except Exception as e:
+            future.set_result({"error": f"{name} failed: {e}"})
+
+    attachment = get_attachment(symbol)
+    if attachment is not None and "close" in attachment.columns:
+        import numpy as np
+
+        columns = attachment.columns
+        bars = {f: columns.get(f, columns["close"]) for f in BAR_FIELDS}
+        times = next((columns[n] for n in _TIME_COLUMNS if n in columns), None)
+        bars["time"] = times if times is not None else np.full(len(columns["close"]), np.nan)
+        finish(bars)
+        return future
+
+    query_tool = find_tool_name(mcp, "mt5_query_tool")
+    if query_tool is None:
+        finish(None)
+        return future
+    try:
+        needed = tool.bars_needed(arguments, _local_rows(arguments))
+    except (TypeError, ValueError) as e:
+        future.set_result({"error": f"{name} failed: {e}"})
+        return future
+    count = max(get_config().local_tool_bars, needed)
+    store = get_ohlcv_store()
+    if store is not None:
+        bars = store.view(mcp.server_identity(query_tool), symbol, timeframe, count)
+        period = _TIMEFRAME_SECONDS.get(timeframe)
+        if (
+            bars is not None
+            and "close" in bars
+            and len(bars["time"]) >= needed
+            and period
+            and _server_now() - float(bars["time"][-1]) < period
+        ):
+            metrics.inc("local_tool_bars_total", source="store")
+            finish({f: bars.get(f, bars["close"]) for f in BAR_FIELDS})
+            return future
+    metrics.inc("local_tool_bars_total", source="fetch")
+    fetch_args = {
+        "operation": "copy_rates_from_pos",
+        "symbol": symbol.upper(),
+        "parameters": json.dumps({"timeframe": timeframe, "start_pos": 0, "count": count}),
+    }
+    fetch = get_tool_cache().call(mcp, query_tool, fetch_args)
+    future.add_done_callback(lambda f: fetch.cancel() if f.cancelled() else None)
+
+    def fetched(f):
+        if f.cancelled() or future.cancelled():
+            return
+        error = str(f.exception()) if f.exception() is not None else f.result().get("error")
+        if error:
+            future.set_result({"error": error})
+        else:
+            finish(_result_bars(f.result()))
+
+    fetch.add_done_callback(fetched)
+    return future
+
+
+# ============================================================================
+# On-Disk Bar Cache
+# ============================================================================
+
+_TIME_PATTERNS = ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y.%m.%d %H:%M:%S", "%Y.%m.%d %H:%M")
+
+
+def _time_format(sample) -> str:
+    """``"epoch"`` or the strptime pattern of a bar time as the server sent it."""
+    from datetime import datetime
+
+    if isinstance(sample, (int, float)):
+        return "epoch"
+    for pattern in _TIME_PATTERNS:
+        try:
+            datetime.strptime(str(sample), pattern)
+            return pattern
+        except ValueError:
+            continue
+    return _TIME_PATTERNS[0]
+
+
+class OhlcvStore:
+    """
+    Memory-mapped columnar bar store, one directory per server, symbol and timeframe.
+
+    Each field (``time``, ``open``, ..., ``real_volume``) is a raw
+    little-endian float64 file read through ``np.memmap``, so history slices
+    are views into the page cache rather than copies. ``fetch`` wraps a
+    ``copy_rates_from_pos`` call (latest bars): when the series is already
+    stored it requests only the bars since the last stored one (plus that
+    bar, which may still have been forming), appends them in place and
+    serves the requested window from disk. A fetch that does not reach back
+    to the stored series falls back to the full request.
+
+    Series are compacted to ``max_bars`` once they grow a quarter past it;
+    the least recently updated series are dropped beyond ``max_bytes``.
+    Compaction writes a new file generation, so open maps stay valid.
+
+    Every series is keyed by the server that supplied it (``server``, see
+    ``MCPClient.server_identity``): brokers differ in prices and server-time
+    offset, so bars from different servers are never merged.
+    """
+
+    def __init__(self, root: str, max_bars: int = 50_000, max_bytes: int = 256 << 20):
+        self.root = Path(os.path.expanduser(root))
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bars = max_bars
+        self.max_bytes = max_bytes
+        self._maps: dict[tuple, tuple[dict, dict]] = {}  # key -> (meta, columns)
+        self._lock = threading.RLock()
+        self._drop_unkeyed_series()
+
+    def _drop_unkeyed_series(self):
+        """Remove series stored before they were keyed by server (cannot be attributed)."""
+        for meta in self.root.glob("*/meta.json"):
+            try:
+                generation = json.loads(meta.read_text())["generation"]
+                for column in meta.parent.glob(f"*.{generation}.f8"):
+                    column.unlink()
+                meta.unlink()
+                meta.parent.rmdir()
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+
+    @staticmethod
+    def _key(server: str, symbol: str, timeframe: str) -> tuple[str, str, str]:
+        return server, symbol.upper(), timeframe.upper()
+
+    def _dir(self, key: tuple[str, str, str]) -> Path:
+        server, symbol, timeframe = key
+        server_dir = hashlib.sha256(server.encode()).hexdigest()[:16]
+        return self.root / server_dir / f"{re.sub(r'[^A-Za-z0-9._-]', '_', symbol)}_{timeframe}"
+
+    def _load(self, key: tuple[str, str, str]) -> Optional[tuple[dict, dict]]:
+        import numpy as np
+
+        if key in self._maps:
+            return self._maps[key]
+        path = self._dir(key)
+        try:
+            meta = json.loads((path / "meta.json").read_text())
+            files = {f: path / f"{f}.{meta['generation']}.f8" for f in meta["fields"]}
+            rows = min(file.stat().st_size // 8 for file in files.values())
+        except (OSError, ValueError, KeyError):
+            return None
+        columns = {
+            f: np.memmap(file, dtype="<f8", mode="r", shape=(rows,)) if rows else np.empty(0)
+            for f, file in files.items()
+        }
+        self._maps[key] = (meta, columns)
+        return self._maps[key]
+
+    def view(
+        self, server: str, symbol: str, timeframe: str, count: Optional[int] = None
+    ) -> Optional[dict]:
+        """The latest ``count`` stored bars (all when None) as zero-copy array views."""
+        with self._lock:
+            entry = self._load(self._key(server, symbol, timeframe))
+        if entry is None or not len(entry[1]["time"]):
+            return None
+        start = -count if count else 0
+        return {field: column[start:] for field, column in entry[1].items()}
+
+    def _replace(self, key: tuple[str, str, str], meta: dict, arrays: dict):
+        """Write ``arrays`` as a new generation of the series and switch to it."""
+        path = self._dir(key)
+        path.mkdir(parents=True, exist_ok=True)
+        generation = int(time.time() * 1000)
+        for field in meta["fields"]:
+            arrays[field].astype("<f8").tofile(path / f"{field}.{generation}.f8")
+        meta = {**meta, "generation": generation}
+        (path / "meta.tmp").write_text(json.dumps(meta))
+        os.replace(path / "meta.tmp", path / "meta.json")
+        self._maps.pop(key, None)
+        for stale in path.glob("*.f8"):
+            if not stale.name.endswith(f".{generation}.f8"):
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass  # still mapped (Windows); removed after the next compaction
+
+    def _append(self, key: tuple[str, str, str], meta: dict, arrays: dict, position: int):
+        """Write ``arrays`` starting at row ``position`` (overwriting from there)."""
+        path = self._dir(key)
+        for field in meta["fields"]:
+            with open(path / f"{field}.{meta['generation']}.f8", "r+b") as f:
+                f.seek(position * 8)
+                f.write(arrays[field].astype("<f8").tobytes())
+        os.utime(path / "meta.json")  # recency for size-based eviction
+        self._maps.pop(key, None)
+
+    def _enforce_size(self, keep: Path):
+        series = []
+        total = 0
+        for meta in self.root.glob("*/*/meta.json"):
+            path = meta.parent
+            size = sum(f.stat().st_size for f in path.glob("*.f8"))
+            series.append((meta.stat().st_mtime, size, path))
+            total += size
+        for _mtime, size, path in sorted(series):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            self._maps = {k: v for k, v in self._maps.items() if self._dir(k) != path}
+            total -= size
+            metrics.inc("bar_cache_evictions_total")
+
+    def store(
+        self, server: str, symbol: str, timeframe: str, rows: list[dict], incremental: bool
+    ) -> bool:
+        """
+        Add fetched bars (oldest first). With ``incremental`` they must reach
+        back to the last stored bar; returns False when they do not (a gap).
+        """
+        import numpy as np
+
+        key = self._key(server, symbol, timeframe)
+        sample = rows[0]
+        fields = ["time"] + [
+            f for f, v in sample.items() if f != "time" and isinstance(v, (int, float))
+        ]
+        arrays = {"time": _to_epoch_array([row.get("time") for row in rows])}
+        for field in fields[1:]:
+            arrays[field] = _to_float_array([row.get(field) for row in rows])
+        order = np.argsort(arrays["time"], kind="stable")
+        arrays = {f: a[order] for f, a in arrays.items()}
+
+        with self._lock:
+            entry = self._load(key) if incremental else None
+            if entry is not None and entry[0]["fields"] == fields and len(entry[1]["time"]):
+                meta, columns = entry
+                last = columns["time"][-1]
+                if arrays["time"][0] > last:
+                    return False
+                newer = arrays["time"] >= last
+                arrays = {f: a[newer] for f, a in arrays.items()}
+                stored = len(columns["time"])
+                position = stored - 1 if arrays["time"][0] == last else stored
+                if position + len(arrays["time"]) > self.max_bars * 1.25:
+                    merged = {
+                        f: np.concatenate([columns[f][:position], arrays[f]])[-self.max_bars :]
+                        for f in fields
+                    }
+                    self._replace(key, meta, merged)
+                else:
+                    self._append(key, meta, arrays, position)
+            elif incremental:
+                return False
+            else:
+                meta = {
+                    "server": server,
+                    "fields": fields,
+                    "time_format": _time_format(sample.get("time")),
+                    "int_fields": [f for f in fields[1:] if isinstance(sample[f], int)],
+                }
+                self._replace(key, meta, {f: a[-self.max_bars :] for f, a in arrays.items()})
+            self._enforce_size(self._dir(key))
+        return True
+
+    def rows(
+        self, server: str, symbol: str, timeframe: str, count: int
+    ) -> Optional[list[dict]]:
+        """The latest ``count`` bars in the server's row format."""
+        from datetime import datetime, timezone
+
+        key = self._key(server, symbol, timeframe)
+        with self._lock:
+            entry = self._load(key)
+        if entry is None or len(entry[1]["time"]) < count:
+            return None
+        meta, columns = entry
+        window = {f: column[-count:].tolist() for f, column in columns.items()}
+        ints = set(meta.get("int_fields", []))
+        pattern = meta.get("time_format", "epoch")
+        out = []
+        for i in range(count):
+            row = {}
+            for field in meta["fields"]:
+                value = window[field][i]
+                if field == "time":
+                    value = (
+                        int(value)
+                        if pattern == "epoch"
+                        else datetime.fromtimestamp(value, tz=timezone.utc).strftime(pattern)
+                    )
+                elif field in ints:
+                    value = int(value)
+                row[field] = value
+            out.append(row)
+        return out
+
+    def fetch(self, mcp, name: str, arguments: dict) -> concurrent.futures.Future:
+        """``copy_rates_from_pos`` (start_pos 0) through the store; returns a future."""
+        params = json.loads(arguments.get("parameters") or "{}")
+        server = mcp.server_identity(name)
+        symbol = str(arguments.get("symbol") or "").upper()
+        timeframe = str(params.get("timeframe") or "H1").upper()
+        count = int(params.get("count", 0))
+        proxy = concurrent.futures.Future()
+
+        fetch_count = count
+        stored = self.view(server, symbol, timeframe)
+        period = _TIMEFRAME_SECONDS.get(timeframe)
+        if stored is not None and period and len(stored["time"]) >= count:
+            behind = max(0, int((_server_now() - float(stored["time"][-1])) // period))
+            fetch_count = min(count, behind + 2)
+
+        def attempt(bars: int):
+            request = dict(arguments, parameters=json.dumps({**params, "count": bars}))
+            inner = mcp.submit(mcp.call_tool(name, request))
+            proxy.add_done_callback(lambda p: inner.cancel() if p.cancelled() else None)
+            inner.add_done_callback(lambda f: finish(f, bars < count))
+
+        def finish(f: concurrent.futures.Future, incremental: bool):
+            if proxy.cancelled() or f.cancelled():
+                return
+            if f.exception() is not None:
+                proxy.set_exception(f.exception())
+                return
+            result = f.result()
+            try:
+                payload = json.loads(result["result"])
+                rows = payload["data"]
+                if not rows or "error" in result:
+                    raise ValueError("no bars")
+                if not self.store(server, symbol, timeframe, rows, incremental):
+                    metrics.inc("bar_cache_total", result="gap")
+                    attempt(count)
+                    return
+                if incremental:
+                    payload["data"] = self.rows(server, symbol, timeframe, count)
+                    if payload["data"] is None:
+                        raise ValueError("window not stored")
+                    metrics.inc("bar_cache_total", result="incremental")
+                    metrics.inc("bar_cache_bars_saved_total", count - len(rows))
+                    result = {"result": json.dumps(payload)}
+                else:
+                    metrics.inc("bar_cache_total", result="full")
+            except Exception as e:
+                if incremental:
+                    print(f"[BarCache] {symbol} {timeframe}: {e}; fetching in full")
+                    attempt(count)
+                    return
+            proxy.set_result(result)
+
+        attempt(fetch_count)
+        return proxy
+
+
+def _server_now() -> float:
+    """Now on the broker's clock, which bar times use (SCHEDULE_UTC_OFFSET hours ahead)."""
+    return time.time() + get_config().schedule_utc_offset * 3600
+
+
+_ohlcv_store: Optional[OhlcvStore] = None
+
+
+def get_ohlcv_store() -> Optional[OhlcvStore]:
+    """The on-disk bar store, or None when ``BAR_CACHE_DIR`` is empty."""
+    global _ohlcv_store
+    config = get_config()
+    if _ohlcv_store is None and config.bar_cache_dir:
+        try:
+            _ohlcv_store = OhlcvStore(
+                config.bar_cache_dir,
+                config.bar_cache_max_bars,
+                int(config.bar_cache_max_mb * (1 << 20)),
+            )
+        except OSError as e:
+            print(f"[BarCache] Disabled: {e}")
+            config.bar_cache_dir = ""
+    return _ohlcv_store
+
+
+# ============================================================================
+# Local Chart Rendering
+# ============================================================================
+
+_CHART_CACHE_DIR = os.path.join(IMAGE_OUTPUT_DIR, "local_charts")
+_CHART_CACHE_SIZE = 200  # PNG files kept
+_chart_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+_chart_pool_lock = threading.Lock()
+
+
+def _get_chart_pool() -> Optional[concurrent.futures.ProcessPoolExecutor]:
+    """Render worker processes (spawned, so they never inherit the app's threads)."""
+    global _chart_pool
+    config = get_config()
+    with _chart_pool_lock:
+        if _chart_pool is None and config.local_charts:
+            import importlib.util
+            import multiprocessing
+
+            if importlib.util.find_spec("matplotlib") is None:
+                print("[Charts] LOCAL_CHARTS needs matplotlib (pip install matplotlib)")
+                config.local_charts = False
+                return None
+            from mt5_mcp_ui import charts
+
+            _chart_pool = concurrent.futures.ProcessPoolExecutor(
+                config.chart_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            for _ in range(config.chart_workers):
+                _chart_pool.submit(charts.warm_up)
+        return _chart_pool
+
+
+def _reset_chart_pool(pool: concurrent.futures.ProcessPoolExecutor):
+    """Drop a pool whose worker died; the next chart starts a new one."""
+    global _chart_pool
+    with _chart_pool_lock:
+        if _chart_pool is pool:
+            _chart_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _chart_panels(arguments: dict) -> Optional[list[dict]]:
+    """Panels of an analyze call that asks for a chart, or None."""
+    enabled = arguments.get("enable_chart")
+    if isinstance(enabled, str):
+        enabled = enabled.strip().lower() in ("true", "1", "yes")
+    if not enabled:
+        return None
+    panels = arguments.get("chart_panels") or [{"columns": ["close"]}]
+    if isinstance(panels, str):
+        try:
+            panels = json.loads(panels)
+        except ValueError:
+            return None
+    if isinstance(panels, dict):
+        panels = [panels]
+    if not isinstance(panels, list) or not all(isinstance(p, dict) for p in panels):
+        return None
+    return panels
+
+
+def wants_local_chart(name: str, arguments: dict) -> bool:
+    """Whether this tool call's chart should be drawn locally."""
+    return (
+        get_config().local_charts
+        and name.rsplit("__", 1)[-1] == "mt5_analyze_tool"
+        and _chart_panels(arguments) is not None
     )
 
-    # Build messages for Azure AI Inference format
-    messages = [SystemMessage(content=config.system_prompt)]
 
-    for msg in history:
-        if isinstance(msg, dict):
-            role = msg.get("role", "user")
-            content = msg.get("content", "")
-            if isinstance(content, str) and content:
-                if role == "assistant":
-                    messages.append(AssistantMessage(content=content))
-                else:
-                    messages.append(UserMessage(content=content))
+def render_chart(title: str, rows: list[dict], panels: list[dict]) -> concurrent.futures.Future:
+    """
+    Render ``panels`` over the data rows in the chart pool; the future
+    resolves to the PNG path.
 
-    messages.append(UserMessage(content=message))
+    Charts are cached by a hash of the plotted data and layout, so the
+    same analysis is never drawn twice.
 
+    Raises:
+        ValueError: A panel column is missing from the data.
+    """
+    import numpy as np
+
+    from mt5_mcp_ui import charts
+
+    columns = list(dict.fromkeys(c for panel in panels for c in panel.get("columns", [])))
+    if not columns:
+        raise ValueError("no columns to plot")
+    series = {c: _to_float_array([row.get(c) for row in rows]) for c in columns}
+    missing = [c for c, values in series.items() if np.isnan(values).all()]
+    if missing:
+        raise ValueError(f"columns not in the data: {', '.join(missing)}")
+    times = _to_epoch_array([row.get("time") for row in rows])
+
+    digest = hashlib.sha256(json.dumps([title, panels], sort_keys=True).encode())
+    digest.update(times.tobytes())
+    for column in columns:
+        digest.update(series[column].tobytes())
+    path = Path(_CHART_CACHE_DIR) / f"chart_{digest.hexdigest()[:24]}.png"
+    if path.exists():
+        metrics.inc("local_charts_total", result="cached")
+        os.utime(path)
+        future = concurrent.futures.Future()
+        future.set_result(str(path))
+        return future
+
+    pool = _get_chart_pool()
+    if pool is None:
+        raise ValueError("local charts are unavailable")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
     try:
-        response = client.complete(
-            messages=messages,
-            max_tokens=4096,
-            model=config.llm_model,
-        )
-        return response.choices[0].message.content or "No response from model."
-    except Exception as e:
-        return f"❌ Azure AI Inference error: {str(e)}"
+        future = pool.submit(charts.render_panels, str(path), title, times, series, panels)
+    except concurrent.futures.BrokenExecutor as e:
+        _reset_chart_pool(pool)
+        raise ValueError(f"chart workers stopped: {e}") from e
+
+    def _done(f):
+        if f.cancelled():
+            return
+        if isinstance(f.exception(), concurrent.futures.BrokenExecutor):
+            _reset_chart_pool(pool)
+        if f.exception() is not None:
+            return
+        metrics.inc("local_charts_total", result="rendered")
+        metrics.observe("local_chart_seconds", time.perf_counter() - start)
+        stale = sorted(path.parent.glob("chart_*.png"), key=lambda p: p.stat().st_mtime)
+        for old in stale[:-_CHART_CACHE_SIZE]:
+            old.unlink(missing_ok=True)
+
+    future.add_done_callback(_done)
+    return future
+
+
+def call_with_local_chart(mcp, name: str, arguments: dict) -> concurrent.futures.Future:
+    """
+    Run an analyze call without the server-side chart, then draw the chart
+    locally from the returned data (``"local_chart"`` in the result holds
+    the PNG path). If the data cannot be plotted, the original call is made
+    so the server draws it as before.
+    """
+    panels = _chart_panels(arguments)
+    proxy = concurrent.futures.Future()
+    analysis = get_tool_cache().call(mcp, name, dict(arguments, enable_chart=False))
+    proxy.add_done_callback(lambda p: analysis.cancel() if p.cancelled() else None)
+
+    def fall_back(reason: str):
+        print(f"[Charts] Server chart used: {reason}")
+        metrics.inc("local_charts_total", result="fallback")
+        retry = get_tool_cache().call(mcp, name, arguments)
+        proxy.add_done_callback(lambda p: retry.cancel() if p.cancelled() else None)
+        retry.add_done_callback(lambda r: _copy(r, proxy))
+
+    def analyzed(f):
+        if proxy.cancelled() or f.cancelled() or f.exception() is not None or (
+            "error" in f.result()
+        ):
+            _copy(f, proxy)
+            return
+        result = f.result()
+        try:
+            payload = json.loads(result["result"])
+            rows = payload.get("data")
+            if not isinstance(rows, list) or not rows or not isinstance(rows[0], dict):
+                raise ValueError("no data rows in the analysis")
+            params = arguments.get("query_parameters") or "{}"
+            params = json.loads(params) if isinstance(params, str) else params
+            title = f"{arguments.get('query_symbol', '')} {params.get('timeframe', '')}"
+            render = render_chart(title.strip(), rows, panels)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            fall_back(str(e))
+            return
+
+        def rendered(r):
+            if proxy.cancelled():
+                return
+            if r.cancelled() or r.exception() is not None:
+                fall_back(f"render failed: {r.exception()}")
+                return
+            proxy.set_result({**result, "local_chart": r.result()})
+
+        render.add_done_callback(rendered)
+
+    analysis.add_done_callback(analyzed)
+    return proxy
+
+
+# ============================================================================
+# Response Cache
+# ============================================================================
+
+# Asking for live data always bypasses the response cache
+_LIVE_DATA_WORDS = re.compile(
+    r"\b(live|real[- ]?time|now|right now|current(ly)?|latest|today|fresh|refresh|"
+    r"update[ds]?|this (minute|hour))\b",
+    re.IGNORECASE,
+)
+# Answers in these forms are failures or interruptions and are never cached
+_UNCACHEABLE_PREFIXES = ("❌", "⏹️", "⏱️", "⚠️", "⏳")
+_ALWAYS_OPEN_CODES = {"BTC", "ETH", "LTC", "XRP", "SOL", "BNB"}  # crypto trades 24/7
+_HISTORY_WINDOW = 4  # trailing history messages that make up the cache key
+
+
+class ResponseCache:
+    """LRU cache of final answers with a per-entry expiry."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: dict[str, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._entries[key] = entry  # most recently used goes last
+            return entry[1]
+
+    def put(self, key: str, answer: str, ttl: float):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, answer)
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get or create the shared response cache."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(get_config().response_cache_size)
+    return _response_cache
+
+
+def wants_live_data(message: str) -> bool:
+    """Whether the user explicitly asks for up-to-the-moment data."""
+    return bool(_LIVE_DATA_WORDS.search(message))
+
+
+def response_cache_key(message: str, history: list, mcp) -> str:
+    """Key on the normalized prompt, recent history, model and tool schemas."""
+    config = get_config()
+    prompt = re.sub(r"\s+", " ", message.strip().lower()).rstrip("?.! ")
+    recent = [
+        (msg.get("role"), msg.get("content"))
+        for msg in history[-_HISTORY_WINDOW:]
+        if isinstance(msg, dict)
+    ]
+    model = config.llm_deployments or [config.llm_provider, config.llm_model]
+    tools = mcp.get_tools_for_openai()
+    parts = [prompt, recent, model, config.system_prompt, tools]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _fx_market_reopens_in(now: Optional[float] = None) -> float:
+    """
+    Seconds until the FX/CFD week opens again (0 while it is open).
+
+    The market is treated as closed from Friday 22:00 to Sunday 22:00 UTC.
+    """
+    now = time.time() if now is None else now
+    week_seconds = (now - 345600) % 604800  # 1970-01-05 was a Monday
+    open_at = 6 * 86400 + 22 * 3600  # Sunday 22:00
+    close_at = 4 * 86400 + 22 * 3600  # Friday 22:00
+    if close_at <= week_seconds < open_at:
+        return open_at - week_seconds
+    return 0.0
+
+
+def answer_ttl(message: str, answer: str) -> float:
+    """
+    How long an answer stays valid.
+
+    Answers without market data (capabilities, explanations) keep for
+    ``RESPONSE_CACHE_STATIC_TTL``. Answers built from tool data keep for
+    ``RESPONSE_CACHE_TTL`` while the market trades, and until the market
+    reopens (capped by the static TTL) over the weekend, except for crypto
+    symbols, which trade all week.
+    """
+    config = get_config()
+    if "🔧 **Calling tool:" not in answer:
+        return config.response_cache_static_ttl
+    symbols = extract_symbols(message)
+    if any(symbol[:3] in _ALWAYS_OPEN_CODES for symbol in symbols):
+        return config.response_cache_ttl
+    closed_for = _fx_market_reopens_in()
+    if closed_for:
+        return min(closed_for, config.response_cache_static_ttl)
+    return config.response_cache_ttl
+
+
+def _is_cacheable_answer(answer: str) -> bool:
+    if not answer or answer.startswith(_UNCACHEABLE_PREFIXES):
+        return False
+    # Charts live in the temp dir; an answer whose images are gone is stale
+    return all(
+        Path(line.split(":", 1)[1]).exists()
+        for line in answer.split("\n")
+        if line.startswith("__IMAGE_PATH__:")
+    )
 
 
 # ============================================================================
@@ -662,24 +4799,61 @@ def _chat_with_azure_ai_inference(
 # ============================================================================
 
 
-def chat_with_tools(message: str, history: list) -> str:
+def chat_with_tools(
+    message: str, history: list, turn: Optional[TurnContext] = None
+) -> str:
     """
     Process chat message with MCP tool support.
 
     Uses LLM to decide when to call tools.
     Returns final response as string.
+
+    ``turn`` carries the deadline and cancellation signal for this message;
+    when omitted a turn bounded by ``TURN_TIMEOUT`` is created.
     """
     config = get_config()
+    if turn is None:
+        turn = TurnContext(config.turn_timeout)
     mcp = get_mcp_client()
+
+    # Simple data requests ("quote for BTC/USD") skip the LLM entirely
+    if config.fast_path_intents:
+        fast_answer = try_fast_path(message, mcp, turn)
+        if fast_answer is not None:
+            turn.record("served", source="fast_path")
+            return fast_answer
+
+    # Analyses the scheduler recomputes at every bar close
+    if _analysis_scheduler is not None:
+        scheduled = _analysis_scheduler.answer(message)
+        if scheduled is not None:
+            turn.record("served", source="scheduled")
+            return scheduled
+
+    cache_key = None
+    if config.response_cache and not wants_live_data(message):
+        cache_key = response_cache_key(message, history, mcp)
+        cached = get_response_cache().get(cache_key)
+        if cached is not None:
+            metrics.inc("response_cache_total", result="hit")
+            turn.record("served", source="response_cache")
+            return cached
+        metrics.inc("response_cache_total", result="miss")
+
+    answer = _answer_with_llm(message, history, turn, mcp)
+    if cache_key is not None and _is_cacheable_answer(answer):
+        get_response_cache().put(cache_key, answer, answer_ttl(message, answer))
+    return answer
+
+
+def _answer_with_llm(message: str, history: list, turn: TurnContext, mcp) -> str:
+    """Run the LLM + tools pipeline for one message (see ``chat_with_tools``)."""
+    config = get_config()
     llm = get_llm_client()
 
     if not llm:
         return "❌ LLM not configured. Please set API key in environment or settings."
 
-    # Check if using Azure AI Inference (different SDK)
-    if isinstance(llm, dict) and llm.get("type") == "azure_ai_inference":
-        return _chat_with_azure_ai_inference(message, history, llm, config, mcp)
-
     # Build conversation messages
     messages = [{"role": "system", "content": config.system_prompt}]
 
@@ -699,22 +4873,32 @@ def chat_with_tools(message: str, history: list) -> str:
 
     messages.append({"role": "user", "content": message})
 
-    # Get available tools (async in sync context)
+    # Get available tools. Cached schemas (from an earlier discovery or the
+    # on-disk snapshot) are used immediately and refreshed in the background
+    # once they are older than MCP_TOOLS_TTL.
     openai_tools = None
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        tools = loop.run_until_complete(mcp.list_tools())
+        if mcp.has_tools():
+            if mcp.tools_age() > config.mcp_tools_ttl:
+                mcp.refresh_tools_in_background()
+        else:
+            turn.status = "Discovering tools..."
+            turn.wait(mcp.submit(mcp.list_tools()), config.mcp_tool_timeout or None)
         # Only use tools if we actually have some - empty list causes errors with some providers
-        if tools:
-            openai_tools = mcp.get_tools_for_openai()
-            if not openai_tools:  # Empty list -> None
-                openai_tools = None
+        openai_tools = with_local_tools(mcp.get_tools_for_openai()) or None
+        if openai_tools and config.speculative_prefetch:
+            prefetch_market_data(
+                mcp, message, [tool["function"]["name"] for tool in openai_tools]
+            )
+        if openai_tools:
+            openai_tools = select_tools(openai_tools, message, history)
+    except (TurnCancelledError, TurnTimeoutError):
+        pass  # reported by the check below
     except Exception as e:
         print(f"[MCP] Tool discovery failed: {e}")
-        tools = []
 
     try:
+        turn.check()
         # First LLM call - may request tool use
         # Only pass tools/tool_choice if we have tools
         call_kwargs = {
@@ -725,22 +4909,25 @@ def chat_with_tools(message: str, history: list) -> str:
             call_kwargs["tools"] = openai_tools
             call_kwargs["tool_choice"] = "auto"
 
-        response = llm.chat.completions.create(**call_kwargs)
-
-        assistant_message = response.choices[0].message
+        turn.status = "Thinking..."
+        assistant_message = _create_completion(llm, turn, **call_kwargs)
 
         # Check if tool calls requested
         if assistant_message.tool_calls:
             output_parts = []
             all_tool_results = []
+            sent_arguments = {}  # tool_call.id -> arguments after repair
 
             # Execute each tool call
             for tool_call in assistant_message.tool_calls:
                 tool_name = tool_call.function.name
-                try:
-                    tool_args = json.loads(tool_call.function.arguments)
-                except json.JSONDecodeError:
-                    tool_args = {}
+                # Checked against the tool's inputSchema first; invalid calls
+                # are answered here and never reach the server
+                tool_args, rejected = prepare_tool_arguments(
+                    mcp, tool_name, tool_call.function.arguments
+                )
+                if not rejected:
+                    sent_arguments[tool_call.id] = json.dumps(tool_args)
 
                 output_parts.append(f"🔧 **Calling tool: `{tool_name}`**")
 
@@ -750,95 +4937,899 @@ def chat_with_tools(message: str, history: list) -> str:
                     args_str = args_str[:500] + "..."
                 output_parts.append(f"```json\n{args_str}\n```")
 
-                # Execute tool via MCP
-                try:
-                    result = loop.run_until_complete(
-                        mcp.call_tool(tool_name, tool_args)
+                # Execute tool via MCP (bounded by the tool and turn deadlines)
+                turn.status = f"Running `{tool_name}`..."
+                tool_start = time.monotonic()
+                try:
+                    if rejected:
+                        result = rejected
+                    else:
+                        if tool_name in LOCAL_TOOLS:
+                            future = call_local_tool(mcp, tool_name, tool_args)
+                        elif wants_local_chart(tool_name, tool_args):
+                            future = call_with_local_chart(mcp, tool_name, tool_args)
+                        else:
+                            future = get_tool_cache().call(mcp, tool_name, tool_args)
+                        result = turn.wait(future, config.tool_timeout(tool_name))
+                except TimeoutError as e:
+                    metrics.inc("mcp_calls_total", tool=tool_name, status="timeout")
+                    result = {"error": f"Tool `{tool_name}` {e}"}
+                except (TurnCancelledError, TurnTimeoutError):
+                    raise
+                except Exception as e:
+                    result = {"error": str(e)}
+                turn.record(
+                    "tool",
+                    name=tool_name,
+                    arguments=tool_args,
+                    seconds=round(time.monotonic() - tool_start, 3),
+                    error=result.get("error"),
+                )
+
+                all_tool_results.append(
+                    {
+                        "tool_call_id": tool_call.id,
+                        "name": tool_name,
+                        "result": result,
+                    }
+                )
+
+                # Extract images from full result BEFORE truncating
+                full_result_str = json.dumps(result, indent=2)
+                _, tool_images = extract_images_from_response(full_result_str)
+                if result.get("local_chart"):
+                    tool_images.append(result["local_chart"])
+
+                # Show result preview (truncated for display)
+                result_str = full_result_str
+                if len(result_str) > 1000:
+                    result_str = result_str[:1000] + "\n... (truncated)"
+
+                status = "❌" if "error" in result else "✅"
+                output_parts.append(
+                    f"{status} **Result:**\n```json\n{result_str}\n```\n"
+                )
+
+                # Add extracted images to output
+                for img_path in tool_images:
+                    if Path(img_path).exists():
+                        copied_path = copy_image_to_output(img_path)
+                        output_parts.append(f"__IMAGE_PATH__:{copied_path}")
+
+            # Server is down (circuit open): answer right away instead of
+            # spending a second LLM round trip on the failure
+            if all(tr["result"].get("unavailable") for tr in all_tool_results):
+                return all_tool_results[0]["result"]["error"]
+
+            # Add tool calls to messages
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": tc.id,
+                            "type": "function",
+                            "function": {
+                                "name": tc.function.name,
+                                "arguments": sent_arguments.get(
+                                    tc.id, tc.function.arguments
+                                ),
+                            },
+                        }
+                        for tc in assistant_message.tool_calls
+                    ],
+                }
+            )
+
+            # Add tool results to messages
+            for tr in all_tool_results:
+                messages.append(
+                    {
+                        "role": "tool",
+                        "tool_call_id": tr["tool_call_id"],
+                        "content": json.dumps(tr["result"]),
+                    }
+                )
+
+            # Second LLM call - analyze results
+            turn.status = "Writing analysis..."
+            final_message = _create_completion(
+                llm, turn, model=config.llm_model, messages=messages
+            )
+
+            final_content = final_message.content or ""
+
+            # Combine tool execution details with final analysis
+            output_parts.append("---")
+            output_parts.append(f"📊 **Analysis:**\n\n{final_content}")
+
+            return "\n\n".join(output_parts)
+
+        else:
+            # No tool calls, just return response
+            return assistant_message.content or "I'm not sure how to help with that."
+
+    except TurnCancelledError:
+        return "⏹️ Request cancelled."
+    except TurnTimeoutError:
+        metrics.inc("turns_timed_out_total")
+        return (
+            f"⏱️ This request exceeded the {config.turn_timeout:.0f}s time limit. "
+            "Try a narrower request (fewer bars or indicators)."
+        )
+    except TimeoutError as e:
+        return f"⏱️ {e}. Please try again."
+    except RateLimitedError as e:
+        return f"⏳ {e}"
+    except Exception as e:
+        import traceback
+
+        return f"❌ Error: {str(e)}\n\n```\n{traceback.format_exc()}\n```"
+
+
+# ============================================================================
+# Live Quote Ticker
+# ============================================================================
+
+
+class QuoteTicker:
+    """
+    Live quotes for a fixed symbol set, fetched by one shared poller.
+
+    A single daemon thread requests ``symbol_info_tick`` for every symbol
+    once per ``interval`` and keeps the latest tick; each browser session
+    only renders that snapshot. The MT5 load is therefore the same for one
+    viewer or a hundred, and polling pauses while nobody is watching. Ticks
+    also go into the tool-result cache, so quote requests in the chat reuse
+    them.
+    """
+
+    def __init__(self, symbols: list[str], interval: float = 2.0):
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.idle_after = max(30.0, 5 * interval)  # seconds without a viewer
+        self._quotes: dict[str, dict] = {}
+        self._last_viewed = 0.0
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _watched(self) -> bool:
+        return time.monotonic() - self._last_viewed < self.idle_after
+
+    def poll_once(self):
+        """Fetch one tick per symbol (in parallel) and update the snapshot."""
+        config = get_config()
+        mcp = get_mcp_client()
+        if not mcp.has_tools():
+            mcp.submit(mcp.list_tools()).result(timeout=config.mcp_tool_timeout or None)
+        tool_name = find_tool_name(mcp, "mt5_query_tool")
+        if tool_name is None:
+            return
+        calls = {
+            symbol: {"operation": "symbol_info_tick", "symbol": symbol, "parameters": "{}"}
+            for symbol in self.symbols
+        }
+        futures = {
+            symbol: mcp.submit(mcp.call_tool(tool_name, arguments))
+            for symbol, arguments in calls.items()
+        }
+        timeout = config.tool_timeout(tool_name) or 5 * self.interval
+        until = time.monotonic() + timeout
+        for symbol, future in futures.items():
+            try:
+                result = future.result(timeout=max(0.0, until - time.monotonic()))
+                payload = json.loads(result["result"])
+                data = payload.get("data")
+                if payload.get("success") is False or not isinstance(data, dict) or not data:
+                    raise ValueError(payload.get("error") or "no data")
+            except Exception as e:
+                future.cancel()
+                with self._lock:
+                    self._quotes.setdefault(symbol, {})["error"] = _describe_error(e)
+                metrics.inc("ticker_ticks_total", result="error")
+                continue
+            get_tool_cache().put(tool_name, calls[symbol], result)
+            with self._lock:
+                previous = self._quotes.get(symbol, {})
+                direction = previous.get("direction", "")
+                if isinstance(data.get("bid"), (int, float)) and previous.get("bid") is not None:
+                    if data["bid"] > previous["bid"]:
+                        direction = "▲"
+                    elif data["bid"] < previous["bid"]:
+                        direction = "▼"
+                self._quotes[symbol] = {
+                    "bid": data.get("bid"),
+                    "ask": data.get("ask"),
+                    "direction": direction,
+                    "fetched_at": time.time(),
+                }
+            metrics.inc("ticker_ticks_total", result="ok")
+
+    def _run(self):
+        while True:
+            if not self._watched():
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            start = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"[Ticker] Poll failed: {_describe_error(e)}")
+            elapsed = time.monotonic() - start
+            metrics.observe("ticker_poll_seconds", elapsed)
+            time.sleep(max(0.0, self.interval - elapsed))
+
+    def start(self):
+        """Start the shared poller (once per process)."""
+        with self._lock:
+            if self._thread is not None or not self.symbols:
+                return
+            self._thread = threading.Thread(target=self._run, name="quote-ticker", daemon=True)
+        self._thread.start()
+
+    def render(self) -> str:
+        """Markdown quote strip for one session; also marks the ticker as watched."""
+        self._last_viewed = time.monotonic()
+        self._wake.set()
+        with self._lock:
+            quotes = {symbol: dict(self._quotes.get(symbol, {})) for symbol in self.symbols}
+
+        cells = []
+        for symbol in self.symbols:
+            quote = quotes[symbol]
+            if quote.get("bid") is None:
+                cells.append("⚠️" if quote.get("error") else "…")
+                continue
+            age = time.time() - quote["fetched_at"]
+            stale = " ⏸️" if age > max(10.0, 3 * self.interval) else ""
+            cells.append(f"{quote['direction']} {quote['bid']} / {quote['ask']}{stale}")
+        return "\n".join(
+            [
+                "| " + " | ".join(f"**{symbol}**" for symbol in self.symbols) + " |",
+                "|" + "---|" * len(self.symbols),
+                "| " + " | ".join(cells) + " |",
+            ]
+        )
+
+
+_quote_ticker: Optional[QuoteTicker] = None
+
+
+def get_quote_ticker() -> QuoteTicker:
+    """Get or create the shared ticker for ``TICKER_SYMBOLS``."""
+    global _quote_ticker
+    if _quote_ticker is None:
+        config = get_config()
+        _quote_ticker = QuoteTicker(config.ticker_symbols, config.ticker_interval)
+    return _quote_ticker
+
+
+# ============================================================================
+# Watchlist Scanner
+# ============================================================================
+
+DEFAULT_SCANNER_WATCHLIST = "EURUSD,GBPUSD,USDJPY,AUDUSD,USDCAD,XAUUSD,BTCUSD"
+SCANNER_TIMEFRAMES = ["M15", "M30", "H1", "H4", "D1", "W1"]
+
+# label -> (mt5_analyze_tool indicator spec, result column it produces)
+SCANNER_INDICATORS = {
+    "RSI 14": ({"function": "ta.momentum.rsi", "params": {"window": 14}}, "rsi_14"),
+    "SMA 50": ({"function": "ta.trend.sma_indicator", "params": {"window": 50}}, "sma_indicator_50"),
+    "SMA 200": (
+        {"function": "ta.trend.sma_indicator", "params": {"window": 200}},
+        "sma_indicator_200",
+    ),
+    "EMA 20": ({"function": "ta.trend.ema_indicator", "params": {"window": 20}}, "ema_indicator_20"),
+    "MACD hist": ({"function": "ta.trend.macd_diff", "params": {}}, "macd_diff"),
+    "ATR 14": (
+        {"function": "ta.volatility.average_true_range", "params": {"window": 14}},
+        "average_true_range_14",
+    ),
+    "Bollinger %B": (
+        {"function": "ta.volatility.bollinger_pband", "params": {"window": 20}},
+        "bollinger_pband_20",
+    ),
+}
+DEFAULT_SCANNER_INDICATORS = ["RSI 14", "SMA 50", "ATR 14"]
+
+_SCANNER_SUMMARY_PROMPT = """You are a financial analyst reviewing a watchlist scan.
+Summarize the table below in a few short bullet points: the strongest and weakest
+symbols, overbought/oversold or trend signals worth attention, and any symbols that
+failed. Use only the numbers in the table; do not invent data."""
+
+
+def parse_watchlist(text: str) -> list[str]:
+    """Symbols from comma/space separated text, uppercased, without duplicates."""
+    symbols = []
+    for token in re.split(r"[\s,;]+", text or ""):
+        symbol = token.replace("/", "").strip().upper()
+        if symbol and symbol not in symbols:
+            symbols.append(symbol)
+    return symbols
+
+
+def scanner_headers(indicators: list[str]) -> list[str]:
+    """Table columns for a scan with these indicators."""
+    return ["Symbol", "Close", "Change %", *indicators, "Status"]
+
+
+def _scan_request(tool_names: dict, symbol: str, timeframe: str, indicators: list[str]):
+    """``(tool, arguments)`` for one symbol: analysis with indicators, else plain bars."""
+    bars = get_config().scanner_bars
+    analyze = tool_names.get("mt5_analyze_tool")
+    if analyze and (indicators or not tool_names.get("mt5_query_tool")):
+        return analyze, {
+            "query_symbol": symbol,
+            "query_parameters": json.dumps({"timeframe": timeframe, "count": bars}),
+            "indicators": json.dumps([SCANNER_INDICATORS[name][0] for name in indicators]),
+            "enable_chart": False,
+        }
+    return tool_names["mt5_query_tool"], {
+        "operation": "copy_rates_from_pos",
+        "symbol": symbol,
+        "parameters": json.dumps({"timeframe": timeframe, "start_pos": 0, "count": bars}),
+    }
+
+
+def _column_value(row: dict, column: str):
+    """Indicator value from a result row; tolerates suffixed column names."""
+    value = row.get(column)
+    if value is None:
+        value = next((v for k, v in row.items() if k.startswith(column)), None)
+    if isinstance(value, (int, float)):
+        return round(value, 5)
+    return None
+
+
+def _scan_row(symbol: str, result: dict, indicators: list[str]) -> list:
+    """One table row from a tool result (errors become a status message)."""
+    empty = [symbol, None, None, *[None] * len(indicators)]
+    if "error" in result:
+        return [*empty, f"❌ {str(result['error'])[:120]}"]
+    try:
+        payload = json.loads(result["result"])
+        rows = payload.get("data")
+        if payload.get("success") is False or not isinstance(rows, list) or not rows:
+            raise ValueError(payload.get("error") or "no data")
+    except (KeyError, TypeError, ValueError) as e:
+        return [*empty, f"❌ {str(e)[:120]}"]
+    first, last = rows[0], rows[-1]
+    close = _column_value(last, "close")
+    change = None
+    if close is not None and first.get("close"):
+        change = round((last["close"] / first["close"] - 1) * 100, 2)
+    values = [_column_value(last, SCANNER_INDICATORS[name][1]) for name in indicators]
+    return [symbol, close, change, *values, "✅"]
+
+
+def scan_watchlist(mcp, symbols: list[str], timeframe: str, indicators: list[str], turn):
+    """
+    Analyze every symbol with at most ``SCANNER_CONCURRENCY`` calls in flight.
+
+    Yields one table row per symbol as soon as its call completes (completion
+    order, not watchlist order). Calls over their tool timeout are cancelled
+    and reported in the row's status; cancelling ``turn`` stops the scan.
+    """
+    config = get_config()
+    if not mcp.has_tools():
+        turn.wait(mcp.submit(mcp.list_tools()), config.mcp_tool_timeout or None)
+    tool_names = {
+        base: find_tool_name(mcp, base) for base in ("mt5_query_tool", "mt5_analyze_tool")
+    }
+    if not tool_names["mt5_query_tool"] and not tool_names["mt5_analyze_tool"]:
+        raise MCPUnavailableError("the MCP server exposes no MetaTrader 5 tools")
+
+    queue = list(symbols)
+    in_flight: dict[concurrent.futures.Future, tuple[str, float, Optional[float]]] = {}
+    while queue or in_flight:
+        while queue and len(in_flight) < config.scanner_concurrency:
+            symbol = queue.pop(0)
+            name, arguments = _scan_request(tool_names, symbol, timeframe, indicators)
+            future = get_tool_cache().call(mcp, name, arguments)
+            turn.on_cancel(future.cancel)
+            in_flight[future] = (symbol, time.monotonic(), config.tool_timeout(name))
+
+        done, _ = concurrent.futures.wait(
+            in_flight, timeout=TurnContext._POLL_INTERVAL, return_when="FIRST_COMPLETED"
+        )
+        turn.check()
+        for future in done:
+            symbol, started, _timeout = in_flight.pop(future)
+            metrics.observe("scanner_symbol_seconds", time.monotonic() - started)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": _describe_error(e)}
+            row = _scan_row(symbol, result, indicators)
+            metrics.inc("scanner_symbols_total", result="ok" if row[-1] == "✅" else "error")
+            yield row
+
+        now = time.monotonic()
+        for future, (symbol, started, timeout) in list(in_flight.items()):
+            if timeout and now - started > timeout:
+                future.cancel()
+                del in_flight[future]
+                metrics.inc("scanner_symbols_total", result="timeout")
+                yield _scan_row(symbol, {"error": f"timed out after {timeout:.0f}s"}, indicators)
+
+
+def summarize_scan(rows: list[list], headers: list[str], timeframe: str, turn) -> str:
+    """One LLM call that summarizes the finished scan table."""
+    config = get_config()
+    llm = get_llm_client()
+    if not llm:
+        return "⚠️ LLM not configured; the table above is the full result."
+
+    def _cell(value):
+        return "—" if value is None else str(value)
+
+    table = "\n".join(
+        [
+            "| " + " | ".join(headers) + " |",
+            "|" + "---|" * len(headers),
+            *("| " + " | ".join(_cell(v) for v in row) + " |" for row in rows),
+        ]
+    )
+    messages = [
+        {"role": "system", "content": _SCANNER_SUMMARY_PROMPT},
+        {"role": "user", "content": f"Timeframe: {timeframe}\n\n{table}"},
+    ]
+    message = _create_completion(llm, turn, model=config.llm_model, messages=messages)
+    return message.content or "No summary from model."
+
+
+# ============================================================================
+# Precomputed Example Answers
+# ============================================================================
+
+DEFAULT_EXAMPLE_PROMPTS = [
+    "What analysis capabilities do you offer?",
+    "Retrieve current market quote for BTC/USD",
+    "Perform technical analysis on EUR/USD with RSI and MACD",
+    "Generate price forecast for gold (XAU/USD) with confidence intervals",
+]
+
+
+class ExampleStore:
+    """
+    Answers to the example prompts, computed ahead of time.
+
+    A daemon thread runs every example through ``chat_with_tools`` at
+    startup and again every ``interval`` seconds, so clicking an example is
+    answered instantly. Each stored answer notes its age; retrying it (or
+    typing the prompt) takes the live path.
+    """
+
+    def __init__(self, prompts: list[str], interval: float = 900.0):
+        self.prompts = list(prompts)
+        self.interval = interval
+        self._answers: dict[str, tuple[float, str]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, prompt: str) -> Optional[str]:
+        """The stored answer for an example prompt, with an age note."""
+        with self._lock:
+            entry = self._answers.get(prompt.strip())
+        if entry is None or not _is_cacheable_answer(entry[1]):
+            return None
+        minutes = (time.time() - entry[0]) / 60
+        age = "just now" if minutes < 1 else f"{minutes:.0f} min ago"
+        return f"{entry[1]}\n\n_⚡ Prepared {age}. Press retry for a live answer._"
+
+    def refresh(self) -> dict[str, str]:
+        """Recompute every example; returns a status per prompt."""
+        config = get_config()
+        status = {}
+        for prompt in self.prompts:
+            start = time.perf_counter()
+            answer = chat_with_tools(prompt, [], TurnContext(config.turn_timeout))
+            if _is_cacheable_answer(answer):
+                with self._lock:
+                    self._answers[prompt] = (time.time(), answer)
+                status[prompt] = f"ready in {time.perf_counter() - start:.1f}s"
+                metrics.inc("example_refresh_total", result="ok")
+            else:
+                status[prompt] = f"failed: {answer[:120]}"
+                metrics.inc("example_refresh_total", result="failed")
+        return status
+
+    def _run(self):
+        while True:
+            for prompt, result in self.refresh().items():
+                print(f"[Examples] {prompt[:48]!r}: {result}")
+            if self.interval <= 0:
+                return
+            time.sleep(self.interval)
+
+    def start(self):
+        """Start the background refresher (once per process)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="example-refresh", daemon=True
+            )
+        self._thread.start()
+
+
+_example_store: Optional[ExampleStore] = None
+
+
+def get_example_store() -> ExampleStore:
+    """Get or create the store for the configured example prompts."""
+    global _example_store
+    if _example_store is None:
+        config = get_config()
+        _example_store = ExampleStore(config.example_prompts, config.example_refresh_interval)
+    return _example_store
+
+
+# ============================================================================
+# Scheduled Analyses
+# ============================================================================
+
+_TIMEFRAME_SECONDS = {
+    "M1": 60,
+    "M5": 300,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H4": 14400,
+    "D1": 86400,
+    "W1": 7 * 86400,
+}
+# The Unix epoch was a Thursday; weekly bars open on Monday
+_WEEK_ORIGIN = 4 * 86400
+# Specific studies a request can ask for; a stored analysis only answers a
+# request whose studies it covers
+_STUDY_WORDS = re.compile(
+    r"\b(rsi|macd|sma|ema|bollinger|atr|stochastic|adx|ichimoku|fibonacci|vwap|"
+    r"forecast|predict|chart|volume)",
+    re.IGNORECASE,
+)
+# Only an explicit request for live numbers skips the stored analysis
+# ("today" and "latest" are exactly what the last bar close provides)
+_FORCE_LIVE_WORDS = re.compile(
+    r"\b(live|real[- ]?time|right now|fresh|refresh)\b", re.IGNORECASE
+)
+DEFAULT_SCHEDULED_PROMPT = (
+    "Perform technical analysis on {symbol} on the {timeframe} timeframe with RSI, "
+    "MACD and a 50-period SMA, and include a chart"
+)
+
+
+def next_bar_close(timeframe: str, now: Optional[float] = None, utc_offset: float = 0.0) -> float:
+    """
+    Unix time at which the bar open at ``now`` closes.
+
+    Boundaries are aligned to broker server time, ``utc_offset`` hours ahead
+    of UTC (this only matters for D1 and longer).
+    """
+    now = time.time() if now is None else now
+    shift = utc_offset * 3600
+    server_now = now + shift
+    if timeframe == "MN1":
+        from datetime import datetime, timezone
+
+        current = datetime.fromtimestamp(server_now, timezone.utc)
+        year, month = divmod(current.year * 12 + current.month, 12)  # next month
+        return datetime(year, month + 1, 1, tzinfo=timezone.utc).timestamp() - shift
+    period = _TIMEFRAME_SECONDS.get(timeframe, 3600)
+    origin = _WEEK_ORIGIN if timeframe == "W1" else 0
+    return ((server_now - origin) // period + 1) * period + origin - shift
+
+
+def _canonical_arguments(name: str, arguments: dict) -> str:
+    """Tool call identity that ignores argument order and JSON formatting."""
+    canonical = {}
+    for key, value in arguments.items():
+        if isinstance(value, str) and value[:1] in ("{", "["):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        if key in ("symbol", "query_symbol") and isinstance(value, str):
+            value = value.replace("/", "").upper()
+        canonical[key] = value
+    return json.dumps([name.rsplit("__", 1)[-1], canonical], sort_keys=True, default=str)
+
+
+def _is_bar_data_call(name: str, arguments: dict) -> bool:
+    """Calls whose result only changes when a bar closes (not ticks or account data)."""
+    base = name.rsplit("__", 1)[-1]
+    if base == "mt5_analyze_tool":
+        return True
+    return base == "mt5_query_tool" and str(arguments.get("operation", "")).startswith(
+        "copy_rates"
+    )
+
+
+def _studies(text: str) -> set[str]:
+    return {match.lower() for match in _STUDY_WORDS.findall(text)}
+
+
+class AnalysisScheduler:
+    """
+    Analyses recomputed at every bar close of their timeframe.
+
+    A daemon thread runs each configured job through the chat pipeline right
+    after its bar closes (plus ``SCHEDULE_DELAY``), keeping the answer, its
+    charts and every tool result it fetched until the next close. Chat
+    requests for the same symbol and timeframe, and identical tool calls made
+    by other turns, are then served from the store immediately.
+    """
+
+    _RETRY_DELAY = 60.0  # seconds before a failed job runs again
+
+    def __init__(self, jobs: list[dict], delay: float = 10.0, utc_offset: float = 0.0):
+        self.jobs = [
+            {
+                **job,
+                "prompt": job.get("prompt") or DEFAULT_SCHEDULED_PROMPT.format(**job),
+            }
+            for job in jobs
+        ]
+        self.delay = delay
+        self.utc_offset = utc_offset
+        # (symbol, timeframe) -> (computed at, valid until, answer)
+        self._answers: dict[tuple, tuple[float, float, str]] = {}
+        # canonical tool call -> (valid until, result)
+        self._tool_results: dict[str, tuple[float, dict]] = {}
+        self._next_run: dict[tuple, float] = {}  # (symbol, timeframe) -> unix time
+        self._lock = threading.Lock()
+        self._local = threading.local()  # .valid_until while a job is recording
+        self._thread: Optional[threading.Thread] = None
+
+    # -- serving ---------------------------------------------------------
+
+    def _match(self, message: str) -> Optional[dict]:
+        """The job whose stored analysis answers ``message``, if any."""
+        if _FORCE_LIVE_WORDS.search(message) or not _ANALYSIS_WORDS.search(message):
+            return None
+        symbols = extract_symbols(message)
+        if len(symbols) != 1:
+            return None
+        timeframe = extract_timeframe(message)
+        candidates = [
+            job
+            for job in self.jobs
+            if job["symbol"] == symbols[0] and timeframe in (None, job["timeframe"])
+        ]
+        if len(candidates) != 1:
+            return None
+        job = candidates[0]
+        if not _studies(message) <= _studies(job["prompt"]):
+            return None
+        return job
+
+    def answer(self, message: str) -> Optional[str]:
+        """The stored answer for a matching chat request, with a timestamp note."""
+        job = self._match(message)
+        if job is None:
+            return None
+        with self._lock:
+            entry = self._answers.get((job["symbol"], job["timeframe"]))
+        if entry is None or entry[1] <= time.time():
+            metrics.inc("scheduled_answers_total", result="stale")
+            return None
+        metrics.inc("scheduled_answers_total", result="served")
+        computed = time.strftime("%H:%M UTC", time.gmtime(entry[0]))
+        return (
+            f"{entry[2]}\n\n_🕒 Computed at {computed}; refreshed at every "
+            f"{job['timeframe']} bar close. Ask for a live analysis to recompute._"
+        )
+
+    def lookup_tool(self, name: str, arguments: dict) -> Optional[dict]:
+        """A stored result for an identical tool call, until the next bar close."""
+        if self.recording() or not _is_bar_data_call(name, arguments):
+            return None  # jobs always fetch fresh data
+        key = _canonical_arguments(name, arguments)
+        with self._lock:
+            entry = self._tool_results.get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    # -- computing -------------------------------------------------------
+
+    def recording(self) -> bool:
+        """Whether the calling thread is running a scheduled job."""
+        return getattr(self._local, "valid_until", None) is not None
+
+    def record_tool(self, name: str, arguments: dict, future: concurrent.futures.Future):
+        """Keep the result of a job's bar-data tool call for other turns."""
+        if not _is_bar_data_call(name, arguments):
+            return
+        key = _canonical_arguments(name, arguments)
+        valid_until = self._local.valid_until
+
+        def _store(f):
+            if f.cancelled() or f.exception() is not None or "error" in f.result():
+                return
+            with self._lock:
+                self._tool_results[key] = (valid_until, f.result())
+
+        future.add_done_callback(_store)
+
+    def run_job(self, job: dict) -> str:
+        """Recompute one job now; returns a status line."""
+        config = get_config()
+        start = time.perf_counter()
+        valid_until = next_bar_close(job["timeframe"], utc_offset=self.utc_offset) + self.delay
+        self._local.valid_until = valid_until
+        try:
+            answer = _answer_with_llm(
+                job["prompt"], [], TurnContext(config.turn_timeout), get_mcp_client()
+            )
+        except Exception as e:
+            answer = f"❌ {_describe_error(e)}"
+        finally:
+            self._local.valid_until = None
+        key = (job["symbol"], job["timeframe"])
+        if not _is_cacheable_answer(answer):
+            with self._lock:
+                self._next_run[key] = time.time() + self._RETRY_DELAY
+            metrics.inc("scheduled_runs_total", result="failed")
+            return f"failed: {answer[:120]}"
+        with self._lock:
+            self._answers[key] = (time.time(), valid_until, answer)
+            self._next_run[key] = valid_until
+            now = time.time()
+            self._tool_results = {k: v for k, v in self._tool_results.items() if v[0] > now}
+        metrics.inc("scheduled_runs_total", result="ok")
+        return f"ready in {time.perf_counter() - start:.1f}s"
+
+    def _due(self, job: dict) -> float:
+        """When ``job`` next needs recomputing (0 = never computed)."""
+        with self._lock:
+            return self._next_run.get((job["symbol"], job["timeframe"]), 0.0)
+
+    def _run_due(self) -> float:
+        """Run every due job; returns when the next one is due."""
+        now = time.time()
+        due = [job for job in self.jobs if self._due(job) <= now]
+        # Jobs that close together (e.g. every H1 at the top of the hour)
+        # run in parallel on the turn pool and are logged as each finishes
+        futures = {run_turn(self.run_job, job): job for job in due}
+        for future in concurrent.futures.as_completed(futures):
+            job = futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                with self._lock:
+                    self._next_run[(job["symbol"], job["timeframe"])] = (
+                        time.time() + self._RETRY_DELAY
                     )
-                except Exception as e:
-                    result = {"error": str(e)}
+                status = f"failed: {_describe_error(e)}"
+            print(f"[Scheduler] {job['symbol']} {job['timeframe']}: {status}")
+        return min(self._due(job) for job in self.jobs)
 
-                all_tool_results.append(
+    def _run(self):
+        while True:
+            try:
+                next_due = self._run_due()
+            except Exception as e:
+                print(f"[Scheduler] Error: {_describe_error(e)}")
+                next_due = time.time() + self._RETRY_DELAY
+            time.sleep(max(1.0, next_due - time.time()))
+
+    def start(self):
+        """Start the background scheduler (once per process)."""
+        with self._lock:
+            if self._thread is not None or not self.jobs:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="analysis-scheduler", daemon=True
+            )
+        self._thread.start()
+
+    def status(self) -> list[dict]:
+        """Per-job state for the connection status panel."""
+        rows = []
+        with self._lock:
+            for job in self.jobs:
+                entry = self._answers.get((job["symbol"], job["timeframe"]))
+                rows.append(
                     {
-                        "tool_call_id": tool_call.id,
-                        "name": tool_name,
-                        "result": result,
+                        "symbol": job["symbol"],
+                        "timeframe": job["timeframe"],
+                        "computed_at": entry[0] if entry else None,
+                        "valid_until": entry[1] if entry else None,
                     }
                 )
+        return rows
 
-                # Extract images from full result BEFORE truncating
-                full_result_str = json.dumps(result, indent=2)
-                _, tool_images = extract_images_from_response(full_result_str)
 
-                # Show result preview (truncated for display)
-                result_str = full_result_str
-                if len(result_str) > 1000:
-                    result_str = result_str[:1000] + "\n... (truncated)"
+_analysis_scheduler: Optional[AnalysisScheduler] = None
 
-                status = "❌" if "error" in result else "✅"
-                output_parts.append(
-                    f"{status} **Result:**\n```json\n{result_str}\n```\n"
-                )
 
-                # Add extracted images to output
-                for img_path in tool_images:
-                    if Path(img_path).exists():
-                        copied_path = copy_image_to_output(img_path)
-                        output_parts.append(f"__IMAGE_PATH__:{copied_path}")
+def start_analysis_scheduler() -> Optional[AnalysisScheduler]:
+    """Create and start the scheduler when ``SCHEDULED_ANALYSES`` is set."""
+    global _analysis_scheduler
+    config = get_config()
+    if _analysis_scheduler is None and config.scheduled_analyses:
+        _analysis_scheduler = AnalysisScheduler(
+            config.scheduled_analyses, config.schedule_delay, config.schedule_utc_offset
+        )
+    if _analysis_scheduler is not None:
+        _analysis_scheduler.start()
+    return _analysis_scheduler
 
-            # Add tool calls to messages
-            messages.append(
-                {
-                    "role": "assistant",
-                    "content": None,
-                    "tool_calls": [
-                        {
-                            "id": tc.id,
-                            "type": "function",
-                            "function": {
-                                "name": tc.function.name,
-                                "arguments": tc.function.arguments,
-                            },
-                        }
-                        for tc in assistant_message.tool_calls
-                    ],
-                }
-            )
 
-            # Add tool results to messages
-            for tr in all_tool_results:
-                messages.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tr["tool_call_id"],
-                        "content": json.dumps(tr["result"]),
-                    }
-                )
+# ============================================================================
+# Startup Warm-up
+# ============================================================================
 
-            # Second LLM call - analyze results
-            final_response = llm.chat.completions.create(
-                model=config.llm_model,
-                messages=messages,
-            )
 
-            final_content = final_response.choices[0].message.content or ""
+def warm_up(timeout: Optional[float] = None) -> dict:
+    """
+    Pre-connect to the MCP server, prefetch tools and open the LLM connection pool.
 
-            # Combine tool execution details with final analysis
-            output_parts.append("---")
-            output_parts.append(f"📊 **Analysis:**\n\n{final_content}")
+    Both legs run concurrently in daemon threads. Whatever has not finished
+    within ``timeout`` seconds keeps running in the background while the UI
+    starts; until discovery completes, turns are served from the on-disk tool
+    snapshot when one exists.
 
-            return "\n\n".join(output_parts)
+    Returns:
+        Mapping of step name ("mcp", "llm") to a short status string.
+    """
+    config = get_config()
+    timeout = config.warmup_timeout if timeout is None else timeout
+    status = {"mcp": "still running", "llm": "still running"}
 
+    def _warm_mcp():
+        start = time.perf_counter()
+        try:
+            mcp = get_mcp_client()
+            sessions = mcp.run_sync(mcp.connect())
+            tools = mcp.run_sync(mcp.list_tools())
+            status["mcp"] = (
+                f"{sessions} session(s), {len(tools)} tools "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+        except Exception as e:
+            status["mcp"] = f"failed: {e}"
+
+    def _warm_llm():
+        start = time.perf_counter()
+        llm = get_llm_client()
+        if llm is None:
+            status["llm"] = "not configured"
+            return
+        if isinstance(llm, LLMRouter):
+            clients = [d.client() for d in llm.deployments]
+            clients = [client for client in clients if client is not None]
         else:
-            # No tool calls, just return response
-            return assistant_message.content or "I'm not sure how to help with that."
-
-    except Exception as e:
-        import traceback
-
-        return f"❌ Error: {str(e)}\n\n```\n{traceback.format_exc()}\n```"
-    finally:
-        loop.close()
+            clients = [llm]
+        probe_errors = []
+        for client in clients:
+            try:
+                # Any authenticated request opens the pooled connection (DNS, TCP, TLS)
+                client.with_options(timeout=timeout, max_retries=0).models.list()
+            except Exception as e:
+                # Some endpoints do not serve /models; the connection is open regardless
+                probe_errors.append(type(e).__name__)
+        status["llm"] = f"connected in {time.perf_counter() - start:.2f}s"
+        if len(clients) > 1:
+            status["llm"] = f"{len(clients)} deployments " + status["llm"]
+        if probe_errors:
+            status["llm"] += f" (probe: {', '.join(sorted(set(probe_errors)))})"
+
+    threads = [
+        threading.Thread(target=_warm_mcp, name="warmup-mcp", daemon=True),
+        threading.Thread(target=_warm_llm, name="warmup-llm", daemon=True),
+    ]
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+    return dict(status)
 
 
 # ============================================================================
@@ -852,14 +5843,7 @@ def test_mcp_connection(url: str, transport: str) -> str:
         from mcp import ClientSession
 
         async def _test():
-            if transport == "streamable_http":
-                from mcp.client.streamable_http import streamablehttp_client
-
-                ctx = streamablehttp_client(url)
-            else:
-                from mcp.client.sse import sse_client
-
-                ctx = sse_client(url)
+            ctx = mcp_transport(url, transport)
 
             async with ctx as session_data:
                 # Handle both SSE (2 values) and Streamable HTTP (3 values)
@@ -1084,14 +6068,7 @@ def list_available_tools(url: str, transport: str) -> str:
         from mcp import ClientSession
 
         async def _list():
-            if transport == "streamable_http":
-                from mcp.client.streamable_http import streamablehttp_client
-
-                ctx = streamablehttp_client(url)
-            else:
-                from mcp.client.sse import sse_client
-
-                ctx = sse_client(url)
+            ctx = mcp_transport(url, transport)
 
             async with ctx as session_data:
                 # Handle both SSE (2 values) and Streamable HTTP (3 values)
@@ -1140,6 +6117,715 @@ def list_available_tools(url: str, transport: str) -> str:
         return f"❌ Error: {str(e)}"
 
 
+def render_connection_status() -> str:
+    """Markdown summary of MCP connection health and runtime metrics."""
+    icons = {
+        CircuitBreaker.CLOSED: "🟢 closed",
+        CircuitBreaker.HALF_OPEN: "🟡 half-open",
+        CircuitBreaker.OPEN: "🔴 open",
+    }
+
+    lines = [
+        "| Server | Circuit | Sessions | In flight | Latency | Last ping |",
+        "|--------|---------|----------|-----------|---------|-----------|",
+    ]
+    errors = []
+    for status in get_mcp_client().endpoint_statuses():
+        circuit = icons.get(status["circuit"], status["circuit"])
+        if status["circuit"] == CircuitBreaker.OPEN and status["retry_in"]:
+            circuit += f" (retry in {status['retry_in']:.0f}s)"
+        last_ping = (
+            f"{time.time() - status['last_ping_ok']:.0f}s ago"
+            if status["last_ping_ok"]
+            else "—"
+        )
+        latency = f"{status['latency'] * 1000:.0f} ms" if status.get("latency") else "—"
+        server = f"`{status['server']}`"
+        if status.get("alias"):
+            server = f"**{status['alias']}** {server}"
+        lines.append(
+            f"| {server} | {circuit} | {status['sessions']}/{status['pool_size']} "
+            f"| {status['in_flight']} | {latency} | {last_ping} |"
+        )
+        if status["last_error"]:
+            errors.append(f"`{status['server']}`: `{status['last_error'][:300]}`")
+    if errors:
+        lines.append("\n**Last error:** " + "<br>".join(errors))
+
+    if get_config().llm_deployments:
+        lines += [
+            "",
+            "| LLM deployment | Model | Latency | Error rate | Cooldown | Concurrency |",
+            "|----------------|-------|---------|------------|----------|-------------|",
+        ]
+        for row in get_llm_router().status():
+            latency = f"{row['latency'] * 1000:.0f} ms" if row["latency"] else "—"
+            cooldown = f"{row['cooldown']:.0f}s" if row["cooldown"] else "—"
+            concurrency = row["concurrency"] or "—"
+            lines.append(
+                f"| **{row['name']}** ({row['provider']}) | `{row['model']}` | {latency} "
+                f"| {row['error_rate']:.0%} | {cooldown} | {concurrency} |"
+            )
+
+    if _analysis_scheduler is not None:
+        lines += [
+            "",
+            "| Scheduled analysis | Computed | Next run |",
+            "|--------------------|----------|----------|",
+        ]
+        for row in _analysis_scheduler.status():
+            computed = (
+                time.strftime("%H:%M:%S UTC", time.gmtime(row["computed_at"]))
+                if row["computed_at"]
+                else "—"
+            )
+            next_run = (
+                time.strftime("%H:%M:%S UTC", time.gmtime(row["valid_until"]))
+                if row["valid_until"]
+                else "pending"
+            )
+            lines.append(f"| `{row['symbol']}` {row['timeframe']} | {computed} | {next_run} |")
+
+    if _ollama_timings:
+        lines += [
+            "",
+            "| Ollama model | Last response | Age |",
+            "|--------------|---------------|-----|",
+        ]
+        for model, timings in sorted(_ollama_timings.items()):
+            lines.append(
+                f"| `{model}` | {format_ollama_timings(timings)} "
+                f"| {time.time() - timings['at']:.0f}s |"
+            )
+
+    exposition = metrics.render_text().strip()
+    if exposition:
+        lines += [
+            "",
+            "<details><summary>📈 Metrics</summary>",
+            "",
+            f"```\n{exposition}\n```",
+            "</details>",
+        ]
+    return "\n".join(lines)
+
+
+# ============================================================================
+# Attachment Ingestion
+# ============================================================================
+
+INGEST_EXTENSIONS = (".csv", ".tsv", ".txt", ".json", ".jsonl", ".ndjson", ".parquet")
+_INGEST_CHUNK_ROWS = 50_000
+_TIME_COLUMNS = ("time", "datetime", "timestamp", "date")
+_attachments: "dict[str, AttachmentData]" = {}  # insertion-ordered, newest last
+_ATTACHMENT_CACHE_SIZE = 8
+_attachments_lock = threading.Lock()
+
+
+def _column_name(name) -> str:
+    """Normalized header: MT5 exports use ``<OPEN>``, ``<TICKVOL>`` etc."""
+    return str(name).strip().strip("<>").strip().lower() or "column"
+
+
+def _to_float_array(values):
+    """Strings/numbers -> float64 array (unparseable values become NaN)."""
+    import numpy as np
+
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                out[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+def _to_epoch_array(values):
+    """Timestamps (epoch numbers, ISO or MT5 ``2024.01.31 13:00``) -> epoch seconds."""
+    import numpy as np
+
+    numeric = _to_float_array(values)
+    if len(values) and not np.isnan(numeric).all():
+        # Epoch milliseconds/microseconds from JSON exports
+        scale = np.nanmax(np.abs(numeric))
+        return numeric / (1e6 if scale > 1e14 else 1e3 if scale > 1e11 else 1)
+    text = [str(v).strip().replace(".", "-", 2).rstrip("Z") for v in values]
+    try:
+        return np.array(text, dtype="datetime64[s]").astype(np.int64).astype(np.float64)
+    except ValueError:
+        out = np.full(len(text), np.nan)
+        for i, value in enumerate(text):
+            try:
+                out[i] = float(np.datetime64(value, "s").astype(np.int64))
+            except ValueError:
+                pass
+        return out
+
+
+def _csv_chunks(path: Path):
+    """Yield column dicts of at most ``_INGEST_CHUNK_ROWS`` rows from a delimited file."""
+    import csv
+
+    import pandas as pd  # Gradio dependency; its C parser keeps large files fast
+
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        sample = f.read(64 * 1024)
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+    reader = pd.read_csv(
+        path,
+        sep=delimiter,
+        chunksize=_INGEST_CHUNK_ROWS,
+        encoding="utf-8-sig",
+        encoding_errors="replace",
+        on_bad_lines="skip",
+        low_memory=True,
+    )
+    with reader:
+        for frame in reader:
+            yield {_column_name(name): frame[name].to_numpy() for name in frame.columns}
+
+
+_JSON_ITEM_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def _json_records(path: Path):
+    """
+    Yield record dicts from JSON Lines, a top-level JSON array (decoded item
+    by item) or an object holding records / parallel column lists.
+    """
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        if head == "[":
+            # Decode in place by index; the buffer is only compacted (and
+            # copied) when the next block is read
+            decoder = json.JSONDecoder()
+            buffer, index = "", 0
+            while True:
+                index = _JSON_ITEM_SEPARATOR.match(buffer, index).end()
+                if buffer.startswith("]", index):
+                    return
+                try:
+                    record, index = decoder.raw_decode(buffer, index)
+                except json.JSONDecodeError:
+                    block = f.read(1 << 20)
+                    if not block:
+                        if buffer[index:].strip():
+                            raise
+                        return
+                    buffer, index = buffer[index:] + block, 0
+                    continue
+                yield record
+        data = json.loads(head + f.read())
+    # {"rates": [...]} / {"data": [...]} or {"time": [...], "close": [...]}
+    for value in data.values():
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            yield from value
+            return
+    columns = {k: v for k, v in data.items() if isinstance(v, list)}
+    if columns:
+        yield from (dict(zip(columns, row)) for row in zip(*columns.values()))
+
+
+def _json_chunks(path: Path):
+    rows: list[dict] = []
+    for record in _json_records(path):
+        if isinstance(record, dict):
+            rows.append(record)
+        elif isinstance(record, list):  # [[time, open, ...], ...]
+            rows.append({f"c{i}": v for i, v in enumerate(record)})
+        if len(rows) >= _INGEST_CHUNK_ROWS:
+            yield _records_to_columns(rows)
+            rows = []
+    if rows:
+        yield _records_to_columns(rows)
+
+
+def _records_to_columns(rows: list[dict]) -> dict:
+    names = list(dict.fromkeys(key for row in rows for key in row))
+    return {_column_name(n): [row.get(n) for row in rows] for n in names}
+
+
+def _parquet_chunks(path: Path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ValueError("reading Parquet needs pyarrow (pip install pyarrow)") from e
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=_INGEST_CHUNK_ROWS):
+        columns = {}
+        for name, column in zip(batch.schema.names, batch.columns):
+            values = column.to_numpy(zero_copy_only=False)
+            if values.dtype.kind == "M":
+                values = values.astype("datetime64[s]").astype("int64")
+            columns[_column_name(name)] = values if values.dtype.kind in "iufbM" else list(values)
+        yield columns
+
+
+class AttachmentData:
+    """
+    A market-data upload reduced to NumPy columns.
+
+    Chunks are folded in as they are read: running statistics cover every
+    row, while only the latest ``max_rows`` rows are kept as float64 arrays
+    (``columns``, with ``time`` in epoch seconds), so memory stays bounded
+    however large the file is.
+    """
+
+    def __init__(self, name: str, max_rows: int):
+        self.name = name
+        self.max_rows = max_rows
+        self.total_rows = 0
+        self.columns: dict = {}  # name -> float64 array (latest max_rows rows)
+        self.text_columns: list[str] = []
+        self._chunks: dict[str, list] = {}
+        self._kept = 0
+        self._stats: dict[str, list] = {}  # name -> [count, mean, M2, min, max]
+        self._split_datetime: Optional[bool] = None
+
+    def add_chunk(self, chunk: dict) -> None:
+        import numpy as np
+
+        if not chunk:
+            return
+        if "date" in chunk and "time" in chunk:
+            # MT5 terminal export: <DATE> and <TIME> in separate columns
+            if self._split_datetime is None:
+                self._split_datetime = bool(np.isnan(_to_float_array(chunk["time"][:1])).all())
+            if self._split_datetime:
+                chunk = dict(chunk)
+                chunk["time"] = [f"{d} {t}" for d, t in zip(chunk.pop("date"), chunk["time"])]
+        rows = len(next(iter(chunk.values())))
+        for name, values in chunk.items():
+            if name in self.text_columns:
+                continue
+            if name in _TIME_COLUMNS:
+                array = _to_epoch_array(values)
+            elif isinstance(values, np.ndarray) and values.dtype.kind in "iufb":
+                array = values.astype(np.float64)
+            else:
+                array = _to_float_array(values)
+            if name not in self._chunks:
+                if np.isnan(array).mean() > 0.5:  # mostly non-numeric: symbol, comment...
+                    self.text_columns.append(name)
+                    continue
+                # Column first seen in a later chunk: align with the kept rows
+                self._chunks[name] = [np.full(self._kept, np.nan)] if self._kept else []
+            self._chunks[name].append(array)
+            self._update_stats(name, array)
+        for name, parts in self._chunks.items():
+            if len(parts) and sum(map(len, parts)) < self._kept + rows:
+                parts.append(np.full(self._kept + rows - sum(map(len, parts)), np.nan))
+        self.total_rows += rows
+        self._kept += rows
+        if self._kept > self.max_rows:
+            self._trim()
+
+    def _update_stats(self, name: str, array) -> None:
+        import numpy as np
+
+        values = array[~np.isnan(array)]
+        if not len(values):
+            return
+        n_b, mean_b = len(values), float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+        stats = self._stats.setdefault(name, [0, 0.0, 0.0, np.inf, -np.inf])
+        n_a, mean_a, m2_a = stats[0], stats[1], stats[2]
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        stats[0] = n
+        stats[1] = mean_a + delta * n_b / n
+        stats[2] = m2_a + m2_b + delta**2 * n_a * n_b / n
+        stats[3] = min(stats[3], float(values.min()))
+        stats[4] = max(stats[4], float(values.max()))
+
+    def _trim(self) -> None:
+        import numpy as np
+
+        for name, parts in self._chunks.items():
+            joined = np.concatenate(parts)[-self.max_rows :]
+            self._chunks[name] = [joined]
+        self._kept = self.max_rows
+
+    def finish(self) -> "AttachmentData":
+        import numpy as np
+
+        self.columns = {
+            name: (np.concatenate(parts) if parts else np.empty(0))
+            for name, parts in self._chunks.items()
+        }
+        self._chunks = {}
+        return self
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.columns.values())
+
+    def summary(self, max_chars: int = 4000) -> str:
+        """Bounded markdown description for the LLM: shape, statistics, preview."""
+        import numpy as np
+
+        kept = len(next(iter(self.columns.values()), ()))
+        lines = [
+            f"📈 [Data: {self.name}] {self.total_rows:,} rows, "
+            f"{len(self.columns)} numeric columns"
+            + (f" (latest {kept:,} rows loaded)" if kept < self.total_rows else "")
+        ]
+        times = next((self.columns[n] for n in _TIME_COLUMNS if n in self.columns), None)
+        if times is not None and len(times) and not np.isnan(times).all():
+            start, end = np.nanmin(times), np.nanmax(times)
+            lines.append(f"Range: {_format_epoch(start)} → {_format_epoch(end)} UTC")
+        if self.text_columns:
+            lines.append("Text columns: " + ", ".join(self.text_columns[:10]))
+        lines += ["", "| column | min | max | mean | std | last |", "|---|---|---|---|---|---|"]
+        for name, (count, mean, m2, low, high) in self._stats.items():
+            if name in _TIME_COLUMNS:
+                continue
+            column = self.columns[name]
+            valid = column[~np.isnan(column)]
+            last = valid[-1] if len(valid) else float("nan")
+            std = (m2 / (count - 1)) ** 0.5 if count > 1 else 0.0
+            lines.append(
+                f"| {name} | {low:.6g} | {high:.6g} | {mean:.6g} | {std:.4g} | {last:.6g} |"
+            )
+        names = list(self.columns)[:8]
+        if names and kept:
+            lines += ["", "Last rows:", "| " + " | ".join(names) + " |"]
+            lines.append("|" + "---|" * len(names))
+            for i in range(max(0, kept - 5), kept):
+                cells = [
+                    _format_epoch(self.columns[n][i]) if n in _TIME_COLUMNS
+                    else f"{self.columns[n][i]:.6g}"
+                    for n in names
+                ]
+                lines.append("| " + " | ".join(cells) + " |")
+        text = "\n".join(lines)
+        if len(text) > max_chars:
+            text = text[: max_chars - 20].rsplit("\n", 1)[0] + "\n… (truncated)"
+        return text
+
+
+def _format_epoch(value) -> str:
+    import math
+    from datetime import datetime, timezone
+
+    if value is None or math.isnan(value):
+        return "-"
+    return datetime.fromtimestamp(float(value), tz=timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+def ingest_attachment(path: str) -> AttachmentData:
+    """
+    Parse an uploaded CSV/JSON/Parquet file chunk by chunk into NumPy columns.
+
+    Results are cached by path, size and mtime (retries and edits do not
+    re-read the file) and stay available to local analysis through
+    ``get_attachment``.
+
+    Raises:
+        ValueError: Unsupported or unreadable file.
+    """
+    file_path = Path(path)
+    stat = file_path.stat()
+    key = f"{file_path}:{stat.st_size}:{stat.st_mtime_ns}"
+    with _attachments_lock:
+        if key in _attachments:
+            _attachments[key] = _attachments.pop(key)  # most recently used
+            return _attachments[key]
+
+    suffix = file_path.suffix.lower()
+    if suffix == ".parquet":
+        chunks = _parquet_chunks(file_path)
+    elif suffix in (".json", ".jsonl", ".ndjson"):
+        chunks = _json_chunks(file_path)
+    elif suffix in (".csv", ".tsv", ".txt"):
+        chunks = _csv_chunks(file_path)
+    else:
+        raise ValueError(f"unsupported file type {suffix}")
+
+    start = time.perf_counter()
+    data = AttachmentData(file_path.name, get_config().attachment_max_rows)
+    try:
+        for chunk in chunks:
+            data.add_chunk(chunk)
+    except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+        raise ValueError(f"could not parse {file_path.name}: {e}") from e
+    data.finish()
+    if not data.columns:
+        raise ValueError(f"no numeric columns in {file_path.name}")
+    metrics.observe("attachment_ingest_seconds", time.perf_counter() - start)
+    print(
+        f"[Attachments] {file_path.name}: {data.total_rows:,} rows, "
+        f"{data.nbytes / 1e6:.1f} MB in {time.perf_counter() - start:.2f}s"
+    )
+    with _attachments_lock:
+        _attachments[key] = data
+        while len(_attachments) > _ATTACHMENT_CACHE_SIZE:
+            _attachments.pop(next(iter(_attachments)))
+    return data
+
+
+def attachment_summary(path) -> Optional[str]:
+    """LLM-facing summary of an uploaded data file, or None if it is not tabular data."""
+    try:
+        data = ingest_attachment(str(path))
+    except (ValueError, OSError) as e:
+        print(f"[Attachments] {Path(path).name} not ingested: {e}")
+        return None
+    return data.summary(get_config().attachment_summary_chars)
+
+
+def get_attachment(name: Optional[str] = None) -> Optional[AttachmentData]:
+    """The most recent parsed upload (optionally by file name), or None."""
+    with _attachments_lock:
+        for data in reversed(list(_attachments.values())):
+            if name is None or data.name == name:
+                return data
+    return None
+
+
+# ============================================================================
+# Conversation Store
+# ============================================================================
+
+
+def _message_parts(content) -> tuple[list[str], list[str]]:
+    """``(texts, file paths)`` of a chatbot message in any of Gradio's shapes."""
+    texts: list[str] = []
+    files: list[str] = []
+    items = content if isinstance(content, (list, tuple)) else [content]
+    for item in items:
+        if item is None:
+            continue
+        if isinstance(item, str):
+            texts.append(item)
+        elif isinstance(item, dict):
+            if item.get("type") == "text" or ("text" in item and "path" not in item):
+                texts.append(str(item.get("text") or ""))
+            elif isinstance(item.get("file"), dict):
+                files.append(item["file"].get("path", ""))
+            elif isinstance(item.get("value"), dict):  # component message
+                files.append(item["value"].get("path", ""))
+            elif item.get("path"):
+                files.append(item["path"])
+        elif isinstance(getattr(item, "value", None), dict):  # e.g. gr.Image
+            files.append(item.value.get("path", ""))
+        elif isinstance(getattr(item, "value", None), str):
+            files.append(item.value)
+    return [t for t in texts if t], [f for f in files if f]
+
+
+def _stored_to_message(role: str, record: dict) -> dict:
+    """A stored message as chatbot content (files that no longer exist are noted)."""
+    files = [{"path": path} for path in record.get("files", []) if Path(path).exists()]
+    text = record.get("text", "")
+    if len(files) < len(record.get("files", [])):
+        text = (text + "\n\n" if text else "") + "_🖼️ Attachment no longer available._"
+    if not files:
+        return {"role": role, "content": text}
+    if not text and len(files) == 1:
+        return {"role": role, "content": files[0]}
+    return {"role": role, "content": [*files, *([text] if text else [])]}
+
+
+class ConversationStore:
+    """
+    Chat histories in a local SQLite file.
+
+    The chatbot keeps only the latest ``window`` messages of a conversation;
+    ``sync`` writes that window back after every change (messages before
+    ``window_start`` are already stored and never resent to the browser), and
+    ``load_older`` pages earlier ones back in on demand. Messages are stored
+    as text plus file paths, so charts are not re-serialized per update.
+    """
+
+    def __init__(self, path: str, window: int = 20):
+        import sqlite3
+
+        self.path = path = os.path.expanduser(path)
+        self.window = window
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " id TEXT PRIMARY KEY, created REAL, updated REAL,"
+                " title TEXT DEFAULT '', window_start INTEGER DEFAULT 0)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " conversation_id TEXT, seq INTEGER, role TEXT, content TEXT,"
+                " PRIMARY KEY (conversation_id, seq))"
+            )
+
+    def create(self) -> str:
+        """Start a new conversation; returns its id."""
+        import uuid
+
+        conversation_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO conversations (id, created, updated) VALUES (?, ?, ?)",
+                (conversation_id, now, now),
+            )
+        return conversation_id
+
+    def _window_start(self, conversation_id: str) -> Optional[int]:
+        row = self._db.execute(
+            "SELECT window_start FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def exists(self, conversation_id: str) -> bool:
+        with self._lock:
+            return bool(conversation_id) and self._window_start(conversation_id) is not None
+
+    def older_count(self, conversation_id: str) -> int:
+        """Messages stored before the visible window."""
+        with self._lock:
+            return self._window_start(conversation_id) or 0
+
+    def _read(self, conversation_id: str, start: int, end: Optional[int] = None) -> list[dict]:
+        query = "SELECT role, content FROM messages WHERE conversation_id = ? AND seq >= ?"
+        params: list = [conversation_id, start]
+        if end is not None:
+            query += " AND seq < ?"
+            params.append(end)
+        rows = self._db.execute(query + " ORDER BY seq", params).fetchall()
+        return [_stored_to_message(role, json.loads(content)) for role, content in rows]
+
+    def load_window(self, conversation_id: str) -> list[dict]:
+        """The visible messages of a conversation, for a fresh page load."""
+        with self._lock:
+            start = self._window_start(conversation_id) or 0
+            return self._read(conversation_id, start)
+
+    def load_older(self, conversation_id: str, count: Optional[int] = None) -> list[dict]:
+        """Move the window back by ``count`` messages and return those messages."""
+        count = count or self.window
+        with self._lock, self._db:
+            end = self._window_start(conversation_id) or 0
+            start = max(0, end - count)
+            self._db.execute(
+                "UPDATE conversations SET window_start = ? WHERE id = ?",
+                (start, conversation_id),
+            )
+            return self._read(conversation_id, start, end)
+
+    def sync(self, conversation_id: str, history: list, trim: bool = False) -> list:
+        """
+        Store the visible ``history`` as the conversation's latest messages.
+
+        With ``trim``, a window longer than ``window`` messages is cut at a
+        user message and the shortened history is returned (older messages
+        stay in the store).
+        """
+        history = list(history or [])
+        records = []
+        title = ""
+        for message in history:
+            texts, files = _message_parts(message.get("content"))
+            role = message.get("role", "user")
+            records.append((role, json.dumps({"text": "\n".join(texts), "files": files})))
+            if role == "user" and not title and texts:
+                title = texts[0][:80]
+        with self._lock, self._db:
+            start = self._window_start(conversation_id)
+            if start is None:
+                return history
+            self._db.execute(
+                "DELETE FROM messages WHERE conversation_id = ? AND seq >= ?",
+                (conversation_id, start),
+            )
+            self._db.executemany(
+                "INSERT INTO messages (conversation_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [
+                    (conversation_id, start + i, role, body)
+                    for i, (role, body) in enumerate(records)
+                ],
+            )
+            drop = 0
+            if trim and len(history) > self.window:
+                drop = next(
+                    (
+                        i
+                        for i in range(len(history) - self.window, len(history))
+                        if history[i].get("role") == "user"
+                    ),
+                    0,
+                )
+            self._db.execute(
+                "UPDATE conversations SET updated = ?, window_start = ?,"
+                " title = CASE WHEN title = '' THEN ? ELSE title END WHERE id = ?",
+                (time.time(), start + drop, title, conversation_id),
+            )
+        return history[drop:]
+
+
+_conversation_store: Optional[ConversationStore] = None
+_session_conversations: dict[str, str] = {}  # Gradio session -> conversation id
+
+
+def get_conversation_store() -> Optional[ConversationStore]:
+    """The SQLite conversation store, or None when ``CONVERSATION_DB`` is empty."""
+    global _conversation_store
+    config = get_config()
+    if _conversation_store is None and config.conversation_db:
+        try:
+            _conversation_store = ConversationStore(config.conversation_db, config.chat_window)
+        except Exception as e:
+            print(f"[Conversations] Store disabled: {e}")
+            config.conversation_db = ""
+    return _conversation_store
+
+
+def private_paths() -> list[str]:
+    """Files Gradio must never serve although they sit under ``allowed_paths``."""
+    config = get_config()
+    paths = []
+    if config.conversation_db:
+        db = str(Path(os.path.expanduser(config.conversation_db)).resolve())
+        # SQLite keeps recent writes in the -wal file next to the database
+        paths += [db + suffix for suffix in ("", "-wal", "-shm", "-journal")]
+    if config.bar_cache_dir:
+        paths.append(str(Path(os.path.expanduser(config.bar_cache_dir)).resolve()))
+    return paths
+
+
+def session_conversation(request: Optional[gr.Request]) -> Optional[str]:
+    """Conversation id bound to a UI session (None without a store)."""
+    if request is None or get_conversation_store() is None:
+        return None
+    return _session_conversations.get(request.session_hash)
+
+
+def sync_conversation(history: list, request: Optional[gr.Request], trim: bool = False) -> list:
+    """Write the session's visible history to the store (see ``ConversationStore.sync``)."""
+    conversation_id = session_conversation(request)
+    if conversation_id is None:
+        return history
+    try:
+        return get_conversation_store().sync(conversation_id, history, trim=trim)
+    except Exception as e:
+        print(f"[Conversations] Sync failed: {e}")
+        return history
+
+
 # ============================================================================
 # Main Application
 # ============================================================================
@@ -1148,6 +6834,10 @@ def list_available_tools(url: str, transport: str) -> str:
 def create_app() -> gr.Blocks:
     """Create the Gradio application with multimodal chat interface."""
     config = get_config()
+    if config.precompute_examples:
+        get_example_store().start()
+    start_ollama_preload()
+    start_analysis_scheduler()
 
     with gr.Blocks(
         title="MetaTrader 5 Financial Analyst",
@@ -1286,6 +6976,16 @@ def create_app() -> gr.Blocks:
 
             # Analysis Tab - Multimodal Interface
             with gr.Tab("💬 Analysis"):
+                if config.ticker_symbols:
+                    # Every session renders the shared snapshot; only the
+                    # ticker's own thread talks to the MCP server
+                    ticker = get_quote_ticker()
+                    ticker.start()
+                    ticker_display = gr.Markdown(value=ticker.render)
+                    gr.Timer(config.ticker_interval).tick(
+                        ticker.render, outputs=[ticker_display], show_progress="hidden"
+                    )
+
                 chatbot = gr.Chatbot(
                     value=[],  # Initialize with empty list
                     height=500,
@@ -1306,18 +7006,26 @@ def create_app() -> gr.Blocks:
                     clear_btn = gr.Button(
                         "🗑️ Clear Chat", size="sm", variant="secondary"
                     )
+                    load_older_btn = gr.Button(
+                        "⬆️ Load Earlier Messages",
+                        size="sm",
+                        variant="secondary",
+                        visible=get_conversation_store() is not None,
+                    )
+                # Survives reloads and restarts; the messages live in SQLite
+                conversation_id = gr.BrowserState("", storage_key="mt5_conversation")
 
-                gr.Examples(
-                    examples=[
-                        {"text": "What analysis capabilities do you offer?"},
-                        {"text": "Retrieve current market quote for BTC/USD"},
-                        {"text": "Perform technical analysis on EUR/USD with RSI and MACD"},
-                        {"text": "Generate price forecast for gold (XAU/USD) with confidence intervals"},
-                    ],
+                examples = gr.Examples(
+                    examples=[{"text": prompt} for prompt in config.example_prompts],
                     inputs=chat_input,
                 )
+                # True while the input holds an unedited example (served from
+                # the precomputed answers); typing switches back to the live path
+                example_clicked = gr.State(False)
+                examples.load_input_event.then(lambda: True, None, [example_clicked])
+                chat_input.input(lambda: False, None, [example_clicked])
 
-                def add_message(history: list, message: dict):
+                def add_message(history: list, message: dict, request: gr.Request = None):
                     """Add user message (text and/or files) to chat history."""
                     # Initialize history if None
                     if history is None:
@@ -1353,10 +7061,23 @@ def create_app() -> gr.Blocks:
 
                     # Add user message to history
                     history.append({"role": "user", "content": user_content})
+                    sync_conversation(history, request)
 
                     return history, gr.MultimodalTextbox(value=None, interactive=False)
 
-                def bot_respond(history: list):
+                def bot_respond(
+                    history: list, from_example: bool = False, request: gr.Request = None
+                ):
+                    """Generate the reply, then store the turn and trim the visible window."""
+                    history = history if history is not None else []
+                    yield from respond(history, from_example, request)
+                    trimmed = sync_conversation(history, request, trim=True)
+                    if len(trimmed) != len(history):
+                        yield trimmed
+
+                def respond(
+                    history: list, from_example: bool = False, request: gr.Request = None
+                ):
                     """Generate bot response using LLM with MCP tools."""
                     # Initialize history if None
                     if history is None:
@@ -1384,7 +7105,14 @@ def create_app() -> gr.Blocks:
                                         # File attachment
                                         file_path = Path(item["path"])
                                         ext = file_path.suffix.lower()
-                                        if ext in [
+                                        data_summary = (
+                                            attachment_summary(file_path)
+                                            if ext in INGEST_EXTENSIONS
+                                            else None
+                                        )
+                                        if data_summary:
+                                            file_descriptions.append(data_summary)
+                                        elif ext in [
                                             ".png",
                                             ".jpg",
                                             ".jpeg",
@@ -1459,12 +7187,45 @@ def create_app() -> gr.Blocks:
                                 ):
                                     text_parts.append(c["text"])
                             content = " ".join(text_parts) if text_parts else ""
+                        elif isinstance(content, dict):  # chart/file message
+                            content = ""
 
                         if content:
                             chat_history.append({"role": role, "content": content})
 
-                    # Get AI response with tools
-                    response = chat_with_tools(llm_message, chat_history)
+                    # Get AI response with tools. The turn runs on a worker thread
+                    # so this generator keeps yielding: closing it (clear, retry,
+                    # edit, disconnect) cancels the turn and its in-flight calls.
+                    session_id = request.session_hash if request is not None else None
+                    turn = begin_turn(session_id)
+                    precomputed = (
+                        get_example_store().get(llm_message)
+                        if from_example and config.precompute_examples
+                        else None
+                    )
+                    if precomputed is not None:
+                        metrics.inc("example_answers_served_total")
+                        future = concurrent.futures.Future()
+                        future.set_result(precomputed)
+                    else:
+                        future = run_turn(chat_with_tools, llm_message, chat_history, turn)
+                    history.append({"role": "assistant", "content": "⏳ Analyzing..."})
+                    try:
+                        while not future.done():
+                            try:
+                                future.result(timeout=0.5)
+                            except concurrent.futures.TimeoutError:
+                                history[-1]["content"] = f"⏳ {turn.status}"
+                                yield history
+                    finally:
+                        if not future.done():
+                            turn.cancel("disconnected")
+                        end_turn(session_id, turn)
+                    history.pop()
+
+                    if turn.cancelled:
+                        return
+                    response = future.result()
 
                     # Extract pre-extracted image paths (from tool results)
                     pre_extracted_images = []
@@ -1521,15 +7282,12 @@ def create_app() -> gr.Blocks:
                         history[-1]["content"] = cleaned_response
                         yield history
 
-                        # Add each image as a separate assistant message using gr.Image
+                        # Add each image as a separate assistant file message (a
+                        # path, not a component, so every update stays small)
                         for img_path in all_image_paths:
                             if Path(img_path).exists():
-                                # Add image as gr.Image component
                                 history.append(
-                                    {
-                                        "role": "assistant",
-                                        "content": gr.Image(value=img_path),
-                                    }
+                                    {"role": "assistant", "content": {"path": img_path}}
                                 )
                                 yield history
                     else:
@@ -1545,8 +7303,35 @@ def create_app() -> gr.Blocks:
                         history[-1]["content"] = cleaned_response
                         yield history
 
-                def clear_chat():
-                    return [], gr.MultimodalTextbox(value=None, interactive=True)
+                def clear_chat(request: gr.Request = None):
+                    """Start a new conversation (the old one stays in the store)."""
+                    if request is not None:
+                        cancel_turn(request.session_hash, "cleared")
+                    new_id = ""
+                    if session_conversation(request) is not None:
+                        new_id = get_conversation_store().create()
+                        _session_conversations[request.session_hash] = new_id
+                    return [], gr.MultimodalTextbox(value=None, interactive=True), new_id
+
+                def restore_conversation(stored_id: str, request: gr.Request):
+                    """Bind the session to its conversation and show the recent window."""
+                    store = get_conversation_store()
+                    if store is None:
+                        return gr.update(), stored_id
+                    if not store.exists(stored_id):
+                        stored_id = store.create()
+                    _session_conversations[request.session_hash] = stored_id
+                    return store.load_window(stored_id), stored_id
+
+                def load_older(history: list, request: gr.Request):
+                    """Prepend the previous page of stored messages."""
+                    conversation = session_conversation(request)
+                    if conversation is None:
+                        return history
+                    older = get_conversation_store().load_older(conversation)
+                    if not older:
+                        gr.Info("No earlier messages in this conversation.")
+                    return older + (history or [])
 
                 # Chatbot-specific event handlers
                 def handle_like(data: gr.LikeData):
@@ -1556,7 +7341,9 @@ def create_app() -> gr.Blocks:
                     else:
                         print(f"👎 User disliked: {data.value}")
 
-                def handle_retry(history, retry_data: gr.RetryData):
+                def handle_retry(
+                    history, retry_data: gr.RetryData, request: gr.Request = None
+                ):
                     """Retry generating response from a previous user message."""
                     if not history or retry_data.index is None:
                         yield history
@@ -1565,16 +7352,17 @@ def create_app() -> gr.Blocks:
                     # Get history up to the message being retried (keep user message)
                     new_history = history[: retry_data.index + 1]
 
-                    # Re-run bot response
-                    yield from bot_respond(new_history)
+                    # Re-run bot response (supersedes any turn still running)
+                    yield from bot_respond(new_history, request=request)
 
-                def handle_undo(history, undo_data: gr.UndoData):
+                def handle_undo(history, undo_data: gr.UndoData, request: gr.Request = None):
                     """Undo to a previous message and restore it to input."""
                     if not history or undo_data.index is None:
                         return history, None
 
                     # Remove messages from undo point onwards
                     new_history = history[: undo_data.index]
+                    sync_conversation(new_history, request)
 
                     # Get the content of the undone message for the textbox
                     undone_content = ""
@@ -1590,7 +7378,9 @@ def create_app() -> gr.Blocks:
 
                     return new_history, {"text": undone_content, "files": []}
 
-                def handle_edit(history, edit_data: gr.EditData):
+                def handle_edit(
+                    history, edit_data: gr.EditData, request: gr.Request = None
+                ):
                     """Handle editing a user message - regenerate response."""
                     if not history or edit_data.index is None:
                         yield history
@@ -1602,8 +7392,8 @@ def create_app() -> gr.Blocks:
                     # Update the edited message content
                     new_history[-1]["content"] = edit_data.value
 
-                    # Regenerate bot response
-                    yield from bot_respond(new_history)
+                    # Regenerate bot response (supersedes any turn still running)
+                    yield from bot_respond(new_history, request=request)
 
                 # Event handlers - chain add_message -> bot_respond
                 chat_msg = chat_input.submit(
@@ -1614,21 +7404,143 @@ def create_app() -> gr.Blocks:
                 )
                 bot_msg = chat_msg.then(
                     bot_respond,
-                    chatbot,
+                    [chatbot, example_clicked],
                     chatbot,
                 )
                 bot_msg.then(
-                    lambda: gr.MultimodalTextbox(interactive=True), None, [chat_input]
+                    lambda: (gr.MultimodalTextbox(interactive=True), False),
+                    None,
+                    [chat_input, example_clicked],
                 )
 
-                # Chatbot-specific events
+                # Chatbot-specific events (each one stops a response still running)
                 chatbot.like(handle_like, None, None)
-                chatbot.retry(handle_retry, chatbot, chatbot)
-                chatbot.undo(handle_undo, chatbot, [chatbot, chat_input])
-                chatbot.edit(handle_edit, chatbot, chatbot)
-                chatbot.clear(clear_chat, outputs=[chatbot, chat_input])
+                chatbot.retry(handle_retry, chatbot, chatbot, cancels=[bot_msg])
+                chatbot.undo(
+                    handle_undo, chatbot, [chatbot, chat_input], cancels=[bot_msg]
+                )
+                chatbot.edit(handle_edit, chatbot, chatbot, cancels=[bot_msg])
+                chatbot.clear(
+                    clear_chat,
+                    outputs=[chatbot, chat_input, conversation_id],
+                    cancels=[bot_msg],
+                )
+
+                clear_btn.click(
+                    clear_chat,
+                    outputs=[chatbot, chat_input, conversation_id],
+                    cancels=[bot_msg],
+                )
+                load_older_btn.click(load_older, chatbot, chatbot, queue=False)
+                demo.load(
+                    restore_conversation, conversation_id, [chatbot, conversation_id]
+                )
+
+                # Free capacity held by a session whose browser went away
+                def on_unload(request: gr.Request):
+                    cancel_turn(request.session_hash, "disconnected")
+                    _session_conversations.pop(request.session_hash, None)
+                    _user_limiters.pop(request.session_hash, None)
+                    cancel_turn(f"{request.session_hash}:scanner", "disconnected")
+
+                demo.unload(on_unload)
 
-                clear_btn.click(clear_chat, outputs=[chatbot, chat_input])
+            # Scanner Tab
+            with gr.Tab("🔎 Scanner"):
+                gr.Markdown("### Watchlist Scanner")
+                gr.Markdown(
+                    "*Analyzes every symbol in parallel, then asks the model for one summary*"
+                )
+                with gr.Row():
+                    scan_symbols = gr.Textbox(
+                        label="Watchlist",
+                        value=", ".join(config.scanner_watchlist),
+                        placeholder="EURUSD, GBPUSD, XAUUSD",
+                        scale=3,
+                    )
+                    scan_timeframe = gr.Dropdown(
+                        SCANNER_TIMEFRAMES, value="H1", label="Timeframe", scale=1
+                    )
+                scan_indicators = gr.CheckboxGroup(
+                    list(SCANNER_INDICATORS),
+                    value=DEFAULT_SCANNER_INDICATORS,
+                    label="Indicators",
+                )
+                with gr.Row():
+                    scan_btn = gr.Button("🔎 Scan", variant="primary")
+                    scan_stop_btn = gr.Button("⏹️ Stop", variant="secondary")
+                scan_status = gr.Markdown()
+                scan_table = gr.Dataframe(
+                    headers=scanner_headers(DEFAULT_SCANNER_INDICATORS),
+                    interactive=False,
+                    label="Results (click a column header to sort)",
+                )
+                scan_summary = gr.Markdown()
+
+                def run_scan(
+                    watchlist: str, timeframe: str, indicators: list, request: gr.Request
+                ):
+                    """Stream rows into the table as symbols finish, then summarize once."""
+                    symbols = parse_watchlist(watchlist)
+                    indicators = [name for name in SCANNER_INDICATORS if name in (indicators or [])]
+                    headers = scanner_headers(indicators)
+                    rows: list[list] = []
+
+                    def table():
+                        return {"data": rows, "headers": headers}
+
+                    if not symbols:
+                        yield table(), "⚠️ Enter at least one symbol.", ""
+                        return
+
+                    # Each symbol has its own tool timeout, so the scan as a
+                    # whole is not bound by TURN_TIMEOUT
+                    session_id = f"{request.session_hash}:scanner" if request else None
+                    turn = begin_turn(session_id, timeout=0)
+                    scan = scan_watchlist(get_mcp_client(), symbols, timeframe, indicators, turn)
+                    finished = False
+                    try:
+                        yield table(), f"⏳ Scanning {len(symbols)} symbols...", ""
+                        for row in scan:
+                            rows.append(row)
+                            yield table(), f"⏳ {len(rows)}/{len(symbols)} symbols done", ""
+
+                        turn.status = "Summarizing..."
+                        future = run_turn(summarize_scan, rows, headers, timeframe, turn)
+                        while not future.done():
+                            try:
+                                future.result(timeout=0.5)
+                            except concurrent.futures.TimeoutError:
+                                yield table(), f"⏳ {turn.status}", ""
+                        summary = future.result()
+                        failed = sum(1 for row in rows if row[-1] != "✅")
+                        status = f"✅ Scanned {len(rows)} symbols" + (
+                            f" ({failed} failed)" if failed else ""
+                        )
+                        finished = True
+                        yield table(), status, summary
+                    except TurnCancelledError:
+                        finished = True
+                        yield table(), f"⏹️ Scan stopped after {len(rows)} symbols.", ""
+                    except Exception as e:
+                        finished = True
+                        yield table(), f"❌ Scan failed: {_describe_error(e)}", ""
+                    finally:
+                        scan.close()
+                        if not finished:
+                            turn.cancel("disconnected")
+                        end_turn(session_id, turn)
+
+                def stop_scan(request: gr.Request):
+                    cancel_turn(f"{request.session_hash}:scanner", "stopped")
+
+                # Stop cancels the turn; run_scan then reports the partial table
+                scan_btn.click(
+                    run_scan,
+                    [scan_symbols, scan_timeframe, scan_indicators],
+                    [scan_table, scan_status, scan_summary],
+                )
+                scan_stop_btn.click(stop_scan, None, None, queue=False)
 
             # Settings Tab - hidden entirely in production mode, read-only in demo mode
             if not PRODUCTION_MODE:
@@ -1780,6 +7692,10 @@ def create_app() -> gr.Blocks:
 
                 refresh_btn.click(refresh_tools, outputs=[tools_display])
 
+                gr.Markdown("### 🩺 Connection Health")
+                health_display = gr.Markdown(value=render_connection_status)
+                gr.Timer(10).tick(render_connection_status, outputs=[health_display])
+
         # Footer - different for production mode
         if PRODUCTION_MODE:
             gr.Markdown(
@@ -1808,6 +7724,165 @@ def create_app() -> gr.Blocks:
     return demo
 
 
+# ============================================================================
+# Headless Batch Mode
+# ============================================================================
+
+
+def _batch_id(entry: dict) -> str:
+    """The entry's ``id``, or a stable hash of its prompt and history."""
+    if entry.get("id") not in (None, ""):
+        return str(entry["id"])
+    source = json.dumps([entry["prompt"], entry.get("history") or []], sort_keys=True)
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+
+def read_batch_prompts(path: str) -> list[dict]:
+    """
+    Prompts from a JSONL file, one per line.
+
+    Each line is ``{"id": ..., "prompt": ..., "history": [...]}`` (``id`` and
+    ``history`` optional) or a bare JSON string. Blank lines, ``#`` comments
+    and malformed lines are skipped; repeated ids keep the first entry.
+    """
+    entries: dict[str, dict] = {}
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"[Batch] {path}:{line_no}: invalid JSON, skipped")
+                continue
+            if isinstance(entry, str):
+                entry = {"prompt": entry}
+            if not isinstance(entry, dict) or not str(entry.get("prompt") or "").strip():
+                print(f"[Batch] {path}:{line_no}: no prompt, skipped")
+                continue
+            entry["id"] = _batch_id(entry)
+            entries.setdefault(entry["id"], entry)
+    return list(entries.values())
+
+
+def completed_batch_ids(path: str) -> set[str]:
+    """Ids with a successful result in an existing output file."""
+    done = set()
+    if not Path(path).exists():
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if isinstance(record, dict) and record.get("status") == "ok":
+                done.add(str(record.get("id")))
+    return done
+
+
+def _run_batch_prompt(entry: dict, charts_dir: str) -> dict:
+    """Run one prompt through ``chat_with_tools`` and build its result record."""
+    config = get_config()
+    turn = TurnContext(config.turn_timeout)
+    started = time.time()
+    error = None
+    try:
+        answer = chat_with_tools(entry["prompt"], entry.get("history") or [], turn)
+    except Exception as e:
+        answer, error = "", _describe_error(e)
+
+    charts, lines = [], []
+    for line in answer.split("\n"):
+        if line.startswith("__IMAGE_PATH__:"):
+            path = line.split(":", 1)[1].strip()
+            if Path(path).exists():
+                charts.append(str(Path(copy_image_to_output(path, charts_dir)).resolve()))
+        else:
+            lines.append(line)
+    answer = "\n".join(lines).strip()
+    if error is None and answer.startswith(_UNCACHEABLE_PREFIXES):
+        error = answer.splitlines()[0][:300]
+
+    def _seconds(step: str) -> float:
+        return round(sum(s.get("seconds", 0) for s in turn.trace if s["step"] == step), 3)
+
+    return {
+        "id": entry["id"],
+        "prompt": entry["prompt"],
+        "status": "error" if error else "ok",
+        "error": error,
+        "answer": answer,
+        "charts": charts,
+        "trace": turn.trace,
+        "timings": {
+            "total_seconds": round(time.monotonic() - turn.started_at, 3),
+            "llm_seconds": _seconds("llm"),
+            "tool_seconds": _seconds("tool"),
+        },
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+    }
+
+
+def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = 4,
+    charts_dir: Optional[str] = None,
+) -> dict:
+    """
+    Run every prompt of a JSONL file through the analyst pipeline.
+
+    Up to ``concurrency`` prompts run at once. Each result is appended to
+    ``output_path`` as one JSON line as soon as it finishes (answer, status,
+    tool trace, timings and chart paths), so an interrupted run loses
+    nothing; running again with the same output skips prompts that already
+    succeeded and retries the rest. Charts are copied to ``charts_dir``
+    (default: ``<output>_charts`` next to the output file).
+
+    Returns counts: ``total``, ``skipped``, ``ok`` and ``error``.
+    """
+    entries = read_batch_prompts(input_path)
+    done = completed_batch_ids(output_path)
+    todo = [entry for entry in entries if entry["id"] not in done]
+    summary = {"total": len(entries), "skipped": len(entries) - len(todo), "ok": 0, "error": 0}
+    if charts_dir is None:
+        output = Path(output_path)
+        charts_dir = str(output.with_name(f"{output.stem}_charts"))
+    print(
+        f"[Batch] {len(entries)} prompts, {summary['skipped']} already done, "
+        f"{len(todo)} to run with concurrency {concurrency}"
+    )
+    if not todo:
+        return summary
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, concurrency), thread_name_prefix="batch"
+    )
+    futures = [pool.submit(_run_batch_prompt, entry, charts_dir) for entry in todo]
+    try:
+        with open(output_path, "a", encoding="utf-8") as out:
+            for count, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                out.flush()
+                summary[record["status"]] += 1
+                metrics.inc("batch_prompts_total", status=record["status"])
+                detail = f": {record['error'][:80]}" if record["error"] else ""
+                print(
+                    f"[Batch] {count}/{len(todo)} {record['id']} {record['status']} "
+                    f"in {record['timings']['total_seconds']:.1f}s{detail}"
+                )
+    except KeyboardInterrupt:
+        print("[Batch] Interrupted; run again with the same output file to resume")
+        raise
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return summary
+
+
 # ============================================================================
 # Entry Point
 # ============================================================================
@@ -1840,6 +7915,12 @@ def main():
         default=APP_MODE,
         help="Override application mode (default: current mode)",
     )
+    parser.add_argument(
+        "--warmup",
+        action=argparse.BooleanOptionalAction,
+        default=get_config().warmup_on_start,
+        help="Pre-connect MCP/LLM and prefetch tools before serving (default: WARMUP_ON_START)",
+    )
     args = parser.parse_args()
 
     set_app_mode(args.mode)
@@ -1866,6 +7947,12 @@ def main():
     print("=" * 60)
     print()
 
+    if args.warmup:
+        print("🔥 Warming up connections...")
+        for step, result in warm_up().items():
+            print(f"   {step.upper()}: {result}")
+        print()
+
     demo = create_app()
 
     # Launch configuration
@@ -1874,6 +7961,7 @@ def main():
         "server_name": args.host,
         "share": args.share,
         "allowed_paths": [IMAGE_OUTPUT_DIR, str(Path.home())],
+        "blocked_paths": private_paths(),
     }
 
     # Add root_path if specified (for reverse proxy deployments)
@@ -0,0 +1,97 @@
+"""
+Headless chart rendering for the local chart pool.
+
+Kept separate from ``mt5_mcp_ui.app`` so the worker processes only import
+NumPy and Matplotlib (Agg canvas, no pyplot), not Gradio and the MCP stack.
+"""
+
+import os
+import tempfile
+from typing import Optional
+
+# Panel line colors, in the order columns are listed
+_COLORS = ("#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2")
+
+
+def warm_up() -> bool:
+    """Import Matplotlib in a fresh worker so the first chart is not slowed by it."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: F401
+    from matplotlib.figure import Figure  # noqa: F401
+
+    return True
+
+
+def render_panels(
+    path: str,
+    title: str,
+    times,
+    series: dict,
+    panels: list[dict],
+    width: float = 12.0,
+    dpi: int = 100,
+) -> str:
+    """
+    Draw ``chart_panels`` (as in the mt5_analyze_tool arguments) to a PNG.
+
+    Args:
+        path: Output file.
+        title: Figure title (e.g. "EURUSD H1").
+        times: Bar times in epoch seconds (NaN when unknown; bar index is used).
+        series: Column name -> float array, aligned with ``times``.
+        panels: ``[{"columns": [...], "reference_lines": [...]}, ...]``; the
+            first panel is the price panel and gets the most height.
+
+    Returns:
+        ``path``, which only ever holds a complete PNG: the figure is written
+        to a temporary file next to it and moved into place.
+    """
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    times = np.asarray(times, dtype=np.float64)
+    if len(times) and not np.isnan(times).any():
+        x = times.astype("datetime64[s]")
+    else:
+        x = np.arange(len(times))
+
+    ratios = [3] + [1] * (len(panels) - 1)
+    figure = Figure(figsize=(width, 3.5 + 1.8 * (len(panels) - 1)), dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.subplots(len(panels), 1, sharex=True, gridspec_kw={"height_ratios": ratios})
+    axes = np.atleast_1d(axes)
+    for ax, panel in zip(axes, panels):
+        for i, column in enumerate(panel.get("columns", [])):
+            values = series.get(column)
+            if values is None:
+                continue
+            ax.plot(
+                x,
+                values,
+                label=column,
+                linewidth=1.2 if i == 0 else 1.0,
+                color=_COLORS[i % len(_COLORS)],
+            )
+        for level in panel.get("reference_lines", []) or []:
+            ax.axhline(float(level), color="#888888", linestyle="--", linewidth=0.8)
+        label: Optional[str] = panel.get("title") or panel.get("ylabel")
+        if label:
+            ax.set_ylabel(label)
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc="upper left", fontsize="small")
+    axes[0].set_title(title)
+    figure.autofmt_xdate()
+    figure.tight_layout()
+    directory, name = os.path.split(path)
+    fd, temporary = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            figure.savefig(f, format="png")
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.unlink(temporary)
+        except OSError:
+            pass
+        raise
+    return path
@@ -0,0 +1,218 @@
+"""
+NumPy indicators behind the local indicator tools (``local_rsi``, ...).
+
+Kept separate from ``mt5_mcp_ui.app`` (like ``charts``) so the math only
+depends on NumPy. Each tool is registered in ``LOCAL_TOOLS`` with its JSON
+schema, its compute function over a bars dict (``time``, ``open``, ``high``,
+``low``, ``close``, ``tick_volume`` arrays) and the number of bars it needs
+before its first value has settled.
+"""
+
+BAR_FIELDS = ("time", "open", "high", "low", "close", "tick_volume")
+
+
+def sma(values, period: int):
+    """Simple moving average; NaN until ``period`` values are in."""
+    import numpy as np
+
+    out = np.full(len(values), np.nan)
+    if period <= len(values):
+        sums = np.cumsum(np.insert(values, 0, 0.0))
+        out[period - 1 :] = (sums[period:] - sums[:-period]) / period
+    return out
+
+
+def ema(values, alpha: float):
+    """Exponential smoothing ``y = (1 - alpha) * y[-1] + alpha * x``, seeded with ``x[0]``.
+
+    Evaluated in closed form over blocks short enough that the
+    ``(1 - alpha) ** -k`` weights stay finite.
+    """
+    import numpy as np
+
+    decay = 1.0 - alpha
+    if decay <= 0 or not len(values):
+        return np.array(values, dtype=np.float64)
+    block = max(1, min(len(values), int(230 / -np.log(decay))))
+    steps = np.arange(block)
+    grow, shrink = decay**-steps, decay**steps
+    out = np.empty(len(values))
+    previous = values[0]
+    for start in range(0, len(values), block):
+        segment = values[start : start + block]
+        n = len(segment)
+        weighted = np.cumsum(alpha * segment * grow[:n]) * shrink[:n]
+        out[start : start + n] = previous * decay * shrink[:n] + weighted
+        previous = out[start + n - 1]
+    return out
+
+
+def wilder(values, period: int):
+    """Wilder smoothing (RSI/ATR): SMA seed over ``period`` values, then alpha=1/period."""
+    import numpy as np
+
+    out = np.full(len(values), np.nan)
+    if period <= len(values):
+        seed = values[:period].mean()
+        tail = ema(np.concatenate([[seed], values[period:]]), 1.0 / period)
+        out[period - 1 :] = tail
+    return out
+
+
+class LocalTool:
+    """A tool executed in-process, advertised to the LLM next to the MCP tools."""
+
+    def __init__(self, name: str, description: str, parameters: dict, compute, warmup):
+        self.name = name
+        self.description = description
+        self.parameters = parameters  # indicator-specific JSON schema properties
+        self.compute = compute  # (bars, **params) -> {column: array}
+        self.warmup = warmup  # (**params) -> bars before the first settled value
+        self.validator = None  # ToolArgValidator, built on first call
+
+    def schema(self) -> dict:
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "symbol": {
+                            "type": "string",
+                            "description": "Symbol (e.g. EURUSD) or an uploaded data file name",
+                        },
+                        "timeframe": {
+                            "type": "string",
+                            "description": "M1, M5, M15, M30, H1, H4, D1, W1 or MN1 (default H1)",
+                        },
+                        "count": {
+                            "type": "integer",
+                            "description": "Latest rows to return (default 10)",
+                        },
+                        **self.parameters,
+                    },
+                    "required": ["symbol"],
+                },
+            },
+        }
+
+    def bars_needed(self, arguments: dict, rows: int) -> int:
+        """Bars for ``rows`` settled output rows with these arguments."""
+        return self.warmup(**arguments) + rows - 1
+
+
+LOCAL_TOOLS: dict[str, LocalTool] = {}
+
+
+def local_tool(name: str, description: str, warmup, **parameters):
+    """Register an indicator computed locally over held bars."""
+
+    def coerced(args: dict) -> dict:
+        return {key: _coerce(args.get(key), default) for key, default in parameters.items()}
+
+    def register(compute):
+        LOCAL_TOOLS[name] = LocalTool(
+            name,
+            f"{description} Computed instantly over bars already fetched "
+            "(no server round trip); use for indicator tweaks.",
+            {
+                key: {
+                    "type": "integer" if isinstance(default, int) else "number",
+                    "description": f"default {default}",
+                }
+                for key, default in parameters.items()
+            },
+            lambda bars, **args: compute(bars, **coerced(args)),
+            lambda **args: warmup(**coerced(args)),
+        )
+        return compute
+
+    return register
+
+
+def _coerce(value, default):
+    """Model-supplied parameter as the default's type (positive; default if unset)."""
+    if value in (None, "", 0):
+        return default
+    value = type(default)(float(value))
+    if value <= 0:
+        raise ValueError(f"parameters must be positive, got {value}")
+    return value
+
+
+# Warm-up: exponential and Wilder averages get three periods to forget their seed
+@local_tool("local_sma", "Simple moving average of close.", lambda period: period, period=20)
+def local_sma(bars, period):
+    return {f"sma_{period}": sma(bars["close"], period)}
+
+
+@local_tool(
+    "local_ema", "Exponential moving average of close.", lambda period: 3 * period, period=20
+)
+def local_ema(bars, period):
+    out = ema(bars["close"], 2.0 / (period + 1))
+    out[: period - 1] = float("nan")
+    return {f"ema_{period}": out}
+
+
+@local_tool(
+    "local_rsi", "Relative Strength Index (Wilder).", lambda period: 3 * period + 1, period=14
+)
+def local_rsi(bars, period):
+    import numpy as np
+
+    delta = np.diff(bars["close"])
+    gain = wilder(np.clip(delta, 0, None), period)
+    loss = wilder(np.clip(-delta, 0, None), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(loss == 0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+    return {f"rsi_{period}": np.concatenate([[np.nan], rsi])}
+
+
+@local_tool(
+    "local_macd",
+    "MACD line, signal and histogram.",
+    lambda fast, slow, signal: 3 * slow + signal,
+    fast=12,
+    slow=26,
+    signal=9,
+)
+def local_macd(bars, fast, slow, signal):
+    macd = ema(bars["close"], 2.0 / (fast + 1)) - ema(bars["close"], 2.0 / (slow + 1))
+    line = ema(macd, 2.0 / (signal + 1))
+    macd[: slow - 1] = line[: slow + signal - 2] = float("nan")
+    return {"macd": macd, "macd_signal": line, "macd_hist": macd - line}
+
+
+@local_tool(
+    "local_bollinger",
+    "Bollinger Bands (SMA +/- std deviations).",
+    lambda period, std: period,
+    period=20,
+    std=2.0,
+)
+def local_bollinger(bars, period, std):
+    import numpy as np
+
+    middle = sma(bars["close"], period)
+    deviation = np.full(len(middle), np.nan)
+    if period <= len(middle):
+        windows = np.lib.stride_tricks.sliding_window_view(bars["close"], period)
+        deviation[period - 1 :] = windows.std(axis=1)
+    return {
+        "bb_upper": middle + std * deviation,
+        "bb_middle": middle,
+        "bb_lower": middle - std * deviation,
+    }
+
+
+@local_tool("local_atr", "Average True Range (Wilder).", lambda period: 3 * period, period=14)
+def local_atr(bars, period):
+    import numpy as np
+
+    high, low, close = bars["high"], bars["low"], bars["close"]
+    previous = np.concatenate([[close[0]], close[:-1]])
+    true_range = np.maximum(high, previous) - np.minimum(low, previous)
+    return {f"atr_{period}": wilder(true_range, period)}
@@ -0,0 +1,16 @@
+"""Shared fixtures: every test gets a fresh ``Config`` built from a clean environment."""
+
+import pytest
+
+from mt5_mcp_ui import app
+
+
+@pytest.fixture(autouse=True)
+def fresh_config(monkeypatch, tmp_path):
+    """Isolate ``get_config()`` from the developer's .env and home directory."""
+    monkeypatch.setenv("CONVERSATION_DB", "")
+    monkeypatch.setenv("BAR_CACHE_DIR", "")
+    monkeypatch.setenv("MCP_SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(app, "_config", None)
+    yield
+    app._config = None
@@ -0,0 +1,118 @@
+"""Chunked ingestion of uploaded CSV/JSON price files into NumPy columns."""
+
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from mt5_mcp_ui import app
+
+T0 = 1_700_000_000
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(app, "_attachments", {})
+
+
+def _bars(count: int) -> list[dict]:
+    return [
+        {"time": T0 + 60 * i, "open": 1.0 + i, "close": 1.5 + i, "tick_volume": i % 7}
+        for i in range(count)
+    ]
+
+
+def test_mt5_terminal_csv_joins_date_and_time(tmp_path):
+    path = tmp_path / "EURUSD_H1.csv"
+    path.write_text(
+        "<DATE>\t<TIME>\t<OPEN>\t<HIGH>\t<LOW>\t<CLOSE>\t<TICKVOL>\t<VOL>\t<SPREAD>\n"
+        "2024.01.31\t13:00:00\t1.08100\t1.08200\t1.08000\t1.08150\t1200\t0\t5\n"
+        "2024.01.31\t14:00:00\t1.08150\t1.08300\t1.08100\t1.08250\t900\t0\t6\n"
+    )
+    data = app.ingest_attachment(str(path))
+    assert "date" not in data.columns
+    expected = datetime(2024, 1, 31, 13, tzinfo=timezone.utc).timestamp()
+    assert data.columns["time"].tolist() == [expected, expected + 3600]
+    assert data.columns["close"].tolist() == [1.0815, 1.0825]
+    assert data.columns["tickvol"].tolist() == [1200, 900]
+
+
+def test_json_array_spanning_read_blocks(tmp_path):
+    bars = _bars(30_000)  # > 1 MB, so records straddle read blocks
+    path = tmp_path / "bars.json"
+    path.write_text(json.dumps(bars, indent=1))
+    data = app.ingest_attachment(str(path))
+    assert data.total_rows == 30_000
+    assert data.columns["time"][-1] == bars[-1]["time"]
+    assert data.columns["close"].tolist() == [bar["close"] for bar in bars]
+
+
+def test_json_records_match_json_load(tmp_path):
+    path = tmp_path / "bars.json"
+    path.write_text(" \n[ " + " , ".join(json.dumps(bar) for bar in _bars(50)) + " ]\n")
+    assert list(app._json_records(path)) == _bars(50)
+
+
+def test_truncated_json_array_is_rejected(tmp_path):
+    path = tmp_path / "bars.json"
+    path.write_text(json.dumps(_bars(3))[:-20])
+    with pytest.raises(ValueError, match="could not parse"):
+        app.ingest_attachment(str(path))
+
+
+def test_json_lines(tmp_path):
+    path = tmp_path / "bars.jsonl"
+    path.write_text("\n".join(json.dumps(bar) for bar in _bars(10)) + "\n\n")
+    data = app.ingest_attachment(str(path))
+    assert data.total_rows == 10
+    assert data.columns["open"].tolist() == [1.0 + i for i in range(10)]
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        {"symbol": "EURUSD", "rates": _bars(5)},
+        {key: [bar[key] for bar in _bars(5)] for key in ("time", "open", "close", "tick_volume")},
+    ],
+    ids=["records", "columns"],
+)
+def test_json_object_shapes(tmp_path, document):
+    path = tmp_path / "bars.json"
+    path.write_text(json.dumps(document))
+    data = app.ingest_attachment(str(path))
+    assert data.total_rows == 5
+    assert data.columns["time"].tolist() == [T0 + 60 * i for i in range(5)]
+    assert data.columns["close"].tolist() == [1.5 + i for i in range(5)]
+
+
+def test_column_first_seen_in_a_later_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "_INGEST_CHUNK_ROWS", 400)
+    bars = _bars(1000)
+    for i, bar in enumerate(bars):
+        if i >= 600:
+            bar["real_volume"] = float(i)
+    path = tmp_path / "bars.jsonl"
+    path.write_text("\n".join(json.dumps(bar) for bar in bars))
+    data = app.ingest_attachment(str(path))
+    volume = data.columns["real_volume"]
+    assert len(volume) == len(data.columns["close"]) == 1000
+    assert np.isnan(volume[:600]).all()
+    assert volume[600:].tolist() == [float(i) for i in range(600, 1000)]
+
+
+def test_rows_are_trimmed_to_the_latest_max_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "_INGEST_CHUNK_ROWS", 400)
+    monkeypatch.setenv("ATTACHMENT_MAX_ROWS", "1000")
+    path = tmp_path / "bars.csv"
+    path.write_text(
+        "time,open,close\n" + "".join(f"{T0 + 60 * i},{1.0 + i},{1.5 + i}\n" for i in range(2500))
+    )
+    data = app.ingest_attachment(str(path))
+    assert data.total_rows == 2500
+    assert data.columns["time"].tolist() == [T0 + 60 * i for i in range(1500, 2500)]
+    # Statistics still cover every row
+    summary = data.summary()
+    assert "2,500 rows" in summary
+    assert "latest 1,000 rows loaded" in summary
+    assert "| close | 1.5 | 2500.5 |" in summary
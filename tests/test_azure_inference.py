@@ -0,0 +1,190 @@
+"""AzureInferenceClient against a local stand-in for an Azure AI Inference endpoint."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from mt5_mcp_ui import app
+
+pytest.importorskip("azure.ai.inference")
+
+from azure.core.exceptions import HttpResponseError  # noqa: E402
+
+TOOLS = [{"type": "function", "function": {"name": "mt5_query_tool", "parameters": {}}}]
+TOOL_CALL = {
+    "id": "call_1",
+    "type": "function",
+    "function": {"name": "mt5_query_tool", "arguments": '{"operation": "account_info"}'},
+}
+# Azure streams tool call fragments without an ``index``: an id starts a new call
+TOOL_CALL_DELTAS = [
+    {"id": "call_1", "type": "function", "function": {"name": "mt5_query_tool", "arguments": ""}},
+    {"function": {"arguments": '{"operation": '}},
+    {"function": {"arguments": '"account_info"}'}},
+    {"id": "call_2", "type": "function", "function": {"name": "local_rsi", "arguments": ""}},
+    {"function": {"arguments": '{"symbol": "EURUSD"}'}},
+]
+
+
+def _completion(message: dict, finish_reason: str) -> dict:
+    return {
+        "id": "cmpl-1",
+        "created": 0,
+        "model": "stand",
+        "choices": [{"index": 0, "finish_reason": finish_reason, "message": message}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+    }
+
+
+def _chunk(delta: dict, finish_reason=None) -> dict:
+    return {
+        "id": "cmpl-1",
+        "created": 0,
+        "model": "stand",
+        "choices": [{"index": 0, "finish_reason": finish_reason, "delta": delta}],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers), None))
+        info = {"model_name": "stand", "model_type": "chat-completion", "model_provider_name": "x"}
+        self._send(200, json.dumps(info).encode())
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, dict(self.headers), payload))
+        if payload.get("model") == "flaky" and len(self.server.requests) == 1:
+            self._send(503, b'{"error": {"code": "busy", "message": "try later"}}')
+            return
+        wants_tool = bool(payload.get("tools")) and payload["messages"][-1]["role"] == "user"
+        if not payload.get("stream"):
+            if wants_tool:
+                message = {"role": "assistant", "content": None, "tool_calls": [TOOL_CALL]}
+            else:
+                message = {"role": "assistant", "content": "Flat."}
+            reason = "tool_calls" if wants_tool else "stop"
+            self._send(200, json.dumps(_completion(message, reason)).encode())
+            return
+        if wants_tool:
+            chunks = [_chunk({"role": "assistant", "tool_calls": [d]}) for d in TOOL_CALL_DELTAS]
+            chunks.append(_chunk({}, "tool_calls"))
+        else:
+            chunks = [_chunk({"role": "assistant", "content": w}) for w in ("EURUSD ", "is flat.")]
+            chunks.append(_chunk({}, "stop"))
+        events = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks)
+        self._send(200, (events + "data: [DONE]\n\n").encode(), "text/event-stream")
+
+
+@pytest.fixture
+def azure():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server) -> app.AzureInferenceClient:
+    port = server.server_address[1]
+    return app.AzureInferenceClient(f"http://127.0.0.1:{port}", "secret", "2024-05-01-preview")
+
+
+def test_request_mapping(azure):
+    response = _client(azure).chat.completions.create(
+        model="stand",
+        messages=[{"role": "user", "content": "hi"}],
+        temperature=0.2,
+        max_tokens=64,
+        timeout=5,
+    )
+    assert response.choices[0].message.content == "Flat."
+    assert response.usage.total_tokens == 15
+    path, headers, payload = azure.requests[-1]
+    assert path == "/chat/completions?api-version=2024-05-01-preview"
+    assert "secret" in headers.get("api-key", "") + headers.get("Authorization", "")
+    assert payload["model"] == "stand"
+    assert payload["messages"] == [{"role": "user", "content": "hi"}]
+    assert payload["temperature"] == 0.2
+    assert payload["max_tokens"] == 64
+
+
+def test_empty_model_is_left_to_the_deployment(azure):
+    _client(azure).chat.completions.create(model="", messages=[{"role": "user", "content": "hi"}])
+    assert "model" not in azure.requests[-1][2]
+
+
+def test_non_streaming_tool_call(azure):
+    response = _client(azure).chat.completions.create(
+        model="stand", messages=[{"role": "user", "content": "account"}], tools=TOOLS
+    )
+    choice = response.choices[0]
+    assert choice.finish_reason == "tool_calls"
+    call = choice.message.tool_calls[0]
+    assert call.id == "call_1"
+    assert call.function.name == "mt5_query_tool"
+    assert json.loads(call.function.arguments) == {"operation": "account_info"}
+    assert azure.requests[-1][2]["tools"] == TOOLS
+
+
+def test_streamed_content_is_reassembled(azure):
+    message = app._complete_once(
+        _client(azure),
+        app.TurnContext(30),
+        model="stand",
+        messages=[{"role": "user", "content": "hi"}],
+    )
+    assert message.content == "EURUSD is flat."
+    assert message.tool_calls is None
+    assert azure.requests[-1][2]["stream"] is True
+
+
+def test_streamed_tool_calls_without_index_are_grouped(azure):
+    message = app._complete_once(
+        _client(azure),
+        app.TurnContext(30),
+        model="stand",
+        messages=[{"role": "user", "content": "account"}],
+        tools=TOOLS,
+    )
+    calls = [(call.id, call.function.name, call.function.arguments) for call in message.tool_calls]
+    assert calls == [
+        ("call_1", "mt5_query_tool", '{"operation": "account_info"}'),
+        ("call_2", "local_rsi", '{"symbol": "EURUSD"}'),
+    ]
+
+
+def test_with_options_controls_retries(azure):
+    messages = [{"role": "user", "content": "hi"}]
+    client = _client(azure)
+    with pytest.raises(HttpResponseError) as error:
+        client.with_options(max_retries=0).chat.completions.create(model="flaky", messages=messages)
+    assert error.value.status_code == 503
+    assert len(azure.requests) == 1
+
+    azure.requests.clear()
+    copy = client.with_options(max_retries=1)
+    response = copy.chat.completions.create(model="flaky", messages=messages)
+    assert response.choices[0].message.content == "Flat."
+    assert len(azure.requests) == 2
+    assert copy._client is client._client  # one connection pool shared by every copy
+
+
+def test_models_list_reads_model_info(azure):
+    info = _client(azure).models.list()
+    assert info.model_name == "stand"
+    assert azure.requests[-1][0].startswith("/info?api-version=")
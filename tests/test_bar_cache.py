@@ -0,0 +1,184 @@
+"""On-disk OHLCV store: incremental fetches, gaps, compaction, eviction, server keys."""
+
+import concurrent.futures
+import json
+import time
+
+import pytest
+
+from mt5_mcp_ui import app
+
+HOUR = 3600
+NAME = "mt5_query_tool"
+
+
+class FakeServer:
+    """copy_rates_from_pos over an hourly series whose last bar is the current hour."""
+
+    def __init__(self, url="http://broker-a/mcp", bars=300, price=1.1):
+        self.url = url
+        self.price = price
+        now = int(time.time()) // HOUR * HOUR
+        self.times = [now - HOUR * i for i in reversed(range(bars))]
+        self.closes = [price + i * 1e-4 for i in range(bars)]
+        self.requests = []
+
+    def add_bar(self):
+        self.times.append(self.times[-1] + HOUR)
+        self.closes.append(self.closes[-1] + 1e-4)
+
+    def rows(self, count):
+        return [
+            {"time": t, "open": c, "high": c + 1e-3, "low": c - 1e-3, "close": c,
+             "tick_volume": 10, "spread": 1, "real_volume": 0}
+            for t, c in zip(self.times[-count:], self.closes[-count:])
+        ]  # fmt: skip
+
+    def server_identity(self, tool_name):
+        return self.url
+
+    def get_tools_for_openai(self):
+        return [{"type": "function", "function": {"name": NAME}}]
+
+    def call_tool(self, name, arguments):
+        count = json.loads(arguments["parameters"])["count"]
+        self.requests.append(count)
+        return {"result": json.dumps({"success": True, "data": self.rows(count)})}
+
+    def submit(self, result):
+        future = concurrent.futures.Future()
+        future.set_result(result)
+        return future
+
+
+def _args(count, symbol="EURUSD"):
+    parameters = json.dumps({"timeframe": "H1", "start_pos": 0, "count": count})
+    return {"operation": "copy_rates_from_pos", "symbol": symbol, "parameters": parameters}
+
+
+def _fetch(store, server, count=100, symbol="EURUSD"):
+    return json.loads(store.fetch(server, NAME, _args(count, symbol)).result(5)["result"])["data"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return app.OhlcvStore(str(tmp_path / "bars"), max_bars=100, max_bytes=1 << 20)
+
+
+def test_repeat_fetch_only_requests_new_bars(store):
+    server = FakeServer()
+    assert _fetch(store, server) == server.rows(100)
+    server.closes[-1] += 0.5  # the forming bar moved
+    server.add_bar()
+    assert _fetch(store, server) == server.rows(100)
+    assert server.requests == [100, 2]
+
+
+def test_gap_falls_back_to_the_full_request(store):
+    server = FakeServer()
+    _fetch(store, server)
+    for _ in range(5):  # new bars the clock-based estimate does not expect
+        server.add_bar()
+    assert _fetch(store, server) == server.rows(100)
+    assert server.requests == [100, 2, 100]
+
+
+def test_series_are_compacted_to_max_bars(store):
+    server = FakeServer()
+    _fetch(store, server)
+    for _ in range(40):
+        server.add_bar()
+        assert _fetch(store, server) == server.rows(100)
+    view = store.view(server.url, "EURUSD", "H1")
+    assert 100 <= len(view["time"]) <= 125
+    assert view["time"][-1] == server.times[-1]
+    series_dir = next(store.root.glob("*/EURUSD_H1"))
+    generation = json.loads((series_dir / "meta.json").read_text())["generation"]
+    assert {p.name.split(".")[1] for p in series_dir.glob("*.f8")} == {str(generation)}
+
+
+def test_least_recently_updated_series_are_evicted(tmp_path):
+    server = FakeServer()
+    rows = server.rows(100)
+    series_bytes = 100 * len(rows[0]) * 8
+    store = app.OhlcvStore(str(tmp_path / "bars"), max_bars=100, max_bytes=2 * series_bytes)
+    store.store(server.url, "EURUSD", "H1", rows, incremental=False)
+    store.store(server.url, "GBPUSD", "H1", rows, incremental=False)
+    old = time.time() - 600
+    meta = next(store.root.glob("*/EURUSD_H1/meta.json"))
+    app.os.utime(meta, (old, old))
+    store.store(server.url, "USDJPY", "H1", rows, incremental=False)
+    assert store.view(server.url, "EURUSD", "H1") is None
+    assert store.view(server.url, "GBPUSD", "H1") is not None
+    assert store.view(server.url, "USDJPY", "H1") is not None
+
+
+def test_servers_never_share_a_series(store):
+    broker_a, broker_b = FakeServer(), FakeServer("http://broker-b/mcp", price=1.3)
+    assert _fetch(store, broker_a) == broker_a.rows(100)
+    assert _fetch(store, broker_b) == broker_b.rows(100)
+    assert broker_b.requests == [100]  # not an incremental fetch on broker A's bars
+    assert store.view(broker_a.url, "EURUSD", "H1")["close"][-1] < 1.2
+    assert store.view(broker_b.url, "EURUSD", "H1")["close"][-1] > 1.3
+
+
+def test_federation_identity_is_the_replica_group():
+    members = [
+        ("a", app.MCPClient("http://one/mcp", "streamable_http")),
+        ("b", app.MCPClient("http://two/mcp", "streamable_http")),
+    ]
+    federation = app.MCPFederation(members)
+    identity = federation.server_identity("mt5_query_tool")
+    assert "http://one/mcp" in identity and "http://two/mcp" in identity
+    assert identity != members[0][1].server_identity("mt5_query_tool")
+
+
+def test_unkeyed_series_from_older_versions_are_dropped(tmp_path):
+    legacy = tmp_path / "bars" / "EURUSD_H1"
+    legacy.mkdir(parents=True)
+    (legacy / "meta.json").write_text(json.dumps({"generation": 1, "fields": ["time"]}))
+    (legacy / "time.1.f8").write_bytes(b"\0" * 8)
+    unrelated = tmp_path / "bars" / "notes"
+    unrelated.mkdir()
+    (unrelated / "meta.json").write_text("not ours")
+    app.OhlcvStore(str(tmp_path / "bars"))
+    assert not legacy.exists()
+    assert (unrelated / "meta.json").exists()
+
+
+def test_bar_directory_is_never_served(monkeypatch, tmp_path):
+    monkeypatch.setenv("BAR_CACHE_DIR", str(tmp_path / "bars"))
+    assert str((tmp_path / "bars").resolve()) in app.private_paths()
+
+
+@pytest.fixture
+def shared_store(monkeypatch, tmp_path):
+    monkeypatch.setenv("BAR_CACHE_DIR", str(tmp_path / "bars"))
+    monkeypatch.setattr(app, "_ohlcv_store", None)
+    monkeypatch.setattr(app, "_tool_cache", None)
+    return app.get_ohlcv_store()
+
+
+def test_local_tools_read_current_series_from_the_store(shared_store):
+    server = FakeServer()
+    _fetch(shared_store, server, count=300)
+    result = app.call_local_tool(server, "local_sma", {"symbol": "EURUSD", "count": 3})
+    rows = json.loads(result.result(5)["result"])["data"]
+    assert server.requests == [300]  # no new call
+    assert rows[-1]["close"] == round(server.closes[-1], 6)
+    assert rows[-1]["sma_20"] == round(sum(server.closes[-20:]) / 20, 6)
+
+
+def test_local_tools_refetch_short_series(shared_store):
+    server = FakeServer()
+    _fetch(shared_store, server, count=20)
+    app.call_local_tool(server, "local_rsi", {"symbol": "EURUSD"}).result(5)
+    assert server.requests == [20, 500]  # too short for RSI warm-up: LOCAL_TOOL_BARS fetched
+
+
+def test_local_tools_refetch_stale_series(shared_store):
+    server = FakeServer()
+    server.times = [t - 24 * HOUR for t in server.times]
+    _fetch(shared_store, server, count=300)
+    app.call_local_tool(server, "local_sma", {"symbol": "EURUSD"}).result(5)
+    assert server.requests == [300, 500]  # last bar a day old
@@ -0,0 +1,103 @@
+"""Local chart rendering: panel parsing, the server fallback and the PNG cache."""
+
+import concurrent.futures
+import json
+from pathlib import Path
+
+import pytest
+
+from mt5_mcp_ui import app, charts
+
+pytest.importorskip("matplotlib")
+
+ROWS = [
+    {"time": 1_700_000_000 + 3600 * i, "close": 1.1 + i * 1e-3, "rsi": 50 + i} for i in range(50)
+]
+PANELS = [{"columns": ["close"]}, {"columns": ["rsi"], "reference_lines": [30, 70]}]
+
+
+@pytest.mark.parametrize(
+    ("arguments", "expected"),
+    [
+        ({}, None),
+        ({"enable_chart": False, "chart_panels": PANELS}, None),
+        ({"enable_chart": True}, [{"columns": ["close"]}]),
+        ({"enable_chart": "true", "chart_panels": json.dumps(PANELS)}, PANELS),
+        ({"enable_chart": "yes", "chart_panels": {"columns": ["rsi"]}}, [{"columns": ["rsi"]}]),
+        ({"enable_chart": True, "chart_panels": "[{"}, None),
+        ({"enable_chart": True, "chart_panels": ["close"]}, None),
+    ],
+)
+def test_chart_panels(arguments, expected):
+    assert app._chart_panels(arguments) == expected
+
+
+@pytest.fixture
+def chart_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "_CHART_CACHE_DIR", str(tmp_path))
+    # Render in-process; the spawned worker pool is exercised by the app itself
+    pool = concurrent.futures.ThreadPoolExecutor(1)
+    monkeypatch.setattr(app, "_get_chart_pool", lambda: pool)
+    yield tmp_path
+    pool.shutdown()
+
+
+def test_render_writes_a_complete_png_then_serves_it_from_cache(chart_dir, monkeypatch):
+    path = app.render_chart("EURUSD H1", ROWS, PANELS).result(30)
+    assert open(path, "rb").read(8) == b"\x89PNG\r\n\x1a\n"
+    assert [p.name for p in chart_dir.iterdir()] == [Path(path).name]  # no temp files
+
+    monkeypatch.setattr(app, "_get_chart_pool", lambda: None)  # only a cache hit can succeed
+    assert app.render_chart("EURUSD H1", ROWS, PANELS).result(0) == path
+    with pytest.raises(ValueError, match="unavailable"):
+        app.render_chart("EURUSD H4", ROWS, PANELS)
+
+
+def test_a_failed_render_leaves_nothing_behind(tmp_path):
+    with pytest.raises(ValueError):
+        charts.render_panels(
+            str(tmp_path / "x.png"), "t", [0, 1], {"close": [1, 2]}, [{"reference_lines": ["?"]}]
+        )
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_missing_columns_are_rejected(chart_dir):
+    with pytest.raises(ValueError, match="columns not in the data: macd"):
+        app.render_chart("EURUSD H1", ROWS, [{"columns": ["close", "macd"]}])
+
+
+class FakeMCP:
+    def __init__(self):
+        self.calls = []
+
+    def call_tool(self, name, arguments):
+        self.calls.append(arguments)
+        if arguments["enable_chart"]:
+            return {"result": json.dumps({"success": True, "chart_path": "/server/chart.png"})}
+        return {"result": json.dumps({"success": True, "data": ROWS})}
+
+    def submit(self, result):
+        future = concurrent.futures.Future()
+        future.set_result(result)
+        return future
+
+
+def test_unplottable_data_falls_back_to_the_server_chart(chart_dir):
+    mcp = FakeMCP()
+    arguments = {
+        "query_symbol": "EURUSD",
+        "query_parameters": json.dumps({"timeframe": "H1"}),
+        "enable_chart": True,
+        "chart_panels": [{"columns": ["macd"]}],
+    }
+    result = app.call_with_local_chart(mcp, "mt5_analyze_tool", arguments).result(5)
+    assert json.loads(result["result"])["chart_path"] == "/server/chart.png"
+    assert [call["enable_chart"] for call in mcp.calls] == [False, True]
+
+
+def test_plottable_data_is_drawn_locally(chart_dir):
+    mcp = FakeMCP()
+    arguments = {"query_symbol": "EURUSD", "enable_chart": True, "chart_panels": PANELS}
+    result = app.call_with_local_chart(mcp, "mt5_analyze_tool", arguments).result(30)
+    assert result["local_chart"].startswith(str(chart_dir))
+    assert [call["enable_chart"] for call in mcp.calls] == [False]
@@ -0,0 +1,72 @@
+"""CircuitBreaker state machine and its use by ``MCPClient._with_session``."""
+
+import asyncio
+
+import pytest
+
+from mt5_mcp_ui.app import CircuitBreaker, MCPClient
+
+
+def _half_open(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("down")
+    breaker._opened_at -= breaker.reset_timeout  # reset timeout elapsed
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    breaker.record_failure("a")
+    assert breaker.allow()
+    breaker.record_failure("b")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.retry_in() > 0
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    _half_open(breaker)
+    assert breaker.allow()
+    assert not breaker.allow()  # probe already in flight
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    _half_open(breaker)
+    assert breaker.allow()
+    breaker.record_failure("still down")
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_released_probe_can_be_retried():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    _half_open(breaker)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_cancelled_probe_does_not_wedge_the_breaker():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    client = MCPClient("http://127.0.0.1:9/mcp", "streamable_http", breaker=breaker)
+    _half_open(breaker)
+
+    async def hang():
+        await asyncio.sleep(3600)
+
+    client._acquire = hang
+
+    async def cancel_probe():
+        task = asyncio.create_task(client._with_session(lambda session: None))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()  # the next call probes instead of being rejected forever
@@ -0,0 +1,13 @@
+"""Defaults that decide what a fresh install does on its own."""
+
+from mt5_mcp_ui import app
+
+
+def test_ticker_is_opt_in(monkeypatch):
+    monkeypatch.delenv("TICKER_SYMBOLS", raising=False)
+    assert app.get_config().ticker_symbols == []
+
+
+def test_ticker_symbols_are_normalized(monkeypatch):
+    monkeypatch.setenv("TICKER_SYMBOLS", " eur/usd, XAUUSD ,,")
+    assert app.get_config().ticker_symbols == ["EURUSD", "XAUUSD"]
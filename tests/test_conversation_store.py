@@ -0,0 +1,27 @@
+"""The conversation database is opt-in and never served by Gradio."""
+
+from pathlib import Path
+
+from mt5_mcp_ui import app
+
+
+def test_store_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("CONVERSATION_DB")
+    monkeypatch.setattr(app, "_conversation_store", None)
+    assert app.get_config().conversation_db == ""
+    assert app.get_conversation_store() is None
+    assert app.private_paths() == []
+
+
+def test_database_files_are_blocked(monkeypatch, tmp_path):
+    monkeypatch.setenv("CONVERSATION_DB", str(tmp_path / "chats" / "conversations.db"))
+    blocked = app.private_paths()
+    db = str((tmp_path / "chats" / "conversations.db").resolve())
+    assert db in blocked
+    assert db + "-wal" in blocked
+
+
+def test_home_relative_path_is_expanded(monkeypatch):
+    monkeypatch.setenv("CONVERSATION_DB", "~/.mt5_mcp_ui/conversations.db")
+    expected = str((Path.home() / ".mt5_mcp_ui" / "conversations.db").resolve())
+    assert app.private_paths()[0] == expected
@@ -0,0 +1,44 @@
+"""Which messages the fast path answers from a template instead of the model."""
+
+import pytest
+
+from mt5_mcp_ui import app
+
+INTENTS = ["quote", "symbol_info", "account_info"]
+
+
+@pytest.mark.parametrize(
+    ("message", "expected"),
+    [
+        ("quote for BTC/USD", ("quote", "BTCUSD")),
+        ("What's the EURUSD price?", ("quote", "EURUSD")),
+        ("Could you give me the bid and ask on gold", ("quote", "XAUUSD")),
+        ("symbol info for EURUSD", ("symbol_info", "EURUSD")),
+        ("What is my account balance?", ("account_info", None)),
+    ],
+)
+def test_bare_data_requests_match(message, expected):
+    assert app.match_fast_path(message, INTENTS) == expected
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "What's the exchange rate outlook for EUR/USD?",
+        "Is the price of gold likely to rise next week?",
+        "Where will BTC/USD price be tomorrow?",
+        "What is my account balance if EURUSD drops 100 pips?",
+        "what's the EURUSD price and what do you think of it?",
+        "Should I buy EURUSD at this price?",
+        "What's the RSI on the EURUSD price?",
+        "Compare the EURUSD and GBPUSD prices",
+        "quote for EURUSD\nand explain the spread",
+    ],
+)
+def test_questions_about_the_data_fall_through(message):
+    assert app.match_fast_path(message, INTENTS) is None
+
+
+def test_only_enabled_intents_match():
+    assert app.match_fast_path("What is my account balance?", ["quote"]) is None
+    assert app.match_fast_path("quote for EURUSD", []) is None
@@ -0,0 +1,166 @@
+"""Local indicator math against pandas / plain-loop references, and bar fetching."""
+
+import concurrent.futures
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mt5_mcp_ui import app, indicators
+
+RNG = np.random.default_rng(7)
+CLOSE = 1.1 + np.cumsum(RNG.normal(0, 0.001, 3000))
+HIGH = CLOSE + RNG.uniform(0, 0.002, len(CLOSE))
+LOW = CLOSE - RNG.uniform(0, 0.002, len(CLOSE))
+BARS = {"time": np.arange(len(CLOSE)) * 3600.0, "high": HIGH, "low": LOW, "close": CLOSE}
+
+
+def _loop_ema(values, alpha):
+    out = [values[0]]
+    for value in values[1:]:
+        out.append((1 - alpha) * out[-1] + alpha * value)
+    return np.array(out)
+
+
+def _loop_wilder(values, period):
+    out = np.full(len(values), np.nan)
+    out[period - 1] = np.mean(values[:period])
+    for i in range(period, len(values)):
+        out[i] = (out[i - 1] * (period - 1) + values[i]) / period
+    return out
+
+
+@pytest.mark.parametrize("alpha", [2 / 3, 2 / 21, 1 / 14, 2 / 201, 0.001])
+def test_ema_matches_the_recursion(alpha):
+    # Long enough to cross several closed-form blocks
+    np.testing.assert_allclose(indicators.ema(CLOSE, alpha), _loop_ema(CLOSE, alpha), rtol=1e-12)
+
+
+def test_ema_edge_cases():
+    assert len(indicators.ema(np.array([]), 0.5)) == 0
+    np.testing.assert_array_equal(indicators.ema(CLOSE[:5], 1.0), CLOSE[:5])
+
+
+@pytest.mark.parametrize("period", [1, 14, 50])
+def test_wilder_matches_the_recursion(period):
+    np.testing.assert_allclose(
+        indicators.wilder(CLOSE, period), _loop_wilder(CLOSE, period), rtol=1e-12
+    )
+
+
+def test_sma_and_ema_tools_match_pandas():
+    close = pd.Series(CLOSE)
+    sma = indicators.LOCAL_TOOLS["local_sma"].compute(BARS, period=20)["sma_20"]
+    np.testing.assert_allclose(sma, close.rolling(20).mean(), rtol=1e-9)
+    ema = indicators.LOCAL_TOOLS["local_ema"].compute(BARS, period=20)["ema_20"]
+    expected = close.ewm(span=20, adjust=False).mean().to_numpy(copy=True)
+    expected[:19] = np.nan
+    np.testing.assert_allclose(ema, expected, rtol=1e-12)
+
+
+def test_rsi_matches_wilder_loop():
+    rsi = indicators.LOCAL_TOOLS["local_rsi"].compute(BARS, period=14)["rsi_14"]
+    delta = np.diff(CLOSE)
+    gain = _loop_wilder(np.clip(delta, 0, None), 14)
+    loss = _loop_wilder(np.clip(-delta, 0, None), 14)
+    expected = np.concatenate([[np.nan], 100 - 100 / (1 + gain / loss)])
+    np.testing.assert_allclose(rsi, expected, rtol=1e-10)
+    assert np.isnan(rsi[:14]).all() and not np.isnan(rsi[14:]).any()
+
+
+def test_macd_matches_pandas():
+    out = indicators.LOCAL_TOOLS["local_macd"].compute(BARS, fast=12, slow=26, signal=9)
+    close = pd.Series(CLOSE)
+    macd = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    signal = macd.ewm(span=9, adjust=False).mean()
+    np.testing.assert_allclose(out["macd"][25:], macd[25:], atol=1e-12)
+    np.testing.assert_allclose(out["macd_signal"][33:], signal[33:], atol=1e-12)
+    np.testing.assert_allclose(out["macd_hist"][33:], (macd - signal)[33:], atol=1e-12)
+    assert np.isnan(out["macd"][:25]).all() and np.isnan(out["macd_signal"][:33]).all()
+
+
+def test_bollinger_matches_pandas():
+    out = indicators.LOCAL_TOOLS["local_bollinger"].compute(BARS, period=20, std=2.5)
+    close = pd.Series(CLOSE)
+    middle, deviation = close.rolling(20).mean(), close.rolling(20).std(ddof=0)
+    np.testing.assert_allclose(out["bb_middle"], middle, rtol=1e-9)
+    np.testing.assert_allclose(out["bb_upper"], middle + 2.5 * deviation, rtol=1e-9)
+    np.testing.assert_allclose(out["bb_lower"], middle - 2.5 * deviation, rtol=1e-9)
+
+
+def test_atr_matches_wilder_loop():
+    atr = indicators.LOCAL_TOOLS["local_atr"].compute(BARS, period=14)["atr_14"]
+    previous = np.concatenate([[CLOSE[0]], CLOSE[:-1]])
+    true_range = np.maximum(HIGH, previous) - np.minimum(LOW, previous)
+    np.testing.assert_allclose(atr, _loop_wilder(true_range, 14), rtol=1e-10)
+
+
+def test_too_few_bars_give_nan_not_errors():
+    short = {field: values[:10] for field, values in BARS.items()}
+    for tool in indicators.LOCAL_TOOLS.values():
+        for column in tool.compute(short).values():
+            assert len(column) == 10
+
+
+def test_bars_needed_covers_warm_up_and_rows():
+    tools = indicators.LOCAL_TOOLS
+    assert tools["local_sma"].bars_needed({"period": 50}, 10) == 59
+    assert tools["local_rsi"].bars_needed({}, 10) == 3 * 14 + 1 + 9
+    assert tools["local_macd"].bars_needed({"slow": "30"}, 1) == 3 * 30 + 9
+    with pytest.raises(ValueError):
+        tools["local_atr"].bars_needed({"period": -3}, 1)
+
+
+class FakeMCP:
+    """Answers copy_rates_from_pos with up to ``available`` hourly bars."""
+
+    def __init__(self, available: int):
+        self.available = available
+        self.requests = []
+
+    def get_tools_for_openai(self):
+        return [{"type": "function", "function": {"name": "mt5_query_tool"}}]
+
+    def call_tool(self, name, arguments):
+        count = json.loads(arguments["parameters"])["count"]
+        self.requests.append(count)
+        n = min(count, self.available)
+        rows = [
+            {"time": 3600 * i, "open": c, "high": h, "low": lo, "close": c, "tick_volume": 1}
+            for i, (c, h, lo) in enumerate(zip(CLOSE[:n], HIGH[:n], LOW[:n]))
+        ]
+        return {"result": json.dumps({"success": True, "data": rows})}
+
+    def submit(self, result):
+        future = concurrent.futures.Future()
+        future.set_result(result)
+        return future
+
+
+@pytest.fixture(autouse=True)
+def fresh_tool_cache(monkeypatch):
+    monkeypatch.setattr(app, "_tool_cache", None)
+
+
+def _run(mcp, name, arguments):
+    payload = json.loads(app.call_local_tool(mcp, name, arguments).result(5)["result"])
+    return payload["data"]
+
+
+def test_fetch_covers_warm_up_so_every_row_is_settled():
+    mcp = FakeMCP(available=3000)
+    rows = _run(mcp, "local_rsi", {"symbol": "EURUSD", "count": 10})
+    assert mcp.requests == [500]  # LOCAL_TOOL_BARS
+    assert all(row["rsi_14"] is not None for row in rows)
+
+    rows = _run(mcp, "local_ema", {"symbol": "EURUSD", "period": 300, "count": 5})
+    assert mcp.requests[-1] == 3 * 300 + 4
+    assert all(row["ema_300"] is not None for row in rows)
+
+
+def test_errors_are_returned_to_the_model():
+    result = app.call_local_tool(FakeMCP(3000), "local_rsi", {"symbol": "X", "period": -1})
+    assert "must be positive" in result.result(5)["error"]
+    result = app.call_local_tool(FakeMCP(0), "local_rsi", {"symbol": "EURUSD"})
+    assert result.result(5) == {"error": "No H1 bars available for EURUSD"}
@@ -0,0 +1,88 @@
+"""httpx client settings and connections for the MCP transports."""
+
+import asyncio
+import importlib.util
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+from mcp import ClientSession
+from mcp.server.fastmcp import FastMCP
+
+from mt5_mcp_ui import app
+
+
+def test_http2_falls_back_once_when_h2_is_missing(monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util, "find_spec", lambda name, *a: None if name == "h2" else find_spec(name, *a)
+    )
+    monkeypatch.setenv("MCP_HTTP2", "true")
+    config = app.get_config()
+    assert config.mcp_http2 is False
+    app._mcp_http_client()
+    assert config.mcp_http2 is False
+
+
+def test_factory_applies_configured_settings(monkeypatch):
+    monkeypatch.setenv("MCP_ACCEPT_ENCODING", "identity")
+    monkeypatch.setenv("MCP_CONNECT_TIMEOUT", "3")
+    monkeypatch.setenv("MCP_MAX_CONNECTIONS", "7")
+    client = app._mcp_http_client(
+        headers={"Authorization": "Bearer x"}, timeout=httpx.Timeout(30, read=120)
+    )
+    assert client.headers["Accept-Encoding"] == "identity"
+    assert client.headers["Authorization"] == "Bearer x"
+    assert client.timeout.connect == 3
+    assert client.timeout.read == 120
+    assert client._transport._pool._max_connections == 7
+
+
+@pytest.fixture(params=["streamable_http", "sse"])
+def mcp_server(request):
+    """A FastMCP stand-in served by uvicorn on a free local port."""
+    server = FastMCP("stand-in")
+
+    @server.tool()
+    def ping() -> str:
+        return "pong"
+
+    asgi = server.streamable_http_app() if request.param == "streamable_http" else server.sse_app()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    uvicorn_server = uvicorn.Server(uvicorn.Config(asgi, log_level="warning"))
+    thread = threading.Thread(target=uvicorn_server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not uvicorn_server.started:
+        time.sleep(0.01)
+    path = "/mcp" if request.param == "streamable_http" else "/sse"
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}{path}", request.param
+    uvicorn_server.should_exit = True
+    thread.join(5)
+
+
+def test_transport_connects_with_configured_timeouts(mcp_server, monkeypatch):
+    url, transport = mcp_server
+    monkeypatch.setenv("MCP_HTTP_TIMEOUT", "12")
+    monkeypatch.setenv("MCP_READ_TIMEOUT", "45")
+    timeouts = []
+    factory = app._mcp_http_client
+
+    def recording_factory(headers=None, timeout=None, auth=None):
+        timeouts.append(timeout)
+        return factory(headers=headers, timeout=timeout, auth=auth)
+
+    monkeypatch.setattr(app, "_mcp_http_client", recording_factory)
+
+    async def list_tools():
+        async with app.mcp_transport(url, transport) as streams:
+            async with ClientSession(streams[0], streams[1]) as session:
+                await session.initialize()
+                return await session.list_tools()
+
+    tools = asyncio.run(list_tools())
+    assert [tool.name for tool in tools.tools] == ["ping"]
+    assert timeouts and timeouts[0].read == 45
@@ -0,0 +1,168 @@
+"""OllamaNativeClient against a local stand-in speaking Ollama's ``/api/chat`` NDJSON."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from mt5_mcp_ui import app
+
+TIMINGS = {
+    "done": True,
+    "done_reason": "stop",
+    "total_duration": 1_500_000_000,
+    "load_duration": 1_000_000_000,
+    "prompt_eval_count": 120,
+    "prompt_eval_duration": 100_000_000,
+    "eval_count": 40,
+    "eval_duration": 200_000_000,
+}
+TOOL_CALL = {"function": {"name": "mt5_query_tool", "arguments": {"operation": "account_info"}}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, lines: list[dict], content_type="application/x-ndjson"):
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send(200, [{"models": [{"name": "stand:latest"}]}], "application/json")
+        else:
+            self._send(404, [{"error": "not found"}])
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(payload)
+        if payload["model"] == "missing":
+            self._send(404, [{"error": "model 'missing' not found"}], "application/json")
+            return
+        if not payload["messages"]:  # preload
+            self._send(200, [{"message": {"role": "assistant", "content": ""}, **TIMINGS}])
+            return
+        wants_tool = bool(payload.get("tools")) and payload["messages"][-1]["role"] == "user"
+        if not payload.get("stream", True):
+            message = {"role": "assistant", "content": "" if wants_tool else "Flat."}
+            if wants_tool:
+                message["tool_calls"] = [TOOL_CALL]
+            self._send(200, [{"message": message, **TIMINGS}], "application/json")
+            return
+        if wants_tool:
+            lines = [{"message": {"role": "assistant", "content": "", "tool_calls": [TOOL_CALL]}}]
+        else:
+            lines = [
+                {"message": {"role": "assistant", "content": word}, "done": False}
+                for word in ("EURUSD ", "is ", "flat.")
+            ]
+        lines.append({"message": {"role": "assistant", "content": ""}, **TIMINGS})
+        self._send(200, lines)
+
+
+@pytest.fixture
+def ollama():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(server, keep_alive="300", num_ctx=8192) -> app.OllamaNativeClient:
+    port = server.server_address[1]
+    return app.OllamaNativeClient(f"http://127.0.0.1:{port}/v1", keep_alive, num_ctx)
+
+
+TOOLS = [{"type": "function", "function": {"name": "mt5_query_tool", "parameters": {}}}]
+
+
+def test_preload_sends_keep_alive_and_num_ctx(ollama):
+    timings = _client(ollama).preload("stand")
+    request = ollama.requests[-1]
+    assert request["messages"] == []
+    assert request["keep_alive"] == 300  # numeric keep_alive is sent as seconds
+    assert request["options"] == {"num_ctx": 8192}
+    assert timings["load"] == pytest.approx(1.0)
+    assert timings["total"] == pytest.approx(1.5)
+
+
+def test_duration_keep_alive_is_passed_through(ollama):
+    _client(ollama, keep_alive="10m", num_ctx=0).preload("stand")
+    request = ollama.requests[-1]
+    assert request["keep_alive"] == "10m"
+    assert "options" not in request
+
+
+def test_non_streaming_tool_call_and_timings(ollama):
+    response = _client(ollama).chat.completions.create(
+        model="stand", messages=[{"role": "user", "content": "account"}], tools=TOOLS
+    )
+    choice = response.choices[0]
+    assert choice.finish_reason == "tool_calls"
+    call = choice.message.tool_calls[0]
+    assert call.function.name == "mt5_query_tool"
+    assert json.loads(call.function.arguments) == {"operation": "account_info"}
+    timings = app._ollama_timings["stand"]
+    assert timings["prompt_tokens"] == 120
+    assert timings["eval_tokens"] == 40
+    assert timings["eval"] == pytest.approx(0.2)
+
+
+def test_streamed_content_is_reassembled(ollama):
+    turn = app.TurnContext(30)
+    message = app._complete_once(
+        _client(ollama), turn, model="stand", messages=[{"role": "user", "content": "hi"}]
+    )
+    assert message.content == "EURUSD is flat."
+    assert message.tool_calls is None
+    assert ollama.requests[-1]["stream"] is True
+
+
+def test_streamed_tool_call_round_trip(ollama):
+    client = _client(ollama)
+    turn = app.TurnContext(30)
+    messages = [{"role": "user", "content": "account"}]
+    message = app._complete_once(client, turn, model="stand", messages=messages, tools=TOOLS)
+    assert [call.function.name for call in message.tool_calls] == ["mt5_query_tool"]
+    call = message.tool_calls[0]
+
+    # The tool result goes back with the tool's name, arguments as an object
+    messages += [
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": call.id,
+                    "type": "function",
+                    "function": {"name": call.function.name, "arguments": call.function.arguments},
+                }
+            ],
+        },
+        {"role": "tool", "tool_call_id": call.id, "content": '{"balance": 1000}'},
+    ]
+    final = app._complete_once(client, turn, model="stand", messages=messages, tools=TOOLS)
+    assert final.content == "EURUSD is flat."
+    sent = ollama.requests[-1]["messages"]
+    assert sent[1]["tool_calls"][0]["function"]["arguments"] == {"operation": "account_info"}
+    assert sent[2]["tool_name"] == "mt5_query_tool"
+
+
+def test_http_errors_raise_ollama_error(ollama):
+    with pytest.raises(app.OllamaError) as error:
+        _client(ollama).preload("missing")
+    assert error.value.status_code == 404
+    assert "not found" in str(error.value)
+
+
+def test_models_list(ollama):
+    assert _client(ollama).models.list() == [{"name": "stand:latest"}]
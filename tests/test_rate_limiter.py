@@ -0,0 +1,126 @@
+"""Token buckets, Retry-After handling and adaptive concurrency for LLM calls."""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from mt5_mcp_ui import app
+
+
+class Throttled(Exception):
+    """Shaped like an OpenAI ``RateLimitError``."""
+
+    status_code = 429
+
+    def __init__(self, retry_after: str = "0.2"):
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers={"retry-after": retry_after})
+
+
+class FakeLLM:
+    """Answers ``chat.completions.create`` from a script of replies and errors."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **_options):
+        return self
+
+    def _create(self, **_kwargs):
+        self.calls += 1
+        step = self.script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        message = SimpleNamespace(role="assistant", content=step, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture(autouse=True)
+def no_stream(monkeypatch):
+    monkeypatch.setenv("LLM_STREAM", "false")
+    monkeypatch.setattr(app, "_llm_limiters", {})
+    monkeypatch.setattr(app, "_user_limiters", {})
+
+
+def test_token_bucket_refills_per_minute():
+    bucket = app.TokenBucket(60)  # one per second
+    bucket.take(60)
+    assert bucket.delay(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.delay(1000) == pytest.approx(60.0, abs=0.5)  # capped at capacity
+
+
+def test_uncapped_by_default():
+    limiter = app.RateLimiter("test", max_concurrency=app.get_config().llm_max_concurrency)
+    turn = app.TurnContext(5)
+    for _ in range(50):
+        limiter.acquire(turn, 10)
+    assert limiter.in_flight == 50
+    assert limiter.concurrency_limit() == 0
+
+
+def test_throttle_caps_below_in_flight_then_lifts():
+    limiter = app.RateLimiter("test")
+    turn = app.TurnContext(5)
+    for _ in range(8):
+        limiter.acquire(turn, 10)
+    limiter.release(error=Throttled())
+    assert limiter.concurrency_limit() == 4  # half of the 8 that were running
+    assert limiter.paused_until > time.monotonic()
+    for _ in range(40):
+        limiter.release()
+    assert limiter.concurrency_limit() == 0  # grew back past 8: uncapped again
+
+
+def test_configured_cap_halves_and_never_exceeds():
+    limiter = app.RateLimiter("test", max_concurrency=6)
+    turn = app.TurnContext(5)
+    limiter.acquire(turn, 10)
+    limiter.release(error=Throttled())
+    assert limiter.concurrency_limit() == 3
+    for _ in range(100):
+        limiter.release()
+    assert limiter.concurrency_limit() == 6
+
+
+def test_rpm_wait_beyond_limit_raises(monkeypatch):
+    monkeypatch.setenv("LLM_RATE_LIMIT_WAIT", "1")
+    limiter = app.RateLimiter("test", rpm=2)
+    turn = app.TurnContext(5)
+    limiter.acquire(turn, 1)
+    limiter.acquire(turn, 1)
+    with pytest.raises(app.RateLimitedError) as error:
+        limiter.acquire(turn, 1)
+    assert error.value.retry_after > 1
+
+
+def test_throttled_completion_waits_for_retry_after_and_retries():
+    llm = FakeLLM(Throttled("0.3"), "done")
+    turn = app.TurnContext(10)
+    statuses = []
+    turn.sleep = lambda seconds, sleep=turn.sleep: (statuses.append(turn.status), sleep(seconds))
+    started = time.monotonic()
+    message = app.complete_within_limits(llm, turn, model="m", messages=[])
+    assert message.content == "done"
+    assert llm.calls == 2
+    assert time.monotonic() - started >= 0.25
+    assert statuses and statuses[0].startswith("Rate limited")
+
+
+def test_gives_up_with_a_friendly_error(monkeypatch):
+    monkeypatch.setenv("LLM_RATE_LIMIT_WAIT", "1")
+    llm = FakeLLM(Throttled("30"))
+    with pytest.raises(app.RateLimitedError) as error:
+        app.complete_within_limits(llm, app.TurnContext(10), model="m", messages=[])
+    assert "try again" in str(error.value)
+    assert llm.calls == 1
+
+
+def test_rate_limited_answers_are_not_cached_or_marked_ok(monkeypatch, tmp_path):
+    answer = "⏳ The AI provider is rate limited right now. Please try again in about 30s."
+    assert not app._is_cacheable_answer(answer)
+    monkeypatch.setattr(app, "chat_with_tools", lambda *args: answer)
+    record = app._run_batch_prompt({"id": "1", "prompt": "quote"}, str(tmp_path))
+    assert record["status"] == "error"
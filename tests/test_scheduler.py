@@ -0,0 +1,57 @@
+"""AnalysisScheduler keeps running and logging when jobs fail or run long."""
+
+import time
+
+from mt5_mcp_ui import app
+
+JOBS = [{"symbol": "EURUSD", "timeframe": "H1"}, {"symbol": "XAUUSD", "timeframe": "H1"}]
+
+
+def _scheduler(run_job) -> app.AnalysisScheduler:
+    scheduler = app.AnalysisScheduler(JOBS)
+    scheduler.run_job = run_job
+    return scheduler
+
+
+def test_jobs_are_logged_as_they_finish(capsys):
+    def run_job(job):
+        if job["symbol"] == "EURUSD":
+            time.sleep(0.3)
+        return "ready"
+
+    _scheduler(run_job)._run_due()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == ["[Scheduler] XAUUSD H1: ready", "[Scheduler] EURUSD H1: ready"]
+
+
+def test_a_raising_job_is_logged_and_retried_later(capsys):
+    def run_job(job):
+        if job["symbol"] == "EURUSD":
+            raise RuntimeError("boom")
+        return "ready"
+
+    scheduler = _scheduler(run_job)
+    next_due = scheduler._run_due()
+    assert "[Scheduler] EURUSD H1: failed: boom" in capsys.readouterr().out
+    assert scheduler._due(JOBS[0]) > time.time() + scheduler._RETRY_DELAY - 5
+    assert next_due == scheduler._due(JOBS[1]) == 0.0  # run_job stub never reschedules
+
+
+def test_loop_survives_a_failing_iteration(monkeypatch, capsys):
+    scheduler = _scheduler(lambda job: "ready")
+    calls = []
+
+    def run_due():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        raise KeyboardInterrupt  # stop the loop
+
+    monkeypatch.setattr(scheduler, "_run_due", run_due)
+    monkeypatch.setattr(app.time, "sleep", lambda seconds: None)
+    try:
+        scheduler._run()
+    except KeyboardInterrupt:
+        pass
+    assert len(calls) == 2
+    assert "[Scheduler] Error: cannot schedule new futures" in capsys.readouterr().out
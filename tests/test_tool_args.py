@@ -0,0 +1,93 @@
+"""Local parsing, repair and validation of tool-call arguments."""
+
+import pytest
+
+from mt5_mcp_ui import app
+
+QUERY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "operation": {"type": "string", "enum": ["symbol_info_tick", "account_info"]},
+        "symbol": {"anyOf": [{"type": "string"}, {"type": "null"}]},
+        "parameters": {"type": "string"},
+        "count": {"type": "integer"},
+        "enable_chart": {"default": False, "type": "boolean"},
+    },
+    "required": ["operation", "symbol", "parameters"],
+}
+
+
+class FakeMCP:
+    def __init__(self):
+        self.validators = {"mt5_query_tool": app.ToolArgValidator("mt5_query_tool", QUERY_SCHEMA)}
+
+    def has_tools(self):
+        return True
+
+    def get_validator(self, name):
+        return self.validators.get(name)
+
+
+def test_missing_json_string_and_nullable_are_filled():
+    args, rejected = app.prepare_tool_arguments(
+        FakeMCP(), "mt5_query_tool", '{"operation": "account_info"}'
+    )
+    assert rejected is None
+    assert args == {"operation": "account_info", "symbol": None, "parameters": "{}"}
+
+
+def test_types_are_coerced():
+    args, rejected = app.prepare_tool_arguments(
+        FakeMCP(),
+        "mt5_query_tool",
+        '{"operation": "ACCOUNT_INFO", "symbol": null, "parameters": {"count": 5},'
+        ' "count": "100", "enable_chart": "true"}',
+    )
+    assert rejected is None
+    assert args["operation"] == "account_info"
+    assert args["parameters"] == '{"count": 5}'
+    assert args["count"] == 100
+    assert args["enable_chart"] is True
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '```json\n{"operation": "account_info", "symbol": null, "parameters": "{}"}\n```',
+        '{"operation": "account_info", "symbol": null, "parameters": "{}",}',
+        "{'operation': 'account_info', 'symbol': None, 'parameters': '{}'}",
+    ],
+)
+def test_malformed_json_is_repaired(text):
+    args, rejected = app.prepare_tool_arguments(FakeMCP(), "mt5_query_tool", text)
+    assert rejected is None
+    assert args["operation"] == "account_info"
+
+
+def test_invalid_calls_are_rejected_locally():
+    mcp = FakeMCP()
+    _, rejected = app.prepare_tool_arguments(mcp, "mt5_query_tool", '{"symbol": "EURUSD"')
+    assert "not valid JSON" in rejected["error"]
+    _, rejected = app.prepare_tool_arguments(mcp, "mt5_query_tool", '{"operation": "deals"}')
+    assert "'deals' is not one of" in rejected["error"]
+    assert "operation: string" in rejected["expected"]
+    _, rejected = app.prepare_tool_arguments(mcp, "mt5_unknown_tool", "{}")
+    assert rejected == {"error": "Unknown tool `mt5_unknown_tool`"}
+
+
+def test_repair_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv("TOOL_ARG_REPAIR", "false")
+    _, rejected = app.prepare_tool_arguments(
+        FakeMCP(), "mt5_query_tool", '{"operation": "account_info", "symbol": null}'
+    )
+    assert "'parameters' is a required property" in rejected["error"]
+
+
+def test_local_tools_are_validated():
+    args, rejected = app.prepare_tool_arguments(
+        FakeMCP(), "local_rsi", '{"symbol": "EURUSD", "period": "14"}'
+    )
+    assert rejected is None
+    assert args["period"] == 14
+    _, rejected = app.prepare_tool_arguments(FakeMCP(), "local_rsi", "{}")
+    assert "'symbol' is a required property" in rejected["error"]